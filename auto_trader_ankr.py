@@ -6,16 +6,28 @@ V5 Auto Trading - Using Ankr API for Balance Detection (Continuous Mode)
 
 import sys
 import time
+import traceback
+import asyncio
+import threading
+import queue
 import json
+import logging
+import logging.handlers
 import os
 import sqlite3
 import requests
-import math
-import statistics
+import functools
+import atexit
+import shelve
+import numpy as np
 from datetime import datetime, timedelta, timezone
-from collections import deque
+from collections import deque, OrderedDict
+from types import MappingProxyType
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Dict, Tuple
 from dotenv import load_dotenv
+from colorama import Fore
 
 # 代理配置（支持环境变量，云端部署可留空）
 proxy = os.getenv('HTTP_PROXY', os.getenv('HTTPS_PROXY', ''))
@@ -30,12 +42,39 @@ load_dotenv()
 
 try:
     from py_clob_client.client import ClobClient
-    from py_clob_client.clob_types import OrderArgs, BalanceAllowanceParams, AssetType
+    from py_clob_client.clob_types import OrderArgs, BalanceAllowanceParams, AssetType, RequestArgs
     from py_clob_client.order_builder.constants import BUY, SELL
+    from py_clob_client.headers.headers import create_level_2_headers
+    from py_clob_client.http_helpers.helpers import get as clob_get
+    from py_clob_client.exceptions import PolyApiException
     CLOB_AVAILABLE = True
 except ImportError:
     CLOB_AVAILABLE = False
 
+# orjson（可选，更快的JSON序列化/解析；未安装时回退标准库）
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode()
+    _loads = json.loads
+
+# httpx（可选，HTTP/2多路复用；未安装时/price、/book仍走requests）
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# WebSocket（用户频道成交推送，可选）
+try:
+    import websockets
+    WS_AVAILABLE = True
+except ImportError:
+    WS_AVAILABLE = False
+
 # 导入预测学习系统
 try:
     from prediction_learning_polymarket import PolymarketPredictionLearning
@@ -48,6 +87,8 @@ CONFIG = {
     'clob_host': 'https://clob.polymarket.com',
     'gamma_host': 'https://gamma-api.polymarket.com',
     'chain_id': 137,
+    # 🚀 CLOB下单连接保活间隔（秒）：SDK复用同一条HTTP/2连接，空闲过久会被服务端断开，下单时重新握手
+    'clob_keepalive_sec': 20,
     'wallet_address': '0xd5d037390c6216CCFa17DFF7148549B9C2399BD3',  # 将从私钥自动生成
     'private_key': os.getenv('PRIVATE_KEY', ''),
     'proxy': {
@@ -58,6 +99,7 @@ CONFIG = {
     # Ankr API for balance
     'ankr_rpc': 'https://rpc.ankr.com/polygon',
     'usdce_contract': '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174',  # USDC.e
+    'ctf_contract': '0x4D97DCd97eC945f40cF65F87097ACe5EA0476045',  # Conditional Tokens (ERC1155)
 
     # Telegram 通知（支持环境变量配置）
     'telegram': {
@@ -115,34 +157,163 @@ CONFIG = {
         'max_iterations': 100,
         'iteration_interval': 1,
         'dry_run': False,
+        'market_ttl': 0.8,  # 🚀 get_market_data结果缓存秒数（同一轮迭代内各调用方共用一次请求，须小于iteration_interval）
+        'dry_run_initial_usdc': float(os.getenv('DRY_RUN_INITIAL_USDC', '100')),  # dry_run模式的模拟余额
     },
 }
 
+# 风控参数运行期只读（防止误改；signal参数会被自动调参修改，不冻结）
+CONFIG['risk'] = MappingProxyType(CONFIG['risk'])
+
+def _make_logger() -> logging.Logger:
+    """交易日志：QueueHandler入队即返回，由后台QueueListener线程写stdout（下单线程不阻塞在I/O上）"""
+    log = logging.getLogger('btc15m')
+    if not log.handlers:
+        log_queue = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(logging.Formatter('%(message)s'))
+        listener = logging.handlers.QueueListener(log_queue, stream)
+        listener.start()
+        atexit.register(listener.stop)
+        log.addHandler(logging.handlers.QueueHandler(log_queue))
+        log.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+        log.propagate = False
+    return log
+
+logger = _make_logger()
+# 持仓轮询的逐tick状态行（[POSITION]价格/[MONITOR]）单独一个子logger，生产环境可设 MONITOR_LOG_LEVEL=WARNING 静默
+monitor_log = logging.getLogger('btc15m.monitor')
+monitor_log.setLevel(os.getenv('MONITOR_LOG_LEVEL', os.getenv('LOG_LEVEL', 'INFO')).upper())
+
+def _make_pooled_session() -> requests.Session:
+    """创建带连接池和重试策略的HTTP Session"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=3,
+        backoff_factor=0.1,
+        status_forcelist=[429, 500, 502, 503, 504]
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry_strategy,
+        pool_connections=10,
+        pool_maxsize=20
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _make_http2_client():
+    """CLOB行情查询用的HTTP/2客户端（并发的/price、/book复用同一条TLS连接）；不可用时返回None"""
+    if not HTTPX_AVAILABLE:
+        return None
+    proxy = CONFIG['proxy'].get('https') or None
+    kwargs = dict(http2=True, timeout=10.0,
+                  limits=httpx.Limits(max_connections=32, max_keepalive_connections=16))
+    try:
+        try:
+            return httpx.Client(proxy=proxy, **kwargs)
+        except TypeError:
+            # httpx < 0.26 只支持 proxies=
+            return httpx.Client(proxies=proxy, **kwargs)
+    except ImportError:
+        # 未安装 h2（httpx[http2]）
+        return None
+
+# 🚀 热路径SQL定义为模块常量：同一条语句文本命中sqlite3连接的预编译语句缓存，不再每次解析
+_SQL_INSERT_TRADE = """
+    INSERT INTO trades (
+        timestamp, side, price, value_usd, signal_score,
+        confidence, rsi, vwap, order_id, status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# entry_time 由SQLite在插入时生成（本地时间，与 datetime.now() 格式一致），不再从Python传入
+_SQL_NOW_LOCAL = "strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')"
+
+_SQL_INSERT_POSITION = f"""
+    INSERT INTO positions (
+        entry_time, side, entry_token_price,
+        size, value_usdc, take_profit_usd, stop_loss_usd,
+        take_profit_pct, stop_loss_pct,
+        take_profit_order_id, stop_loss_order_id, token_id, status, score, merged_from,
+        market_slug
+    ) VALUES ({_SQL_NOW_LOCAL}, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Polymarket 有效下单价区间
+_MIN_PRICE = 0.01
+_MAX_PRICE = 0.99
+
+# 到期前智能平仓窗口（秒）：盈利最后60秒锁定利润，亏损最后120秒强制止损
+_TP_LOCK_WINDOW = 60.0
+_FORCE_CLOSE_WINDOW = 120.0
+
+# 获取所有open和closing状态的持仓（包括订单ID）
+_SQL_SELECT_OPEN_POSITIONS = """
+    SELECT id, entry_time, side, entry_token_price,
+           size, value_usdc, take_profit_order_id, stop_loss_order_id, token_id
+    FROM positions
+    WHERE status IN ('open', 'closing')
+"""
+
+# 🚀 binance_oracle.py 输出的信号文件路径（模块加载时算一次，读取时不再abspath/getcwd）
+_ORACLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oracle_signal.json')
+
+# 🚀 全局共享HTTP Session池（Telegram / RPC / CLOB 共用，复用TCP+TLS连接）
+HTTP = _make_pooled_session()
+
 class TelegramNotifier:
     """Telegram 通知功能"""
 
-    def __init__(self):
+    def __init__(self, session: requests.Session = None):
         self.enabled = CONFIG['telegram']['enabled']
         self.bot_token = CONFIG['telegram']['bot_token']
         self.chat_id = CONFIG['telegram']['chat_id']
         self.proxy = CONFIG['telegram']['proxy']
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
-        # 🚀 HTTP Session（复用TCP连接，提速Telegram通知）
-        self.http_session = requests.Session()
+        # 🚀 HTTP Session（复用全局连接池，提速Telegram通知）
+        self.http_session = session or HTTP
+        # 🚀 后台发送队列：交易线程只入队，HTTP请求由守护线程完成（不阻塞下单）
+        self._q = queue.Queue(maxsize=256)
+        if self.enabled:
+            threading.Thread(target=self._drain, name="telegram_sender", daemon=True).start()
+
+    def would_send(self) -> bool:
+        """是否会真正发送（调用方据此跳过消息格式化）"""
+        return self.enabled and not CONFIG['system']['dry_run']
 
     def send(self, message: str, parse_mode: str = None) -> bool:
-        """发送Telegram消息
+        """发送Telegram消息（入队后立即返回，由后台线程发送）
 
         Args:
             message: 消息内容
             parse_mode: 格式化模式 ('HTML' 或 'Markdown')
 
         Returns:
-            bool: 是否发送成功
+            bool: 是否成功入队
         """
         if not self.enabled:
             return False
+        # dry_run（回测/调参）不发真实通知
+        if CONFIG['system']['dry_run']:
+            return True
+
+        try:
+            self._q.put_nowait((message, parse_mode))
+            return True
+        except queue.Full:
+            logger.info("       [TELEGRAM ERROR] 发送队列已满，丢弃消息")
+            return False
 
+    def _drain(self):
+        """后台线程：按入队顺序逐条发送（不合并，避免超过Telegram单条4096字符上限被整批拒绝）"""
+        while True:
+            message, parse_mode = self._q.get()
+            self._post(message, parse_mode)
+
+    def _post(self, message: str, parse_mode: str = None) -> bool:
         try:
             url = f"{self.base_url}/sendMessage"
             data = {
@@ -166,6 +337,8 @@ class TelegramNotifier:
     def send_position_open(self, side: str, size: float, entry_price: float, value_usdc: float,
                           tp_price: float, sl_price: float, token_id: str, market_id: str):
         """发送开仓通知"""
+        if not self.would_send():
+            return False
         emoji = "🟢" if side == 'LONG' else "🔴"
         token_name = "YES" if side == 'LONG' else "NO"
 
@@ -188,15 +361,191 @@ class TelegramNotifier:
         """（已弃用）"""
         return False
 
+def _normalize_market(market: Dict) -> Dict:
+    """Gamma市场数据入口归一化：把JSON字符串字段解码为list（只解码一次，下游直接取用）"""
+    for key in ('outcomePrices', 'clobTokenIds'):
+        value = market.get(key)
+        if isinstance(value, str):
+            try:
+                market[key] = _loads(value)
+            except ValueError:
+                market[key] = []
+    return market
+
+def _fnum(d: Dict, key: str) -> float:
+    """订单/行情响应中的数值字段（字符串或数字）转float，缺失/空值为0.0"""
+    v = d.get(key)
+    return float(v) if v else 0.0
+
+def _outcome_prices(market: Dict) -> Tuple[Optional[float], Optional[float]]:
+    """返回 (yes, no) 浮点价格，缺失为None；解析结果缓存在market['_outcome_prices_f']，同一份市场数据只解析一次"""
+    cached = market.get('_outcome_prices_f')
+    if cached is None:
+        op = market.get('outcomePrices') or []
+        if isinstance(op, str):
+            try:
+                op = _loads(op)
+            except ValueError:
+                op = []
+        try:
+            cached = (float(op[0]) if len(op) > 0 else None,
+                      float(op[1]) if len(op) > 1 else None)
+        except (TypeError, ValueError):
+            cached = (None, None)
+        market['_outcome_prices_f'] = cached
+    return cached
+
+@functools.lru_cache(maxsize=64)
+def _parse_iso_z(s: str) -> datetime:
+    """解析Gamma的endDate（'%Y-%m-%dT%H:%M:%SZ'，定长切片，比strptime快5-10倍，并缓存结果）"""
+    return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                    int(s[11:13]), int(s[14:16]), int(s[17:19]), tzinfo=timezone.utc)
+
+def _end_epoch(market: Dict) -> Optional[float]:
+    """市场结束时间的epoch秒（缓存在market['_end_ts']），剩余时间直接用 end - time.time()"""
+    end_ts = market.get('_end_ts')
+    if end_ts is None:
+        end_date = market.get('endDate')
+        if not end_date:
+            return None
+        end_ts = market['_end_ts'] = _parse_iso_z(end_date).timestamp()
+    return end_ts
+
+def _hex_to_int(h: str) -> int:
+    """解析RPC返回的定长十六进制数（比int(h, 16)更快）"""
+    return int.from_bytes(bytes.fromhex(h[2:].zfill(64)), 'big')
+
+def _poll_intervals(total: float = 60.0, start: float = 0.25, cap: float = 2.0):
+    """轮询间隔序列：0.25, 0.5, 1, 2, 2, ... 指数退避并封顶（Polygon出块约2秒），累计不超过total秒"""
+    delay, spent = start, 0.0
+    while spent < total:
+        step = min(delay, total - spent)
+        yield step
+        spent += step
+        delay = min(delay * 2, cap)
+
+def _price_ticks(p: float, scale: int) -> int:
+    """价格 → 整数tick数（scale = 1/tick，如0.01→100），限制在 1 ~ scale-1（Polymarket有效价格区间）"""
+    n = round(p * scale)
+    return 1 if n < 1 else (scale - 1 if n > scale - 1 else n)
+
+def _align_price(p: float, tick: float, scale: int = 0) -> float:
+    """对齐到 tick 精度，并限制在 tick ~ 1-tick
+
+    在整数tick上取整/限幅，最后只做一次 n/scale 转回浮点，不会留下 0.57000000000001 这类残差。
+    scale 可由调用方预先算好（MarketView按市场缓存）。
+    """
+    scale = scale or round(1.0 / tick)
+    return _price_ticks(p, scale) / scale
+
+def _book_depth(levels, n: int = 3) -> float:
+    """订单簿前n档挂单量之和（size为字符串；列表推导比生成器少一层帧开销）"""
+    return sum([float(lvl['size']) for lvl in levels[:n]])
+
+@functools.lru_cache(maxsize=4096)
+def _bal_params(token_id: str) -> 'BalanceAllowanceParams':
+    """条件token余额查询参数（按token_id复用，不再每次查询都新建）"""
+    return BalanceAllowanceParams(
+        asset_type=AssetType.CONDITIONAL,
+        token_id=token_id,
+        signature_type=2
+    )
+
+def _compute_stop_prices(entry: float, size: float, tick: float,
+                         tp_pct_max: float, sl_pct_max: float) -> Tuple[float, float, float]:
+    """按成交价计算止盈/止损价，返回 (tp, sl, value_usdc)
+
+    止盈取 +tp_pct 与 +1U 中较近者，止损取 -sl_pct 与 -1U 中较近者，再按tick对齐。
+    """
+    value_usdc = size * entry
+    per_share = max(size, 1)
+    scale = round(1.0 / tick)
+    tp = min((value_usdc + 1.0) / per_share, entry * (1 + tp_pct_max))
+    sl = max((value_usdc - 1.0) / per_share, entry * (1 - sl_pct_max))
+    return _align_price(tp, tick, scale), _align_price(sl, tick, scale), value_usdc
+
+
+def _local_stop_levels(positions, tp_pct_max: float):
+    """对 _SQL_SELECT_OPEN_POSITIONS 的结果计算本地止盈目标价和止损线
+
+    返回 (tp_targets, sl_lines) 两个列表，与 positions 下标一一对应；
+    sl_order_id 字段为空或无法解析时止损线为 None。持仓只有几个，纯Python循环即可。
+    """
+    tp_targets, sl_lines = [], []
+    for p in positions:
+        entry, size = float(p[3]), float(p[4])
+        value = float(p[5]) if p[5] else 0.0
+        tp = min((value + 1.0) / max(size, 1), entry * (1 + tp_pct_max))
+        tp_targets.append(min(_MAX_PRICE, max(_MIN_PRICE, tp)))
+        sl = None
+        try:
+            if p[7]:
+                sl = float(p[7])
+        except (ValueError, TypeError):
+            pass
+        sl_lines.append(sl)
+    return tp_targets, sl_lines
+
+
+@dataclass(frozen=True, slots=True)
+class MarketView:
+    """市场不可变元数据（token_id顺序、tick_size在市场生命周期内不变）
+
+    outcomePrices每tick都在变，不放在这里，仍从当次market字典读取。
+    """
+    token_ids: Tuple[str, ...]  # [0]=YES, [1]=NO
+    tick_size: float
+    tick_scale: int  # 1/tick_size（0.01→100），价格在整数tick上运算
+
+    def token_for(self, side: str) -> str:
+        """LONG买YES，SHORT买NO"""
+        return self.token_ids[0 if side == 'LONG' else 1]
+
+    def align(self, p: float) -> float:
+        """按本市场的tick_size对齐价格"""
+        return _align_price(p, self.tick_size, self.tick_scale)
+
+    def ticks(self, p: float) -> int:
+        """价格 → 整数tick数（不限幅，加减tick后再由from_ticks限幅）"""
+        return round(p * self.tick_scale)
+
+    def from_ticks(self, n: int) -> float:
+        """整数tick数 → 价格（限幅到有效区间后只做一次除法）"""
+        scale = self.tick_scale
+        return (1 if n < 1 else (scale - 1 if n > scale - 1 else n)) / scale
+
+    def with_slippage(self, p: float, ticks: int) -> float:
+        """在整数tick上加滑点后转回价格（避免浮点残差）"""
+        return self.from_ticks(round(p * self.tick_scale) + ticks)
+
+_MARKET_VIEWS: "OrderedDict[str, MarketView]" = OrderedDict()
+
+def _market_view(market: Dict) -> MarketView:
+    """按市场id缓存MarketView（最多1024个），同一市场不再重复转换token_id/tick_size"""
+    key = market.get('id') or market.get('slug') or ''
+    view = _MARKET_VIEWS.get(key) if key else None
+    if view is None:
+        token_ids = market.get('clobTokenIds') or []
+        if isinstance(token_ids, str):
+            token_ids = _loads(token_ids)
+        tick = float(market.get('orderPriceMinTickSize') or 0.01)
+        view = MarketView(tuple(str(t) for t in token_ids), tick, round(1.0 / tick))
+        # 只缓存完整的市场数据，缺字段时下次重新解析
+        if key and len(view.token_ids) >= 2:
+            _MARKET_VIEWS[key] = view
+            if len(_MARKET_VIEWS) > 1024:
+                _MARKET_VIEWS.popitem(last=False)
+    return view
+
 class RealBalanceDetector:
     """Get REAL balance using Polygon RPC (with dual-node fallback)"""
 
-    def __init__(self, wallet: str):
+    def __init__(self, wallet: str, session: requests.Session = None):
         self.wallet = wallet
         self.balance_usdc = 0.0
         self.balance_pol = 0.0
-        # 🚀 HTTP Session（复用TCP连接，提速RPC调用）
-        self.http_session = requests.Session()
+        # 🚀 HTTP Session（复用全局连接池，提速RPC调用）
+        self.http_session = session or HTTP
 
         # 🚀 性能优化：双节点容灾架构（Alchemy + QuickNode）
         # 从环境变量读取，避免硬编码密钥
@@ -237,27 +586,48 @@ class RealBalanceDetector:
 
         print(f"[RPC] 🚀 RPC节点池大小: {len(self.rpc_pool)} (双节点容灾架构)")
 
-    def _rpc_call(self, payload: dict, timeout: float = 3.0) -> dict:
+        # 🚀 预序列化固定的JSON-RPC请求体（钱包和合约在启动后不变，fetch时零序列化）
+        wallet_padded = self.wallet[2:].lower().rjust(64, '0')
+        self._usdc_body = _dumps({
+            "jsonrpc": "2.0",
+            "method": "eth_call",
+            "params": [
+                {"to": CONFIG['usdce_contract'], "data": f"0x70a08231{wallet_padded}"},
+                "latest"
+            ],
+            "id": 1
+        })
+        self._pol_body = _dumps({
+            "jsonrpc": "2.0",
+            "method": "eth_getBalance",
+            "params": [self.wallet, "latest"],
+            "id": 2
+        })
+        self._headers = {'Content-Type': 'application/json'}
+
+    def _rpc_call(self, payload, timeout: float = 3.0) -> dict:
         """
         带有自动故障转移(Fallback)的 RPC 请求发送器
 
         Args:
-            payload: JSON-RPC payload
+            payload: JSON-RPC payload（dict，或预序列化好的bytes）
             timeout: 请求超时时间（秒）
 
         Returns:
             响应JSON，如果所有节点都失败则返回None
         """
+        body = payload if isinstance(payload, bytes) else _dumps(payload)
         for i, rpc_url in enumerate(self.rpc_pool):
             try:
                 resp = self.http_session.post(
                     rpc_url,
-                    json=payload,
+                    data=body,
+                    headers=self._headers,
                     proxies=CONFIG.get('proxy'),
                     timeout=timeout
                 )
                 resp.raise_for_status()
-                result = resp.json()
+                result = _loads(resp.content)
 
                 # 打印使用的节点（只在第一次成功时）
                 if i == 0:
@@ -274,37 +644,65 @@ class RealBalanceDetector:
         print(f"[RPC] 🚨 所有RPC节点均不可用！")
         return None
 
-    def fetch(self) -> Tuple[float, float]:
-        """Fetch real balance from Polygon"""
+    def fetch_usdc_only(self) -> float:
+        """只查USDC.e余额（交易循环开仓前刷新用；仓位只按USDC计算，不查POL）"""
+        try:
+            result = self._rpc_call(self._usdc_body, timeout=3.0)
+            if result and 'result' in result and result['result']:
+                self.balance_usdc = _hex_to_int(result['result']) / 1e6  # USDC.e has 6 decimals
+            else:
+                print("[WARN] No USDC.e found")
+                self.balance_usdc = 0.0
+        except Exception as e:
+            print(f"[ERROR] Balance fetch failed: {e}")
+            self.balance_usdc = 0.0
+        return self.balance_usdc
+
+    def fetch_ctf_balances(self, token_ids) -> Dict[str, int]:
+        """一次eth_call（CTF合约balanceOfBatch）查询多个条件token余额，返回 {token_id: 原始余额(1e6精度)}
+
+        失败返回空dict，调用方回退到逐个CLOB查询。
+        """
+        token_ids = [str(t) for t in dict.fromkeys(token_ids)]
+        if not token_ids:
+            return {}
+        n = len(token_ids)
+        wallet_word = self.wallet[2:].lower().rjust(64, '0')
+        # balanceOfBatch(address[] accounts, uint256[] ids)：两个动态数组的偏移 + 各自长度和元素
+        words = ['%064x' % 0x40, '%064x' % (0x40 + 32 * (n + 1)), '%064x' % n]
+        words += [wallet_word] * n
+        words.append('%064x' % n)
+        words += ['%064x' % int(t) for t in token_ids]
+        result = self._rpc_call({
+            "jsonrpc": "2.0",
+            "method": "eth_call",
+            "params": [{"to": CONFIG['ctf_contract'], "data": "0x4e1273f4" + ''.join(words)}, "latest"],
+            "id": 3
+        }, timeout=3.0)
+        if not result or not result.get('result'):
+            return {}
+        data = result['result'][2:]
+        # 返回值：uint256[]（偏移、长度、元素）
+        count = int(data[64:128], 16)
+        if count != n:
+            return {}
+        return {tid: int(data[128 + 64 * i:192 + 64 * i], 16) for i, tid in enumerate(token_ids)}
+
+    def fetch_all(self) -> Tuple[float, float]:
+        """Fetch real balance from Polygon (USDC.e + POL，启动时打印余额用)"""
         print()
         # --- 强制使用网页版代理钱包查余额 ---
         CONFIG['wallet_address'] = "0xd5d037390c6216CCFa17DFF7148549B9C2399BD3"
         print("[BALANCE] Fetching REAL balance from Polygon...")
 
         try:
-            usdce_contract = CONFIG['usdce_contract']
-
-            # Correctly format data for balanceOf call
-            wallet_padded = self.wallet[2:].lower().rjust(64, '0')
-            data = f"0x70a08231{wallet_padded}"
-
-            # Get USDC.e balance
-            payload = {
-                "jsonrpc": "2.0",
-                "method": "eth_call",
-                "params": [
-                    {"to": usdce_contract, "data": data},
-                    "latest"
-                ],
-                "id": 1
-            }
-
+            # Get USDC.e balance（balanceOf请求体已在__init__中预序列化）
             # 🚀 使用双节点容灾架构（自动故障转移）
-            result = self._rpc_call(payload, timeout=3.0)
+            result = self._rpc_call(self._usdc_body, timeout=3.0)
 
             if result and 'result' in result and result['result']:
                 result_hex = result['result']
-                balance_wei = int(result_hex, 16)
+                balance_wei = _hex_to_int(result_hex)
                 self.balance_usdc = balance_wei / 1e6  # USDC.e has 6 decimals
                 print(f"[OK] USDC.e balance: {self.balance_usdc:.2f}")
             else:
@@ -312,18 +710,11 @@ class RealBalanceDetector:
                 self.balance_usdc = 0.0
 
             # Get POL balance
-            payload2 = {
-                "jsonrpc": "2.0",
-                "method": "eth_getBalance",
-                "params": [self.wallet, "latest"],
-                "id": 2
-            }
-
             # 🚀 使用双节点容灾架构（自动故障转移）
-            result2 = self._rpc_call(payload2, timeout=3.0)
+            result2 = self._rpc_call(self._pol_body, timeout=3.0)
 
             if result2 and 'result' in result2:
-                balance_wei = int(result2['result'], 16)
+                balance_wei = _hex_to_int(result2['result'])
                 self.balance_pol = balance_wei / 1e18
                 print(f"[OK] POL balance: {self.balance_pol:.4f}")
 
@@ -339,11 +730,48 @@ class RealBalanceDetector:
             self.balance_pol = 0.0
             return self.balance_usdc, self.balance_pol
 
+    # 兼容旧调用
+    fetch = fetch_all
+
+class DryRunBalanceDetector:
+    """dry_run模式的余额检测（不访问RPC，返回固定模拟余额，用于回测/调参）"""
+
+    def __init__(self, wallet: str, session: requests.Session = None):
+        self.wallet = wallet
+        self.balance_usdc = CONFIG['system']['dry_run_initial_usdc']
+        self.balance_pol = 0.0
+
+    def fetch_usdc_only(self) -> float:
+        return self.balance_usdc
+
+    def fetch_ctf_balances(self, token_ids) -> Dict[str, int]:
+        return {}
+
+    def fetch_all(self) -> Tuple[float, float]:
+        return self.balance_usdc, self.balance_pol
+
+    fetch = fetch_all
+
 class PositionManager:
     """Manage positions based on REAL balance"""
 
     def __init__(self, balance_usdc: float):
+        # 风控参数快照（CONFIG['risk']只读，构造时取一次即可）
+        risk = CONFIG['risk']
+        self._reserve = risk['reserve_usdc']
+        self._pct = risk['max_position_pct']
+        self._loss_pct = risk['max_daily_loss_pct']
+        self._min_req = risk['min_position_usdc']
+        self.set_balance(balance_usdc)
+
+    def set_balance(self, balance_usdc: float):
+        """更新余额，并预计算仓位计算用到的派生值（只在余额刷新时算一次）"""
         self.balance = balance_usdc
+        self._available = balance_usdc - self._reserve
+        self._min_pos = balance_usdc * 0.15
+        self._max_pos = balance_usdc * self._pct
+        self._max_safe = self._available * 0.95
+        self._max_daily_loss = balance_usdc * self._loss_pct
 
     def calculate_position(self, confidence: float, score: float = 0.0) -> float:
         """
@@ -356,84 +784,91 @@ class PositionManager:
         Returns:
             实际下单金额（USDC）
         """
-        available = self.balance - CONFIG['risk']['reserve_usdc']
-
-        if available <= CONFIG['risk']['min_position_usdc']:
+        # 🚀 快速路径：余额不足最小仓位时直接返回
+        if self._available <= self._min_req:
             return 0.0  # Not enough to meet minimum
 
-        # 基础仓位：15%
-        base = self.balance * 0.15
-
         # 🎯 根据信号分数分段调整（方案A：智能分段）
+        # 基础仓位15%：超强30% / 强25% / 中等20% / 弱15%
         abs_score = abs(score)
-
         if abs_score >= 6.0:
-            # 🔥 超强信号：30%
             multiplier = 2.0
         elif abs_score >= 4.5:
-            # 💪 强信号：25%
             multiplier = 1.67
         elif abs_score >= 3.5:
-            # 👌 中等信号：20%
             multiplier = 1.33
         else:
-            # ⚠️ 弱信号：15%
             multiplier = 1.0
 
-        # 结合confidence微调（±10%）
-        confidence_adj = 0.9 + (confidence * 0.2)  # 0.9 - 1.1
-
-        adjusted = base * multiplier * confidence_adj
-
-        # 限制在15%-30%范围内
-        min_pos = self.balance * 0.15
-        max_pos = self.balance * 0.30
-        final = max(min_pos, min(adjusted, max_pos))
-
-        # IMPORTANT: Must be at least 2 USDC
-        min_required = CONFIG['risk']['min_position_usdc']
-        final = max(final, min_required)
-
-        # But never exceed available balance (minus small buffer)
-        max_safe = available * 0.95
-        final = min(final, max_safe)
-
-        # Round to 2 decimals
-        final = round(final, 2)
+        # 结合confidence微调（±10%），限制在15%-30%范围内，至少min_position_usdc，
+        # 且不超过可用余额的95%
+        adjusted = self._min_pos * multiplier * (0.9 + confidence * 0.2)
+        final = round(min(max(self._min_pos, min(adjusted, self._max_pos), self._min_req), self._max_safe), 2)
 
         # Final sanity check
-        if final < min_required or final > available:
+        if final < self._min_req or final > self._available:
             return 0.0
 
         return final
 
     def can_afford(self, amount: float) -> bool:
-        available = self.balance - CONFIG['risk']['reserve_usdc']
-        return amount <= available
+        return amount <= self._available
 
     def get_max_daily_loss(self) -> float:
-        return self.balance * CONFIG['risk']['max_daily_loss_pct']
+        return self._max_daily_loss
 
 class StandardRSI:
     def __init__(self, period: int = 14):
         self.period = period
-        self.price_history = deque(maxlen=period + 1)
+        # 只需上一个价格和已收到的价格数（不再保存整段价格历史）
+        self._last_price: Optional[float] = None
+        self._count = 0
         self.current_rsi = 50.0
+        # 🚀 滚动涨跌幅累加和：每tick只加入最新变动、减去滑出窗口的变动（O(1)）
+        self._changes = deque(maxlen=period)
+        self._gain_sum = 0.0
+        self._loss_sum = 0.0
+        self._n_gain = 0  # 窗口内上涨/下跌次数，为0时对应累加和精确归零
+        self._n_loss = 0
+        self._ticks = 0
 
     def update(self, price: float) -> Optional[float]:
-        self.price_history.append(price)
-        if len(self.price_history) < self.period + 1:
-            return None
-
-        prices = list(self.price_history)
-        gains, losses = [], []
-        for i in range(1, len(prices)):
-            change = prices[i] - prices[i - 1]
-            gains.append(max(change, 0))
-            losses.append(abs(min(change, 0)))
+        if self._last_price is not None:
+            change = price - self._last_price
+            changes = self._changes
+            if len(changes) == self.period:
+                old = changes[0]
+                if old > 0:
+                    self._gain_sum -= old
+                    self._n_gain -= 1
+                elif old < 0:
+                    self._loss_sum += old
+                    self._n_loss -= 1
+            changes.append(change)
+            if change > 0:
+                self._gain_sum += change
+                self._n_gain += 1
+            elif change < 0:
+                self._loss_sum -= change
+                self._n_loss += 1
+            # 消除浮点累积误差：无涨/跌时精确归零，每满一个周期按窗口重算一次
+            if not self._n_gain:
+                self._gain_sum = 0.0
+            if not self._n_loss:
+                self._loss_sum = 0.0
+            self._ticks += 1
+            if self._ticks >= self.period:
+                self._ticks = 0
+                self._gain_sum = sum(c for c in changes if c > 0)
+                self._loss_sum = -sum(c for c in changes if c < 0)
+        self._last_price = price
+        if self._count <= self.period:
+            self._count += 1
+            if self._count < self.period + 1:
+                return None
 
-        avg_gain = sum(gains[-self.period:]) / self.period
-        avg_loss = sum(losses[-self.period:]) / self.period
+        avg_gain = self._gain_sum / self.period
+        avg_loss = self._loss_sum / self.period
 
         if avg_loss == 0:
             self.current_rsi = 99.9 if avg_gain > 0 else 50.0
@@ -448,22 +883,27 @@ class StandardRSI:
         return self.current_rsi
 
     def is_ready(self) -> bool:
-        return len(self.price_history) >= self.period + 1
+        return self._count >= self.period + 1
 
 class StandardVWAP:
     def __init__(self):
         self.vwap_numerator = 0.0
         self.vwap_denominator = 0.0
         self.current_vwap = 0.0
-        self.last_reset_date = None
+        # 🚀 缓存UTC日序号（epoch天数），每60秒才检查一次跨日，避免每tick构造datetime
+        self._last_epoch_day = -1
+        self._last_check_mono = float('-inf')
 
     def reset_at_midnight_utc(self):
-        current_time = datetime.now(timezone.utc)
-        current_date = current_time.date()
-        if self.last_reset_date != current_date:
+        now_mono = time.monotonic()
+        if now_mono - self._last_check_mono < 60:
+            return False
+        self._last_check_mono = now_mono
+        day = int(time.time()) // 86400
+        if day != self._last_epoch_day:
             self.vwap_numerator = 0.0
             self.vwap_denominator = 0.0
-            self.last_reset_date = current_date
+            self._last_epoch_day = day
             return True
         return False
 
@@ -493,21 +933,25 @@ class V5SignalScorer:
         }
 
     def calculate_score(self, price: float, rsi: float, vwap: float,
-                       price_history: list) -> Tuple[float, Dict]:
-        score = 0
+                       price_history: np.ndarray) -> Tuple[float, Dict]:
+        # 兼容list/deque输入：统一转为float64数组（已是ndarray时零拷贝），波动率走NumPy的C实现
+        price_history = np.asarray(price_history, dtype=np.float64)
+        n = len(price_history)
+        w = self.weights
         components = {}
 
-        if len(price_history) >= 10:
+        if n >= 10:
             recent = price_history[-10:]
             momentum = (recent[-1] - recent[0]) / recent[0] * 100 if recent[0] > 0 else 0
             momentum_score = max(-10, min(10, momentum * 2))
             components['price_momentum'] = momentum_score
-            score += momentum_score * self.weights['price_momentum']
+            score = momentum_score * w['price_momentum']
         else:
             components['price_momentum'] = 0
+            score = 0
 
-        if len(price_history) >= 5:
-            volatility = statistics.stdev(price_history[-5:])
+        if n >= 5:
+            volatility = float(price_history[-5:].std(ddof=1))
             norm_vol = min(volatility / 0.1, 1.0)
             # 波动率只影响置信度倍数，不贡献方向分
             # 高波动时信号更可信（有趋势），低波动时信号弱（横盘）
@@ -525,25 +969,24 @@ class V5SignalScorer:
                 components['vwap_status'] = -1
             else:
                 components['vwap_status'] = 0
-            score += components['vwap_status'] * self.weights['vwap_status'] * 5
+            score += components['vwap_status'] * w['vwap_status'] * 5
         else:
             components['vwap_status'] = 0
 
         # 放宽RSI阈值：从70/30改为60/40（15分钟合约需要更敏感）
-        is_extreme = rsi > 60 or rsi < 40
         if rsi > 60:
             components['rsi_status'] = -1
         elif rsi < 40:
             components['rsi_status'] = 1
         else:
             components['rsi_status'] = 0
-        score += components['rsi_status'] * self.weights['rsi_status'] * 5
+        score += components['rsi_status'] * w['rsi_status'] * 5
 
-        if len(price_history) >= 3:
+        if n >= 3:
             short_trend = (price_history[-1] - price_history[-3]) / price_history[-3] * 100 if price_history[-3] > 0 else 0
             trend_score = max(-5, min(5, short_trend * 3))
             components['trend_strength'] = trend_score
-            score += trend_score * self.weights['trend_strength']
+            score += trend_score * w['trend_strength']
         else:
             components['trend_strength'] = 0
 
@@ -554,7 +997,7 @@ class V5SignalScorer:
         return score, components
 
     def calculate_score_with_orderbook(self, price: float, rsi: float, vwap: float,
-                                        price_history: list, ob_bias: float) -> Tuple[float, Dict]:
+                                        price_history: np.ndarray, ob_bias: float) -> Tuple[float, Dict]:
         """带订单簿偏向的评分（ob_bias: -1.0~+1.0）"""
         score, components = self.calculate_score(price, rsi, vwap, price_history)
         ob_score = ob_bias * 2.0
@@ -563,6 +1006,177 @@ class V5SignalScorer:
         score = max(-10, min(10, score))
         return score, components
 
+class OrderFillListener:
+    """Polymarket user频道WebSocket监听（后台线程）
+
+    订阅钱包的成交/撤单推送，按order_id记录终态并唤醒等待方，替代轮询get_order。
+    断线时 connected=False，调用方应回退到轮询。
+    """
+
+    WS_URL = "wss://ws-subscriptions-clob.polymarket.com/ws/user"
+    EVENT_TTL = 300.0  # 成交事件保留秒数（远大于任何wait_fill等待时长），超时未被取走才清理
+
+    def __init__(self, creds):
+        self.creds = creds
+        self.connected = False
+        self._events: Dict[str, threading.Event] = {}
+        self._event_ts: Dict[str, float] = {}  # order_id → 事件创建时间（monotonic）
+        self._results: Dict[str, Dict] = {}
+        # 🚀 订单最新状态（与REST get_order同结构），断线时清空，避免用到断线期间漏掉的旧状态
+        self._status: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._status_cv = threading.Condition(self._lock)  # 订单状态更新时唤醒 wait_status
+        self._thread = threading.Thread(target=self._run, name="order_fill_ws", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _event_for(self, order_id: str) -> threading.Event:
+        with self._lock:
+            evt = self._events.get(order_id)
+            if evt is None:
+                now = time.monotonic()
+                # 防止无人等待的成交事件无限堆积：只清理超过EVENT_TTL的旧事件，
+                # 已推送但waiter尚未开始等待的成交不能被丢掉
+                if len(self._events) > 500:
+                    cutoff = now - self.EVENT_TTL
+                    for oid in [k for k, ts in self._event_ts.items() if ts < cutoff]:
+                        self._events.pop(oid, None)
+                        self._event_ts.pop(oid, None)
+                        self._results.pop(oid, None)
+                evt = self._events[order_id] = threading.Event()
+                self._event_ts[order_id] = now
+            return evt
+
+    def wait_fill(self, order_id: str, timeout: float) -> Optional[Dict]:
+        """阻塞等待订单终态推送，返回 {'price', 'size', 'status'}（status可能为CANCELED）；超时返回None"""
+        evt = self._event_for(order_id)
+        if not evt.wait(timeout):
+            # waiter已返回：未推送的空事件直接移除，不留给EVENT_TTL清理
+            with self._lock:
+                if not evt.is_set():
+                    self._events.pop(order_id, None)
+                    self._event_ts.pop(order_id, None)
+            return None
+        with self._lock:
+            self._events.pop(order_id, None)
+            self._event_ts.pop(order_id, None)
+            return self._results.pop(order_id, None)
+
+    def order_status(self, order_id: str) -> Optional[Dict]:
+        """返回推送得到的订单最新状态副本；未连接或没收到过该订单推送时返回None"""
+        if not self.connected:
+            return None
+        with self._lock:
+            state = self._status.get(order_id)
+            return dict(state) if state else None
+
+    def wait_status(self, order_id: str, timeout: float, terminal=('MATCHED', 'CANCELED')) -> Optional[Dict]:
+        """阻塞等待订单进入终态推送（到达即返回，不再固定sleep）；超时或断线返回当前已知状态/None"""
+        def _done():
+            state = self._status.get(order_id)
+            return not self.connected or (state is not None and state['status'] in terminal)
+
+        with self._status_cv:
+            self._status_cv.wait_for(_done, timeout)
+            state = self._status.get(order_id) if self.connected else None
+            return dict(state) if state else None
+
+    def _record_status(self, data: Dict, status: str):
+        order_id = data.get('id')
+        if not order_id:
+            return
+        try:
+            matched = _fnum(data, 'size_matched')
+            original = _fnum(data, 'original_size')
+        except (TypeError, ValueError):
+            return
+        state = {
+            'id': order_id, 'status': status, 'price': data.get('price'),
+            'size_matched': matched, 'matchedSize': matched,
+            'original_size': original, 'size': original,
+        }
+        with self._status_cv:
+            self._status[order_id] = state
+            self._status.move_to_end(order_id)
+            if len(self._status) > 2000:
+                self._status.popitem(last=False)
+            self._status_cv.notify_all()
+
+    def _record_fill(self, order_id: str, price, size, status: str):
+        if not order_id:
+            return
+        try:
+            fill = {'price': float(price), 'size': float(size or 0), 'status': status}
+        except (TypeError, ValueError):
+            return
+        evt = self._event_for(order_id)
+        with self._lock:
+            self._results[order_id] = fill
+            # waiter恰好超时移除了事件：重新登记，保证结果可被取走/按EVENT_TTL清理
+            evt = self._events.setdefault(order_id, evt)
+            self._event_ts.setdefault(order_id, time.monotonic())
+        evt.set()
+
+    def _handle(self, data: Dict):
+        event_type = data.get('event_type')
+        if event_type == 'trade':
+            status = str(data.get('status', 'MATCHED')).upper()
+            self._record_fill(data.get('taker_order_id'), data.get('price'), data.get('size'), status)
+            for maker in data.get('maker_orders') or []:
+                self._record_fill(maker.get('order_id'), maker.get('price', data.get('price')),
+                                  maker.get('matched_amount'), status)
+        elif event_type == 'order' and str(data.get('type', '')).upper() in ('PLACEMENT', 'UPDATE'):
+            try:
+                matched = _fnum(data, 'size_matched')
+                original = _fnum(data, 'original_size')
+            except (TypeError, ValueError):
+                return
+            filled = original > 0 and matched >= original
+            self._record_status(data, 'MATCHED' if filled else 'LIVE')
+            if filled:
+                self._record_fill(data.get('id'), data.get('price'), matched, 'MATCHED')
+        elif event_type == 'order' and str(data.get('type', '')).upper() == 'CANCELLATION':
+            self._record_status(data, 'CANCELED')
+            self._record_fill(data.get('id'), data.get('price') or 0, data.get('size_matched'), 'CANCELED')
+
+    async def _listen(self):
+        reconnect_delay = 3
+        while True:
+            try:
+                async with websockets.connect(self.WS_URL, ping_interval=20) as ws:
+                    await ws.send(json.dumps({
+                        "auth": {
+                            "apiKey": self.creds.api_key,
+                            "secret": self.creds.api_secret,
+                            "passphrase": self.creds.api_passphrase,
+                        },
+                        "type": "user",
+                        "markets": [],
+                    }))
+                    self.connected = True
+                    reconnect_delay = 3
+                    print("[USER-WS] 成交推送已连接")
+                    async for msg in ws:
+                        try:
+                            payload = _loads(msg)
+                        except ValueError:
+                            continue
+                        for item in payload if isinstance(payload, list) else [payload]:
+                            if isinstance(item, dict):
+                                self._handle(item)
+            except Exception as e:
+                print(f"[USER-WS] 连接断开: {e}，{reconnect_delay}秒后重连...")
+            self.connected = False
+            with self._status_cv:
+                self._status.clear()
+                self._status_cv.notify_all()
+            await asyncio.sleep(reconnect_delay)
+            reconnect_delay = min(reconnect_delay * 2, 30)
+
+    def _run(self):
+        asyncio.run(self._listen())
+
 class AutoTraderV5:
     def __init__(self):
         # --- 强制使用网页版代理钱包 ---
@@ -576,8 +1190,10 @@ class AutoTraderV5:
         print()
 
         # Fetch REAL balance
-        self.balance_detector = RealBalanceDetector(wallet_address)
-        usdc, pol = self.balance_detector.fetch()
+        # dry_run模式使用模拟余额，跳过RPC
+        detector_cls = DryRunBalanceDetector if CONFIG['system']['dry_run'] else RealBalanceDetector
+        self.balance_detector = detector_cls(wallet_address, session=HTTP)
+        usdc, pol = self.balance_detector.fetch_all()
 
         # Position manager with REAL balance
         self.position_mgr = PositionManager(usdc)
@@ -593,7 +1209,7 @@ class AutoTraderV5:
         print()
 
         # Telegram 通知
-        self.telegram = TelegramNotifier()
+        self.telegram = TelegramNotifier(session=HTTP)
         if self.telegram.enabled:
             print("[TELEGRAM] 通知已启用")
         print()
@@ -602,29 +1218,47 @@ class AutoTraderV5:
         self.rsi = StandardRSI(period=14)
         self.vwap = StandardVWAP()
         self.scorer = V5SignalScorer()
-        self.price_history = deque(maxlen=20)
-
-
-        # 🚀 HTTP Session池（复用TCP连接，提速3-5倍）
-        self.http_session = requests.Session()
-        # 配置连接池
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=0.1,
-            status_forcelist=[429, 500, 502, 503, 504]
-        )
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
-            pool_connections=10,
-            pool_maxsize=20
-        )
-        self.http_session.mount("http://", adapter)
-        self.http_session.mount("https://", adapter)
+        # 🚀 预分配NumPy环形缓冲区（替代deque+list()，切片为O(1)视图）
+        # 双倍长度镜像写入：最近N个价格在内存中始终连续，取按时间顺序的视图无需拷贝
+        self._prices_cap = 20
+        self._prices = np.zeros(2 * self._prices_cap, dtype=np.float64)
+        self._prices_idx = 0
+        self._prices_count = 0
+
+
+        # 🚀 HTTP Session池（与Telegram/RPC共享同一连接池，提速3-5倍）
+        self.http_session = HTTP
+        self._proxy = CONFIG['proxy']
+        # 🚀 /price短期缓存：token_id → (price, monotonic时间戳)
+        self._price_cache: Dict[str, Tuple[float, float]] = {}
+        self._price_locks: Dict[str, threading.Lock] = {}
+        self._price_cache_lock = threading.Lock()
+        # 🚀 /price、/book 响应短TTL缓存：(url, 参数) → (JSON, monotonic时间戳)
+        self._rest_cache: Dict[Tuple, Tuple[Dict, float]] = {}
+        self._rest_cache_lock = threading.Lock()
+        self._h2 = _make_http2_client()
+        # 🚀 条件token余额缓存：token_id → (get_balance_allowance结果, monotonic时间戳)
+        self._bal_cache: Dict[str, Tuple[Optional[Dict], float]] = {}
+        self._bal_cache_lock = threading.Lock()  # 清理线程池/V6持仓检查线程并发读写
+        # 🚀 CLOB REST并行调用线程池（互不依赖的查询/撤单同时发出）
+        self._rpc_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='clob-rpc')
+        # 🚀 已确认撤销/成交的订单ID（最多保留1000个），重复撤单直接跳过
+        self._done_orders: "OrderedDict[str, None]" = OrderedDict()
+        self._done_orders_lock = threading.Lock()
+        # 🚀 条件token授权磁盘缓存（setApprovalForAll永久有效，授权过的token重启后也无需再查）
+        self._allowance_disk_cache = None
+        self._allowance_cache_lock = threading.Lock()
+        # 🚀 当前市场窗口（get_market_data据此跳过已过期窗口的探测请求）
+        self._current_market_slug: Optional[str] = None
+        self._current_market_end_ts: float = 0.0
+        # 🚀 get_market_data短TTL缓存：(monotonic时间戳, 结果)
+        self._market_cache: Tuple[float, Optional[Dict]] = (0.0, None)
+        # 🚀 启动时预热Gamma/CLOB连接（TLS握手+DNS提前完成，首个tick不再付握手成本）
+        self._warm_connections()
 
         # CLOB client
         self.client = None
+        self.fill_listener = None
         self.init_clob_client()
 
         # Stats
@@ -644,9 +1278,17 @@ class AutoTraderV5:
         self.pause_until = None
         self.last_reset_date = datetime.now().date()
         self.last_traded_market = None  # 追踪最后交易的市场
+        # 🚀 (token_id, 方向) → 最近一次开仓的单调时钟，射击冷却无需解析数据库时间
+        self._last_entry_monotonic: Dict[Tuple[str, str], float] = {}
+        # 🚀 (当前15分钟窗口起点时间戳, 对应的本地时间字符串)
+        self._cached_window: Tuple[int, str] = (-1, '')
         self.last_signal_direction = None  # 追踪上一次信号方向（用于信号改变检测）
         # 🔥 防止止盈止损重复触发的集合（存储正在处理的持仓ID）
         self.processing_positions = set()
+        # 学习系统信号去重：(slug_方向) → monotonic时间，按插入顺序淘汰（1小时TTL，最多4096条）
+        self._last_signals = OrderedDict()
+        # oracle信号文件缓存：(st_mtime_ns, 解析后的dict)
+        self._oracle_cache = (0, None)
         self.init_database()
 
         # 从数据库恢复当天的亏损和交易统计（防止重启后风控失效）
@@ -664,6 +1306,9 @@ class AutoTraderV5:
                     'min_short_score': CONFIG['signal']['min_short_score']
                 }
                 self.learning_system = PolymarketPredictionLearning(current_params=current_params)
+                # 🚀 退出结果回填放到后台线程批量写入（平仓路径只入队，不等学习库写盘）
+                self._learning_queue = queue.Queue(maxsize=1024)
+                threading.Thread(target=self._drain_learning_exits, name="learning_exit_writer", daemon=True).start()
                 print("[OK] 预测学习系统已启用")
                 # 🔥 启动时立即输出历史学习数据
                 print()
@@ -698,48 +1343,38 @@ class AutoTraderV5:
         """
         try:
             if not self.client:
-                print("[CLEANUP] 跳过：CLOB客户端未初始化")
+                logger.info("[CLEANUP] 跳过：CLOB客户端未初始化")
                 return
 
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
+            # 🚀 复用init_database打开的持久连接（已开启WAL），不再每次新建连接
+            # V6在工作线程中调用本方法：读库走_query，写库在self._db_lock内批量执行，
+            # 链上余额/撤单等网络调用期间不持锁
 
             # 🔥 新增：清理卡在'closing'状态的持仓（修复止损/止盈失败bug）
-            cursor.execute("""
-                SELECT id, entry_time, side, entry_token_price, size
+            closing_positions = self._query("""
+                SELECT id, side, entry_token_price, size, token_id, exit_token_price
                 FROM positions
                 WHERE status = 'closing'
             """)
-            closing_positions = cursor.fetchall()
 
             if closing_positions:
-                print(f"[CLEANUP] 🔧 发现 {len(closing_positions)} 个卡在'closing'状态的持仓")
+                logger.info("[CLEANUP] 🔧 发现 %s 个卡在'closing'状态的持仓", len(closing_positions))
+                # 🚀 并发预取所有closing持仓的链上余额（N次串行RTT → 1次）
+                prefetched = self._prefetch_ctf_balances([str(r[4]) for r in closing_positions if r[4] is not None])
 
-                for pos_id, entry_time, side, entry_price, size in closing_positions:
-                    print(f"[CLEANUP] 处理持仓 #{pos_id}: {side} {size}份 @ ${entry_price:.4f}")
+                closing_updates = []  # (sql, params)，循环结束后一次性写库
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                for pos_id, side, entry_price, size, token_id, exit_token_price in closing_positions:
+                    logger.info("[CLEANUP] 处理持仓 #%s: %s %s份 @ $%.4f", pos_id, side, size, entry_price)
 
                     # 检查是否已经手动平仓或市场结算
                     try:
-                        from py_clob_client.clob_types import BalanceAllowanceParams, AssetType
-
-                        # 获取token_id（从数据库读取）
-                        cursor.execute("SELECT token_id FROM positions WHERE id = ?", (pos_id,))
-                        token_id_row = cursor.fetchone()
-                        if not token_id_row:
-                            print(f"[CLEANUP] ⚠️ 持仓 #{pos_id} 没有token_id，跳过")
+                        if token_id is None:
+                            logger.info("[CLEANUP] ⚠️ 持仓 #%s 没有token_id，跳过", pos_id)
                             continue
 
-                        token_id = str(token_id_row[0])
-
-                        # 查询链上余额
-                        params = BalanceAllowanceParams(
-                            asset_type=AssetType.CONDITIONAL,
-                            token_id=token_id,
-                            signature_type=2
-                        )
-                        result = self.client.get_balance_allowance(params)
+                        # 查询链上余额（已在循环前并发预取）
+                        result = prefetched.get(str(token_id)) or self._token_balance(str(token_id))
 
                         if result:
                             amount = float(result.get('balance', '0') or '0')
@@ -747,16 +1382,12 @@ class AutoTraderV5:
 
                             if actual_size < 0.5:
                                 # 余额为0，说明已手动平仓或市场结算
-                                print(f"[CLEANUP] ✅ 持仓 #{pos_id} 余额为{actual_size:.2f}，已平仓")
+                                logger.info("[CLEANUP] ✅ 持仓 #%s 余额为%.2f，已平仓", pos_id, actual_size)
 
                                 # 判断是手动平仓还是市场结算
-                                cursor.execute("SELECT exit_token_price FROM positions WHERE id = ?", (pos_id,))
-                                exit_price_row = cursor.fetchone()
-                                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-                                if not exit_price_row or not exit_price_row[0]:
+                                if not exit_token_price:
                                     # 没有exit记录，标记为MARKET_SETTLED
-                                    cursor.execute("""
+                                    closing_updates.append(("""
                                         UPDATE positions
                                         SET exit_time = ?, exit_token_price = ?, exit_reason = ?, status = 'closed'
                                         WHERE id = ?
@@ -765,266 +1396,478 @@ class AutoTraderV5:
                                         0.0,  # 市场结算价格为0
                                         'MARKET_SETTLED',
                                         pos_id
-                                    ))
-                                    print(f"[CLEANUP] ✅ 持仓 #{pos_id} 已标记为MARKET_SETTLED")
+                                    )))
+                                    logger.info("[CLEANUP] ✅ 持仓 #%s 已标记为MARKET_SETTLED", pos_id)
                                 else:
                                     # 有exit记录，标记为MANUAL_CLOSED
-                                    cursor.execute("""
+                                    closing_updates.append(("""
                                         UPDATE positions
                                         SET status = 'closed', exit_reason = 'MANUAL_CLOSED'
                                         WHERE id = ?
-                                    """, (pos_id,))
-                                    print(f"[CLEANUP] ✅ 持仓 #{pos_id} 已标记为MANUAL_CLOSED")
+                                    """, (pos_id,)))
+                                    logger.info("[CLEANUP] ✅ 持仓 #%s 已标记为MANUAL_CLOSED", pos_id)
                             else:
                                 # 余额不为0，重置为open状态，让监控系统继续处理
-                                print(f"[CLEANUP] 🔓 持仓 #{pos_id} 余额为{actual_size:.2f}，重置为'open'")
-                                cursor.execute("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,))
+                                logger.info("[CLEANUP] 🔓 持仓 #%s 余额为%.2f，重置为'open'", pos_id, actual_size)
+                                closing_updates.append(("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,)))
 
                     except Exception as e:
-                        print(f"[CLEANUP] ⚠️ 处理持仓 #{pos_id} 失败: {e}，重置为'open'")
+                        logger.info("[CLEANUP] ⚠️ 处理持仓 #%s 失败: %s，重置为'open'", pos_id, e)
                         # 失败时也重置为open，避免卡住
-                        cursor.execute("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,))
+                        closing_updates.append(("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,)))
 
-                self.safe_commit(conn)
-                print(f"[CLEANUP] ✅ 'closing'状态持仓清理完成")
+                with self._db_lock:
+                    conn = self._conn()
+                    for sql, params in closing_updates:
+                        conn.execute(sql, params)
+                    self.safe_commit(conn)
+                logger.info("[CLEANUP] ✅ 'closing'状态持仓清理完成")
 
             # 原有逻辑：获取超过20分钟的open持仓
-            cursor.execute("""
-                SELECT id, entry_time, side, entry_token_price, size, value_usdc, token_id,
+            positions = self._query("""
+                SELECT id,
+                       CAST(strftime('%s', 'now', 'localtime') AS INTEGER)
+                         - CAST(strftime('%s', entry_time) AS INTEGER) AS elapsed,
+                       side, entry_token_price, size, value_usdc, token_id,
                        take_profit_order_id, stop_loss_order_id
                 FROM positions
                 WHERE status = 'open'
             """)
-            positions = cursor.fetchall()
             cleaned = 0
 
-            for pos_id, entry_time, side, entry_price, size, value_usdc, token_id, tp_order_id, sl_order_id in positions:
-                try:
-                    entry_dt = datetime.strptime(entry_time, '%Y-%m-%d %H:%M:%S')
-                    elapsed = (datetime.now() - entry_dt).total_seconds()
+            # 🚀 持仓时长由SQLite直接算出（entry_time为本地时间，与'now','localtime'同基准），
+            # 不再逐行datetime.strptime
+            stale = []
+            for pos in positions:
+                pos_id, elapsed = pos[0], pos[1]
+                if elapsed is None:
+                    logger.info("[CLEANUP] 处理持仓 #%s 失败: entry_time无法解析", pos_id)
+                    continue
+                if elapsed > 1200:  # 超过20分钟
+                    logger.info("[CLEANUP] 持仓 #%s 超过20分钟(%.1f分钟)，执行清理", pos_id, elapsed/60)
+                    stale.append(pos)
+
+            # 写回时间每批只格式化一次
+            now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            # 🚀 并行清理：各持仓的撤单/平仓/等待成交互不依赖，用线程池并发执行
+            # sqlite连接不跨线程使用：worker只返回待执行的UPDATE，由主线程统一写库
+            # 🚀 批量写库：按SQL分组收集参数，最后executemany + 一次commit（N次fsync → 1次）
+            pending_updates = {}
+            if stale:
+                with ThreadPoolExecutor(max_workers=min(8, len(stale))) as executor:
+                    futures = {executor.submit(self._cleanup_one, pos, now_str): pos[0] for pos in stale}
+                    for future in as_completed(futures):
+                        pos_id = futures[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            logger.info("[CLEANUP] 处理持仓 #%s 失败: %s", pos_id, e)
+                            logger.info("[CLEANUP] Traceback: %s", traceback.format_exc())
+                            continue
+                        if not result:
+                            continue
+                        (sql, params), pnl_usd = result
+                        pending_updates.setdefault(sql, []).append(params)
+                        if pnl_usd < 0:
+                            self.stats['daily_loss'] += abs(pnl_usd)
+                        cleaned += 1
+
+            if pending_updates:
+                with self._db_lock:
+                    conn = self._conn()
+                    for sql, batch in pending_updates.items():
+                        conn.executemany(sql, batch)
+                    self.safe_commit(conn)
+
+            if cleaned > 0:
+                logger.info("[CLEANUP] ✅ 清理了 %s 笔过期持仓", cleaned)
+        except Exception as e:
+            logger.info("[CLEANUP ERROR] %s", e)
+            logger.info("[CLEANUP] Traceback: %s", traceback.format_exc())
 
-                    if elapsed > 1200:  # 超过20分钟
-                        print(f"[CLEANUP] 持仓 #{pos_id} 超过20分钟({elapsed/60:.1f}分钟)，执行清理")
+    def _cleanup_one(self, pos, now_str: str) -> Optional[Tuple[Tuple[str, tuple], float]]:
+        """清理单个过期持仓（在线程池中运行，不访问数据库）
 
-                        # 🚀 优化：先查询链上订单状态
-                        orders_exist = False
-                        orders_cancelled = False
+        返回 ((sql, params), pnl_usd)，由调用方在主线程写库；无需更新时返回None
+        """
+        pos_id, elapsed, side, entry_price, size, value_usdc, token_id, tp_order_id, sl_order_id = pos
 
-                        # 检查止盈单状态
-                        if tp_order_id:
-                            try:
-                                tp_order = self.client.get_order(tp_order_id)
-                                if tp_order:
-                                    status = tp_order.get('status', '').upper()
-                                    if status in ('FILLED', 'MATCHED'):
-                                        # 止盈单已成交，更新数据库
-                                        print(f"[CLEANUP] ✅ 发现止盈单已成交: {tp_order_id[-8:]}")
-                                        avg_price = tp_order.get('avgPrice') or tp_order.get('price')
-                                        if avg_price:
-                                            try:
-                                                exit_p = float(avg_price)
-                                                if 0.01 <= exit_p <= 0.99:
-                                                    pnl_usd = size * (exit_p - entry_price)
-                                                    pnl_pct = (pnl_usd / (size * entry_price)) * 100 if size * entry_price > 0 else 0
-
-                                                    cursor.execute("""
-                                                        UPDATE positions
-                                                        SET status='closed', exit_reason='TAKE_PROFIT',
-                                                            exit_time=?, exit_token_price=?, pnl_usd=?, pnl_pct=?
-                                                        WHERE id=?
-                                                    """, (
-                                                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                                        exit_p, pnl_usd, pnl_pct, pos_id
-                                                    ))
-                                                    self.safe_commit(conn)
-                                                    print(f"[CLEANUP] ✅ 持仓 #{pos_id} 止盈成交: ${pnl_usd:+.2f} ({pnl_pct:+.1f}%) @ {exit_p:.4f}")
-                                                    if pnl_usd < 0:
-                                                        self.stats['daily_loss'] += abs(pnl_usd)
-                                                    cleaned += 1
-                                                    continue  # 跳过后续处理
-                                            except:
-                                                pass
-                                    elif status in ('LIVE', 'OPEN'):
-                                        orders_exist = True
-                                        print(f"[CLEANUP] 止盈单仍存在: {tp_order_id[-8:]} ({status})")
-                                    else:
-                                        print(f"[CLEANUP] 止盈单状态: {status}")
-                            except Exception as e:
-                                err_str = str(e).lower()
-                                if 'not found' in err_str or 'does not exist' in err_str:
-                                    print(f"[CLEANUP] 止盈单不存在（可能已成交或取消）")
-                                else:
-                                    print(f"[CLEANUP] 查询止盈单失败: {e}")
+        # 🚀 优化：先查询链上订单状态
+        orders_exist = False
 
-                        # 检查止损单状态（如果止损单是订单ID而不是价格）
-                        if sl_order_id and sl_order_id.startswith('0x'):
+        # 检查止盈单状态
+        if tp_order_id:
+            try:
+                tp_order = self.client.get_order(tp_order_id)
+                if tp_order:
+                    status = tp_order.get('status', '').upper()
+                    if status in ('FILLED', 'MATCHED'):
+                        # 止盈单已成交，更新数据库
+                        logger.info("[CLEANUP] ✅ 发现止盈单已成交: %s", tp_order_id[-8:])
+                        avg_price = tp_order.get('avgPrice') or tp_order.get('price')
+                        if avg_price:
                             try:
-                                sl_order = self.client.get_order(sl_order_id)
-                                if sl_order:
-                                    status = sl_order.get('status', '').upper()
-                                    if status in ('LIVE', 'OPEN'):
-                                        orders_exist = True
-                                        print(f"[CLEANUP] 止损单仍存在: {sl_order_id[-8:]} ({status})")
-                            except Exception as e:
-                                err_str = str(e).lower()
-                                if 'not found' in err_str or 'does not exist' in err_str:
-                                    print(f"[CLEANUP] 止损单不存在")
-
-                        # 🎯 关键优化：如果链上订单都不存在 → 市场已到期归零
-                        if not orders_exist:
-                            print(f"[CLEANUP] ⚠️  链上订单已不存在，判断为市场到期归零")
-                            pnl_usd = 0 - (size * entry_price)  # 全亏
-                            pnl_pct = -100.0
-
-                            cursor.execute("""
-                                UPDATE positions
-                                SET status='closed', exit_reason='MARKET_SETTLED',
-                                    exit_time=?, exit_token_price=0, pnl_usd=?, pnl_pct=?
-                                WHERE id=?
-                            """, (
-                                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                pnl_usd, pnl_pct, pos_id
-                            ))
-                            self.safe_commit(conn)
-                            print(f"[CLEANUP] ✅ 持仓 #{pos_id} 已归零: ${pnl_usd:+.2f} ({pnl_pct:+.1f}%)")
-                            if pnl_usd < 0:
-                                self.stats['daily_loss'] += abs(pnl_usd)
-                            cleaned += 1
-                            continue
+                                exit_p = float(avg_price)
+                                if 0.01 <= exit_p <= 0.99:
+                                    pnl_usd = size * (exit_p - entry_price)
+                                    pnl_pct = (pnl_usd / (size * entry_price)) * 100 if size * entry_price > 0 else 0
 
-                        # 如果链上订单还存在，尝试取消并平仓
-                        print(f"[CLEANUP] 🔄 链上订单仍存在，尝试取消并平仓")
+                                    update = ("""
+                                        UPDATE positions
+                                        SET status='closed', exit_reason='TAKE_PROFIT',
+                                            exit_time=?, exit_token_price=?, pnl_usd=?, pnl_pct=?
+                                        WHERE id=?
+                                    """, (
+                                        now_str,
+                                        exit_p, pnl_usd, pnl_pct, pos_id
+                                    ))
+                                    logger.info("[CLEANUP] ✅ 持仓 #%s 止盈成交: $%+.2f (%+.1f%%) @ %.4f", pos_id, pnl_usd, pnl_pct, exit_p)
+                                    return update, pnl_usd
+                            except:
+                                pass
+                    elif status in ('LIVE', 'OPEN'):
+                        orders_exist = True
+                        logger.info("[CLEANUP] 止盈单仍存在: %s (%s)", tp_order_id[-8:], status)
+                    else:
+                        logger.info("[CLEANUP] 止盈单状态: %s", status)
+            except Exception as e:
+                err_str = str(e).lower()
+                if 'not found' in err_str or 'does not exist' in err_str:
+                    logger.info("[CLEANUP] 止盈单不存在（可能已成交或取消）")
+                else:
+                    logger.info("[CLEANUP] 查询止盈单失败: %s", e)
 
-                        # 取消订单
-                        if tp_order_id:
-                            try:
-                                self.cancel_order(tp_order_id)
-                                print(f"[CLEANUP] 已取消止盈单: {tp_order_id[-8:]}")
-                                orders_cancelled = True
-                            except Exception as e:
-                                print(f"[CLEANUP] 取消止盈单失败: {e}")
+        # 检查止损单状态（如果止损单是订单ID而不是价格）
+        if sl_order_id and sl_order_id.startswith('0x'):
+            try:
+                sl_order = self.client.get_order(sl_order_id)
+                if sl_order:
+                    status = sl_order.get('status', '').upper()
+                    if status in ('LIVE', 'OPEN'):
+                        orders_exist = True
+                        logger.info("[CLEANUP] 止损单仍存在: %s (%s)", sl_order_id[-8:], status)
+            except Exception as e:
+                err_str = str(e).lower()
+                if 'not found' in err_str or 'does not exist' in err_str:
+                    logger.info("[CLEANUP] 止损单不存在")
 
-                        if sl_order_id and sl_order_id.startswith('0x'):
-                            try:
-                                self.cancel_order(sl_order_id)
-                                print(f"[CLEANUP] 已取消止损单: {sl_order_id[-8:]}")
-                                orders_cancelled = True
-                            except Exception as e:
-                                print(f"[CLEANUP] 取消止损单失败: {e}")
+        # 🎯 关键优化：如果链上订单都不存在 → 市场已到期归零
+        if not orders_exist:
+            logger.info("[CLEANUP] ⚠️  链上订单已不存在，判断为市场到期归零")
+            pnl_usd = 0 - (size * entry_price)  # 全亏
+            pnl_pct = -100.0
 
-                        # 尝试市价平仓
-                        try:
-                            from py_clob_client.clob_types import OrderArgs
-                            import time
+            update = ("""
+                UPDATE positions
+                SET status='closed', exit_reason='MARKET_SETTLED',
+                    exit_time=?, exit_token_price=0, pnl_usd=?, pnl_pct=?
+                WHERE id=?
+            """, (
+                now_str,
+                pnl_usd, pnl_pct, pos_id
+            ))
+            logger.info("[CLEANUP] ✅ 持仓 #%s 已归零: $%+.2f (%+.1f%%)", pos_id, pnl_usd, pnl_pct)
+            return update, pnl_usd
 
-                            # 获取当前市场价格
-                            try:
-                                current_price = self.get_order_book(token_id, side='BUY')
-                                if not current_price or current_price <= 0.01:
-                                    price_url = "https://clob.polymarket.com/price"
-                                    price_resp = self.http_session.get(
-                                        price_url,
-                                        params={"token_id": token_id, "side": "BUY"},
-                                        proxies=CONFIG['proxy'],
-                                        timeout=10
-                                    )
-                                    if price_resp.status_code == 200:
-                                        current_price = float(price_resp.json().get('price', entry_price))
-                                    else:
-                                        current_price = entry_price
-                            except:
-                                current_price = entry_price
+        # 如果链上订单还存在，尝试取消并平仓
+        logger.info("[CLEANUP] 🔄 链上订单仍存在，尝试取消并平仓")
 
-                            # 计算平仓价格（打3%折确保成交）
-                            close_price = max(0.01, current_price * 0.97)
+        # 取消订单
+        if tp_order_id:
+            try:
+                self.cancel_order(tp_order_id)
+                logger.info("[CLEANUP] 已取消止盈单: %s", tp_order_id[-8:])
+            except Exception as e:
+                logger.info("[CLEANUP] 取消止盈单失败: %s", e)
 
-                            close_order_args = OrderArgs(
-                                token_id=token_id,
-                                price=close_price,
-                                size=float(size),
-                                side=SELL
-                            )
+        if sl_order_id and sl_order_id.startswith('0x'):
+            try:
+                self.cancel_order(sl_order_id)
+                logger.info("[CLEANUP] 已取消止损单: %s", sl_order_id[-8:])
+            except Exception as e:
+                logger.info("[CLEANUP] 取消止损单失败: %s", e)
 
-                            print(f"[CLEANUP] 挂市价平仓单: {close_price:.4f} × {size:.0f}")
-                            close_response = self.client.create_and_post_order(close_order_args)
+        # 尝试市价平仓
+        try:
 
-                            if close_response and 'orderID' in close_response:
-                                close_order_id = close_response['orderID']
-                                print(f"[CLEANUP] 平仓单已挂: {close_order_id[-8:]}")
+            # 获取当前市场价格（带3秒缓存，多个持仓同token时只请求一次）
+            current_price = self._get_market_price(token_id, fallback=entry_price)
 
-                                # 等待成交
-                                for wait_i in range(5):
-                                    time.sleep(1)
-                                    try:
-                                        close_order = self.client.get_order(close_order_id)
-                                        if close_order and close_order.get('status') in ('FILLED', 'MATCHED'):
-                                            filled_price = close_order.get('price', close_price)
-                                            # 计算盈亏
-                                            pnl_usd = size * (filled_price - entry_price)
-                                            pnl_pct = (pnl_usd / (size * entry_price)) * 100 if size * entry_price > 0 else 0
-
-                                            cursor.execute("""
-                                                UPDATE positions
-                                                SET status='closed', exit_reason='STALE_CLEANUP',
-                                                    exit_time=?, exit_token_price=?, pnl_usd=?, pnl_pct=?
-                                                WHERE id=?
-                                            """, (
-                                                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                                filled_price,
-                                                pnl_usd,
-                                                pnl_pct,
-                                                pos_id
-                                            ))
-                                            self.safe_commit(conn)
-                                            print(f"[CLEANUP] ✅ 持仓 #{pos_id} 已平仓: ${pnl_usd:+.2f} ({pnl_pct:+.1f}%)")
-                                            if pnl_usd < 0:
-                                                self.stats['daily_loss'] += abs(pnl_usd)
-                                            cleaned += 1
-                                            break
-                                    except:
-                                        pass
-                                else:
-                                    # 等待超时，仍然标记为closed
-                                    print(f"[CLEANUP] ⚠️  平仓单未立即成交，标记为closed")
-                                    cursor.execute("""
-                                        UPDATE positions SET status='closed', exit_reason='STALE_CLEANUP',
-                                        exit_time=? WHERE id=?
-                                    """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), pos_id))
-                                    self.safe_commit(conn)
-                                    cleaned += 1
-                            else:
-                                print(f"[CLEANUP] ❌ 平仓单失败，仅标记为closed")
-                                cursor.execute("""
-                                    UPDATE positions SET status='closed', exit_reason='STALE_CLEANUP',
-                                    exit_time=? WHERE id=?
-                                """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), pos_id))
-                                self.safe_commit(conn)
-                                cleaned += 1
-
-                        except Exception as close_error:
-                            err_msg = str(close_error)
-                            # 即使平仓失败，也标记为closed
-                            print(f"[CLEANUP] 平仓异常: {close_error}，标记为closed")
-                            cursor.execute("""
-                                UPDATE positions SET status='closed', exit_reason='STALE_CLEANUP',
-                                exit_time=? WHERE id=?
-                            """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), pos_id))
-                            self.safe_commit(conn)
-                            cleaned += 1
+            # 计算平仓价格（打3%折确保成交）
+            close_price = max(0.01, current_price * 0.97)
 
-                except Exception as e:
-                    print(f"[CLEANUP] 处理持仓 #{pos_id} 失败: {e}")
-                    import traceback
-                    print(f"[CLEANUP] Traceback: {traceback.format_exc()}")
-                    pass
+            close_order_args = OrderArgs(
+                token_id=token_id,
+                price=close_price,
+                size=float(size),
+                side=SELL
+            )
 
-            conn.close()
-            if cleaned > 0:
-                print(f"[CLEANUP] ✅ 清理了 {cleaned} 笔过期持仓")
+            logger.info("[CLEANUP] 挂市价平仓单: %.4f × %.0f", close_price, size)
+            close_response = self.client.create_and_post_order(close_order_args)
+
+            if close_response and 'orderID' in close_response:
+                close_order_id = close_response['orderID']
+                logger.info("[CLEANUP] 平仓单已挂: %s", close_order_id[-8:])
+
+                # 🚀 等待成交（优先WebSocket推送，断线时回退轮询）
+                fill = self._wait_order_fill(close_order_id, timeout=5)
+                if fill:
+                    filled_price = fill['price'] or close_price
+                    # 计算盈亏
+                    pnl_usd = size * (filled_price - entry_price)
+                    pnl_pct = (pnl_usd / (size * entry_price)) * 100 if size * entry_price > 0 else 0
+
+                    update = ("""
+                        UPDATE positions
+                        SET status='closed', exit_reason='STALE_CLEANUP',
+                            exit_time=?, exit_token_price=?, pnl_usd=?, pnl_pct=?
+                        WHERE id=?
+                    """, (
+                        now_str,
+                        filled_price,
+                        pnl_usd,
+                        pnl_pct,
+                        pos_id
+                    ))
+                    logger.info("[CLEANUP] ✅ 持仓 #%s 已平仓: $%+.2f (%+.1f%%)", pos_id, pnl_usd, pnl_pct)
+                    return update, pnl_usd
+                else:
+                    # 等待超时，仍然标记为closed
+                    logger.info("[CLEANUP] ⚠️  平仓单未立即成交，标记为closed")
+                    update = ("""
+                        UPDATE positions SET status='closed', exit_reason='STALE_CLEANUP',
+                        exit_time=? WHERE id=?
+                    """, (now_str, pos_id))
+                    return update, 0.0
+            else:
+                logger.info("[CLEANUP] ❌ 平仓单失败，仅标记为closed")
+                update = ("""
+                    UPDATE positions SET status='closed', exit_reason='STALE_CLEANUP',
+                    exit_time=? WHERE id=?
+                """, (now_str, pos_id))
+                return update, 0.0
+
+        except Exception as close_error:
+            # 即使平仓失败，也标记为closed
+            logger.info("[CLEANUP] 平仓异常: %s，标记为closed", close_error)
+            update = ("""
+                UPDATE positions SET status='closed', exit_reason='STALE_CLEANUP',
+                exit_time=? WHERE id=?
+            """, (now_str, pos_id))
+            return update, 0.0
+
+    def _get_market_price(self, token_id: str, fallback: float, ttl: float = 3.0) -> float:
+        """获取token买一价（/price），按token_id缓存ttl秒；失败返回fallback
+
+        同一token加锁，线程池并发清理时也只发一次请求。
+        """
+        with self._price_cache_lock:
+            token_lock = self._price_locks.setdefault(token_id, threading.Lock())
+        with token_lock:
+            cached = self._price_cache.get(token_id)
+            now = time.monotonic()
+            if cached and now - cached[1] < ttl:
+                return cached[0]
+            try:
+                price = self.get_order_book(token_id, side='BUY')
+            except Exception:
+                price = None
+            if not price or price <= 0.01:
+                return fallback
+            self._price_cache[token_id] = (price, now)
+            return price
+
+    def _token_balance(self, token_id: str, max_age: float = 2.0) -> Optional[Dict]:
+        """查询条件token的余额/授权（按token_id做2秒TTL缓存）
+
+        同一次挂单/平仓流程里的重复查询合并为一次RTT。
+        状态刚变化（撤单后、等待到账/授权生效）时传 max_age=0 强制查询最新值。
+        """
+        with self._bal_cache_lock:
+            cached = self._bal_cache.get(token_id)
+        if cached and time.monotonic() - cached[1] < max_age:
+            return cached[0]
+        result = self.client.get_balance_allowance(_bal_params(token_id))
+        with self._bal_cache_lock:
+            self._bal_cache[token_id] = (result, time.monotonic())
+        return result
+
+    def _wait_token_arrival(self, token_id: str, expected_size: float, timeout: float = 10) -> bool:
+        """成交后轮询链上余额，直到到账95%以上（指数退避，最多timeout秒），替代固定sleep"""
+        waited = 0.0
+        for delay in _poll_intervals(timeout):
+            try:
+                result = self._token_balance(token_id, max_age=0)
+                if result:
+                    on_chain = float(result.get('balance', '0') or '0') / 1e6
+                    if on_chain >= expected_size * 0.95:
+                        logger.info("       [STOP ORDERS] ✅ Token已到账: %s (%.1f秒)", on_chain, waited)
+                        return True
+            except Exception as e:
+                logger.info("       [STOP ORDERS] 查询到账失败: %s", e)
+            time.sleep(delay)
+            waited += delay
+        logger.info("       [STOP ORDERS] ⚠️  %s秒内未确认到账，继续挂单", timeout)
+        return False
+
+    def _allowance_key(self, token_id: str) -> str:
+        return f"{CONFIG['wallet_address']}:{token_id}:{AssetType.CONDITIONAL}"
+
+    def _allowance_cache(self):
+        """懒加载授权磁盘缓存（与数据库同目录，DATA_DIR持久化卷）"""
+        if self._allowance_disk_cache is None:
+            data_dir = os.getenv('DATA_DIR', '/app/data')
+            os.makedirs(data_dir, exist_ok=True)
+            self._allowance_disk_cache = shelve.open(os.path.join(data_dir, 'allowances'), writeback=False)
+            atexit.register(self._allowance_disk_cache.close)
+        return self._allowance_disk_cache
+
+    def _allowance_known(self, token_id: str) -> bool:
+        try:
+            with self._allowance_cache_lock:
+                return self._allowance_cache().get(self._allowance_key(token_id)) is True
+        except Exception as e:
+            logger.info("       [ALLOWANCE] 读取授权缓存失败: %s", e)
+            return False
+
+    def _set_allowance_known(self, token_id: str, ok: bool = True):
+        try:
+            with self._allowance_cache_lock:
+                cache = self._allowance_cache()
+                key = self._allowance_key(token_id)
+                if ok:
+                    cache[key] = True
+                else:
+                    cache.pop(key, None)
+                cache.sync()
         except Exception as e:
-            print(f"[CLEANUP ERROR] {e}")
-            import traceback
-            print(f"[CLEANUP] Traceback: {traceback.format_exc()}")
+            logger.info("       [ALLOWANCE] 写入授权缓存失败: %s", e)
+
+    def _prefetch_ctf_balances(self, token_ids) -> Dict[str, Dict]:
+        """用一次链上balanceOfBatch预取多个条件token余额，返回 {token_id: {'balance': ...}}
+
+        链上结果只有余额没有allowance，不写入_bal_cache（避免读方在TTL内拿到allowance=0）；
+        批量查询失败时回退为CLOB并发查询（结果进_bal_cache），返回空dict。
+        """
+        token_ids = [str(t) for t in dict.fromkeys(token_ids) if t]
+        if not token_ids:
+            return {}
+        try:
+            balances = self.balance_detector.fetch_ctf_balances(token_ids)
+        except (ValueError, TypeError) as e:
+            logger.info("       [BALANCE] 链上批量查询余额失败: %s", e)
+            balances = {}
+        if len(balances) == len(token_ids):
+            # 与get_balance_allowance同格式（balance为1e6精度字符串）
+            return {tid: {'balance': str(raw)} for tid, raw in balances.items()}
+        self._prefetch_token_balances(token_ids)
+        return {}
+
+    def _prefetch_token_balances(self, token_ids):
+        """并发查询多个token余额写入缓存（CLOB无批量接口，用线程池并发代替N次串行RTT）"""
+        token_ids = list(dict.fromkeys(token_ids))
+        if len(token_ids) < 2:
+            return
+
+        def _fetch(tid):
+            try:
+                self._token_balance(tid, max_age=0)
+            except Exception as e:
+                logger.info("       [BALANCE] 预取余额失败 %s: %s", tid[-8:], e)
+
+        with ThreadPoolExecutor(max_workers=min(8, len(token_ids))) as pool:
+            list(pool.map(_fetch, token_ids))
+
+    def _get_order_cached(self, order_id: str) -> Optional[Dict]:
+        """查询订单状态：user频道推送过该订单则直接用内存状态，否则回退REST get_order"""
+        if self.fill_listener:
+            state = self.fill_listener.order_status(order_id)
+            if state:
+                return state
+        return self.client.get_order(order_id)
+
+    def _await_order(self, order_id: str, timeout: float) -> Optional[Dict]:
+        """等待订单状态：推送已连接时最多等timeout秒、终态一到立即返回；否则/未推送时sleep后查REST"""
+        if self.fill_listener and self.fill_listener.connected:
+            state = self.fill_listener.wait_status(order_id, timeout)
+            if state and state['status'] in ('MATCHED', 'CANCELED'):
+                return state
+        else:
+            time.sleep(timeout)
+        return self.client.get_order(order_id)
+
+    def _close_fill_price(self, order_id: str, fallback: float, tag: str, window: float = 1.5) -> float:
+        """平仓单实际成交价：推送已连接时一次等待到终态（到达即返回），否则分3次sleep+REST轮询；未确认成交返回fallback"""
+        pushed = self.fill_listener is not None and self.fill_listener.connected
+        attempts = 1 if pushed else 3
+        for attempt in range(1, attempts + 1):
+            try:
+                order = self._await_order(order_id, window / attempts)
+                if order:
+                    status = str(order.get('status', '')).upper()
+                    if status in ('FILLED', 'MATCHED') or _fnum(order, 'matchedSize') > 0:
+                        price = fallback
+                        avg_p = order.get('avgPrice') or order.get('price')
+                        if avg_p:
+                            parsed = float(avg_p)
+                            if _MIN_PRICE <= parsed <= _MAX_PRICE:
+                                price = parsed
+                        logger.info("       [%s] ✅ 实际成交价: %.4f (尝试%s次)", tag, price, attempt)
+                        return price
+                    logger.info("       [%s] ⏳ 平仓单未成交(status=%s)，继续等待(%s/%s)...", tag, status, attempt, attempts)
+            except Exception as e:
+                logger.info("       [%s] 查询成交价失败(%s/%s): %s", tag, attempt, attempts, e)
+        logger.info("       [%s] ⚠️ 平仓单%.1f秒内未确认成交，使用发单时价格: %.4f", tag, window, fallback)
+        return fallback
+
+    def _confirm_push_fill(self, order_id: str, fill: Dict) -> Optional[Dict]:
+        """确认推送的成交是否完全成交：首个trade推送可能只是部分成交
+
+        推送状态里 size_matched >= original_size 才直接采用（价格取推送成交价）；
+        部分成交/状态未知时回退REST get_order确认，未完全成交返回None。
+        """
+        state = self.fill_listener.order_status(order_id) if self.fill_listener else None
+        if state and state['original_size'] > 0 and state['size_matched'] >= state['original_size']:
+            return {'price': fill['price'], 'size': state['size_matched'], 'status': 'MATCHED'}
+        try:
+            order = self.client.get_order(order_id)
+        except Exception as e:
+            logger.info("       [FILL] 推送成交确认失败 %s: %s", order_id[-8:], e)
+            return None
+        if not order:
+            return None
+        status = str(order.get('status', '')).upper()
+        matched = _fnum(order, 'size_matched')
+        original = _fnum(order, 'original_size')
+        if status in ('FILLED', 'MATCHED') and (original <= 0 or matched >= original):
+            return {'price': fill['price'] or _fnum(order, 'price'), 'size': matched, 'status': status}
+        logger.info("       [FILL] 订单 %s 仅部分成交(%s/%s, status=%s)", order_id[-8:], matched, original, status)
+        return None
+
+    def _wait_order_fill(self, order_id: str, timeout: float = 5.0) -> Optional[Dict]:
+        """等待订单成交，返回 {'price', 'size', 'status'}；未成交返回None
+
+        优先等待user频道WebSocket推送；推送未连接时回退为每秒轮询get_order。
+        """
+        if self.fill_listener and self.fill_listener.connected:
+            fill = self.fill_listener.wait_fill(order_id, timeout)
+            return self._confirm_push_fill(order_id, fill) if fill and fill['status'] != 'CANCELED' else None
+
+        for _ in range(max(1, int(timeout))):
+            time.sleep(1)
+            try:
+                order = self.client.get_order(order_id)
+                if order and str(order.get('status', '')).upper() in ('FILLED', 'MATCHED'):
+                    return {
+                        'price': _fnum(order, 'price'),
+                        'size': _fnum(order, 'size_matched'),
+                        'status': str(order.get('status')).upper(),
+                    }
+            except Exception:
+                pass
+        return None
 
     def init_clob_client(self):
         if not CONFIG['private_key'] or not CLOB_AVAILABLE:
@@ -1054,6 +1897,18 @@ class AutoTraderV5:
                 funder=CONFIG['wallet_address']  # <--- 【核心修复：代理地址】
             )
 
+            # 🚀 下单连接保活（create_and_post_order 复用已握手的连接）
+            self._start_clob_keepalive()
+
+            # 🚀 订阅user频道成交推送（替代轮询get_order等待成交）
+            if WS_AVAILABLE:
+                try:
+                    self.fill_listener = OrderFillListener(api_creds)
+                    self.fill_listener.start()
+                except Exception as e:
+                    print(f"[WARN] 成交推送启动失败，回退轮询: {e}")
+                    self.fill_listener = None
+
             # 初始化时做一次全局授权（解决 not enough balance / allowance）
             try:
                 self.update_allowance_fixed(AssetType.COLLATERAL)
@@ -1070,8 +1925,6 @@ class AutoTraderV5:
 
     def safe_commit(self, connection):
         """带有重试机制的安全数据库提交 (防止多线程高频并发锁死)"""
-        import time
-        import sqlite3
         for i in range(5):
             try:
                 connection.commit()
@@ -1104,8 +1957,24 @@ class AutoTraderV5:
         
         cursor = self.conn.cursor()
         cursor.execute('PRAGMA journal_mode=WAL;')
+        # WAL模式下NORMAL足够安全，且commit不再每次fsync
+        cursor.execute('PRAGMA synchronous=NORMAL;')
+        cursor.execute('PRAGMA temp_store=MEMORY;')
+        cursor.execute('PRAGMA mmap_size=67108864;')  # 64MB内存映射读
+        cursor.execute('PRAGMA wal_autocheckpoint=1000;')
+        cursor.execute('PRAGMA cache_size=-64000;')  # 64MB页缓存
+        # 🚀 热路径（风控/持仓查询）统一复用这一条持久连接，用RLock串行化跨线程访问
+        self._db_lock = threading.RLock()
+        self._pred_db = None
+        # 🚀 open/closing持仓行缓存：(版本戳, rows)，库无变化时不再重复查询
+        self._open_position_rows_cache: Tuple[Optional[Tuple[int, int]], list] = (None, [])
+        # 🚀 open持仓计数缓存：(版本戳, count)
+        self._open_count_cache: Tuple[Optional[Tuple[int, int]], int] = (None, 0)
         # ===============================================
 
+        # 🚀 所有建表/迁移/建索引放在一个显式事务里，启动时只提交一次
+        cursor.execute('BEGIN')
+
         # 交易表
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS trades (
@@ -1150,65 +2019,100 @@ class AutoTraderV5:
             )
         """)
 
-        # 🔥 数据库迁移：为已存在的表添加 score 列
-        try:
-            cursor.execute("SELECT score FROM positions LIMIT 1")
-        except sqlite3.OperationalError:
-            cursor.execute("ALTER TABLE positions ADD COLUMN score REAL DEFAULT 0.0")
-            conn.commit()
-            print("[MIGRATION] 数据库已升级：positions表添加score列")
-
-        # 🔥 数据库迁移：添加 merged_from 列
-        try:
-            cursor.execute("SELECT merged_from FROM positions LIMIT 1")
-        except sqlite3.OperationalError:
-            cursor.execute("ALTER TABLE positions ADD COLUMN merged_from INTEGER DEFAULT 0")
-            conn.commit()
-            print("[MIGRATION] 数据库已升级：positions表添加merged_from列")
-
+        # 🔥 数据库迁移：用 PRAGMA table_info 一次取齐已有列，只为缺失的列执行 ALTER
+        # （不再靠 SELECT/ALTER 抛异常来探测，也不会吞掉无关错误）
+        pos_cols = {r[1] for r in cursor.execute("PRAGMA table_info(positions)")}
+        for col, ddl in (
+            ('score', "REAL DEFAULT 0.0"),
+            ('merged_from', "INTEGER DEFAULT 0"),
+            ('token_id', "TEXT"),
+            ('market_slug', "TEXT"),  # 🚀 冗余存储market_slug（平仓回填学习系统时无需再跨库查询）
+        ):
+            if col not in pos_cols:
+                cursor.execute(f"ALTER TABLE positions ADD COLUMN {col} {ddl}")
+                print(f"[MIGRATION] 数据库已升级：positions表添加{col}列")
+
+        # 🚀 索引：匹配风控/统计查询的谓词，避免每次信号全表扫描
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pos_token_side_time ON positions(token_id, side, entry_time)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pos_status ON positions(status) WHERE status IN ('open', 'closing')")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pos_entry_time ON positions(entry_time)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pos_exit ON positions(status, exit_time) WHERE status = 'closed'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_ts_status ON trades(timestamp, status)")
+        cursor.execute("ANALYZE")
         self.safe_commit(conn)
 
-        # 兼容旧数据库：添加 token_id 列（如果不存在）
-        try:
-            cursor.execute("ALTER TABLE positions ADD COLUMN token_id TEXT")
-            self.safe_commit(conn)
-        except:
-            pass  # 列已存在，忽略
-
         # 🔧 F1修复：self.conn 是持久连接，不能在这里关闭
         # conn.close() 已移除，self.conn 在整个生命周期保持打开
 
+    def _conn(self) -> sqlite3.Connection:
+        """返回持久数据库连接（调用方需持有 self._db_lock）"""
+        return self.conn
+
+    def _query(self, sql: str, params: tuple = (), one: bool = False):
+        """在持久连接上执行只读查询（加锁），one=True返回单行，否则返回全部行"""
+        with self._db_lock:
+            cursor = self._conn().execute(sql, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+
+    def _db_write(self, sql: str, params: tuple = ()) -> int:
+        """在持久连接上执行单条写语句并立即提交（加锁），返回影响行数"""
+        with self._db_lock:
+            cursor = self._conn().execute(sql, params)
+            self.safe_commit(self.conn)
+            return cursor.rowcount
+
+    def _open_position_rows(self) -> list:
+        """open/closing持仓（_SQL_SELECT_OPEN_POSITIONS的行）；数据库版本戳未变时直接返回上次结果"""
+        with self._db_lock:
+            version = self._db_version()
+            cached_version, rows = self._open_position_rows_cache
+            if version != cached_version:
+                rows = self._conn().execute(_SQL_SELECT_OPEN_POSITIONS).fetchall()
+                self._open_position_rows_cache = (version, rows)
+            return rows
+
+    def _pred_conn(self) -> sqlite3.Connection:
+        """预测学习库的持久只读连接（懒加载）"""
+        if self._pred_db is None:
+            pred_db_path = os.path.join(os.getenv('DATA_DIR', os.path.dirname(os.path.abspath(__file__))), 'btc_15min_predictionsv2.db')
+            self._pred_db = sqlite3.connect(pred_db_path, timeout=30.0, check_same_thread=False)
+        return self._pred_db
+
     def _restore_daily_stats(self):
         """从数据库恢复当天的亏损和交易统计，防止重启后风控失效"""
         try:
             today = datetime.now().date().strftime('%Y-%m-%d')
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
 
-            # 恢复当天已关闭持仓的亏损总额
-            cursor.execute("""
-                SELECT COALESCE(SUM(ABS(pnl_usd)), 0)
-                FROM positions
-                WHERE status = 'closed'
-                  AND pnl_usd < 0
-                  AND date(exit_time) = ?
-            """, (today,))
-            row = cursor.fetchone()
+            # 两个查询放在同一个读事务中：一致快照，只取一次读锁
+            with self._db_lock:
+                conn = self._conn()
+                own_txn = not conn.in_transaction
+                if own_txn:
+                    conn.execute('BEGIN DEFERRED')
+                try:
+                    # 恢复当天已关闭持仓的亏损总额
+                    row = conn.execute("""
+                        SELECT COALESCE(SUM(ABS(pnl_usd)), 0)
+                        FROM positions
+                        WHERE status = 'closed'
+                          AND pnl_usd < 0
+                          AND date(exit_time) = ?
+                    """, (today,)).fetchone()
+
+                    # 恢复当天交易次数
+                    row2 = conn.execute("""
+                        SELECT COUNT(*) FROM trades
+                        WHERE date(timestamp) = ? AND status = 'posted'
+                    """, (today,)).fetchone()
+                finally:
+                    if own_txn:
+                        conn.commit()
+
             if row and row[0]:
                 self.stats['daily_loss'] = float(row[0])
-
-            # 恢复当天交易次数
-            cursor.execute("""
-                SELECT COUNT(*) FROM trades
-                WHERE date(timestamp) = ? AND status = 'posted'
-            """, (today,))
-            row2 = cursor.fetchone()
             if row2 and row2[0]:
                 self.stats['daily_trades'] = int(row2[0])
 
-            conn.close()
             print(f"[RESTORE] 当天统计已恢复: 亏损=${self.stats['daily_loss']:.2f}, 交易={self.stats['daily_trades']}次")
         except Exception as e:
             print(f"[RESTORE] 恢复统计失败（不影响运行）: {e}")
@@ -1223,24 +2127,20 @@ class AutoTraderV5:
             # 去重key：市场窗口（slug）+ 方向
             signal_key = f"{market_slug}_{signal['direction']}"
 
-            # 检查最近是否已记录过该窗口的该方向信号
-            if not hasattr(self, '_last_signals'):
-                self._last_signals = {}
+            # 清理过期的信号记录（1小时前的）：OrderedDict按插入时间有序，只需从最旧端弹出
+            now_mono = time.monotonic()
+            last_signals = self._last_signals
+            while last_signals and now_mono - next(iter(last_signals.values())) > 3600:
+                last_signals.popitem(last=False)
 
             # 如果该窗口该方向已记录过，跳过
-            if signal_key in self._last_signals:
+            if signal_key in last_signals:
                 return  # 跳过重复信号
 
             # 记录该窗口该方向的信号
-            self._last_signals[signal_key] = datetime.now()
-
-            # 清理过期的信号记录（1小时前的）- 每50次调用清理一次，避免每次O(n)重建
-            current_time = datetime.now()
-            if len(self._last_signals) > 200:
-                self._last_signals = {
-                    k: v for k, v in self._last_signals.items()
-                    if (current_time - v).total_seconds() < 3600
-                }
+            last_signals[signal_key] = now_mono
+            if len(last_signals) > 4096:
+                last_signals.popitem(last=False)
 
             order_value = order_result.get('value', 0) if order_result else 0
             order_status = order_result.get('status', 'failed') if order_result else 'failed'
@@ -1305,45 +2205,60 @@ class AutoTraderV5:
             print(f"       [LEARNING VERIFY ERROR] {e}")
             return 0
 
+    def _queue_exit_result(self, pos_id: int, exit_token_price: float, actual_pnl_pct: float, exit_reason: str):
+        """平仓后回填学习系统：只入队，市场slug查询和写库由后台线程完成"""
+        try:
+            self._learning_queue.put_nowait((pos_id, exit_token_price, actual_pnl_pct, exit_reason))
+        except queue.Full:
+            logger.info("       [LEARNING EXIT ERROR] 回填队列已满，丢弃持仓 %s 的退出结果", pos_id)
+
+    def _drain_learning_exits(self):
+        """后台线程：取出队列中所有待回填的退出结果，一次批量写入学习库"""
+        while True:
+            items = [self._learning_queue.get()]
+            while True:
+                try:
+                    items.append(self._learning_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.learning_system.update_exit_results([
+                    (self._get_last_market_slug(pos_id), price, pnl_pct, reason)
+                    for pos_id, price, pnl_pct, reason in items
+                ])
+            except Exception as le:
+                logger.info("       [LEARNING EXIT ERROR] %s", le)
+
     def _get_last_market_slug(self, pos_id: int = None) -> str:
         """获取指定持仓对应的市场 slug，用于学习系统回填
-        
-        通过 positions.token_id 反查 predictions 表中对应的 market_slug。
+
+        开仓时已把 market_slug 写入 positions，直接按主键读取。
+        旧版本写入的持仓没有该列值，才回退到 predictions 表按时间反查。
         多持仓时每个持仓独立查询，避免回填到错误记录。
         """
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
             if pos_id:
-                # 通过 token_id 直接匹配 predictions 表的 market_slug
-                cursor.execute("""
-                    SELECT token_id, entry_time FROM positions WHERE id = ?
-                """, (pos_id,))
-                row = cursor.fetchone()
+                row = self._query("""
+                    SELECT market_slug, entry_time FROM positions WHERE id = ?
+                """, (pos_id,), one=True)
+                if row and row[0]:
+                    return row[0]
                 if row:
-                    token_id, entry_time = row
-                    # 在 predictions 表里找最近一条匹配该 token 的记录
+                    entry_time = row[1]
+                    # 旧持仓：在 predictions 表里找开仓前最近一条记录
                     try:
-                        pred_db_path = os.path.join(os.getenv('DATA_DIR', os.path.dirname(os.path.abspath(__file__))), 'btc_15min_predictionsv2.db')
-                        pred_conn = sqlite3.connect(pred_db_path)
-                        pred_cursor = pred_conn.cursor()
-                        pred_cursor.execute("""
-                            SELECT market_slug FROM predictions
-                            WHERE timestamp <= ? AND market_slug IS NOT NULL
-                            ORDER BY timestamp DESC LIMIT 1
-                        """, (entry_time,))
-                        pred_row = pred_cursor.fetchone()
-                        pred_conn.close()
+                        with self._db_lock:
+                            pred_row = self._pred_conn().execute("""
+                                SELECT market_slug FROM predictions
+                                WHERE timestamp <= ? AND market_slug IS NOT NULL
+                                ORDER BY timestamp DESC LIMIT 1
+                            """, (entry_time,)).fetchone()
                         if pred_row and pred_row[0]:
-                            conn.close()
                             return pred_row[0]
-                    except:
+                    except sqlite3.Error:
                         pass
-            conn.close()
-        except:
-            pass
+        except sqlite3.Error as e:
+            print(f"       [SLUG LOOKUP ERROR] {e}")
         return self.last_traded_market or ''
 
     def print_learning_reports(self):
@@ -1585,36 +2500,93 @@ class AutoTraderV5:
         except Exception as e:
             print(f"[ANALYSIS ERROR] {e}")
 
+    def _warm_connections(self):
+        """后台预热HTTP连接池（失败无影响，首次真实请求会重新建连）"""
+        def _warm():
+            for url in (f"{CONFIG['gamma_host']}/markets", f"{CONFIG['clob_host']}/time"):
+                try:
+                    self.http_session.get(url, params={'limit': 1}, proxies=self._proxy, timeout=5).close()
+                except requests.RequestException:
+                    pass
+        threading.Thread(target=_warm, name="http_warmup", daemon=True).start()
+
+    def _start_clob_keepalive(self):
+        """后台定时请求CLOB /time，保持SDK下单用的HTTP/2连接不被空闲断开
+
+        py_clob_client 所有请求共用模块级 httpx 客户端，订单签名在本地完成，
+        下单延迟主要在连接层：连接保持热态时 post_order 不再付 TLS 握手成本。
+        """
+        if getattr(self, '_clob_keepalive_started', False):
+            return
+        self._clob_keepalive_started = True
+        interval = CONFIG.get('clob_keepalive_sec', 20)
+
+        def _ping():
+            while True:
+                time.sleep(interval)
+                client = self.client
+                if client is None:
+                    continue
+                try:
+                    client.get_server_time()
+                except Exception as e:
+                    # 保活失败不影响主流程，记录后继续循环（避免守护线程静默退出）
+                    logger.debug("       [KEEPALIVE] CLOB保活请求失败: %s", e)
+        threading.Thread(target=_ping, name="clob_keepalive", daemon=True).start()
+
     def get_market_data(self) -> Optional[Dict]:
+        """当前15分钟市场数据（CONFIG['system']['market_ttl']秒内复用上次结果）"""
+        ts, cached = self._market_cache
+        now = time.monotonic()
+        if now - ts < CONFIG['system'].get('market_ttl', 0.8):
+            return cached
+        market = self._fetch_market_data()
+        self._market_cache = (now, market)
+        return market
+
+    def _invalidate_market_cache(self):
+        """下单后强制下次get_market_data重新请求"""
+        self._market_cache = (0.0, None)
+
+    def _fetch_market_data(self) -> Optional[Dict]:
         try:
             now = int(time.time())
             aligned = (now // 900) * 900
 
+            # 🚀 已知当前窗口的结算时间时，直接按本地时钟判断，省掉一次无效HTTP探测
+            offsets = (0, 900)
+            if self._current_market_end_ts and self._current_market_slug == f"btc-updown-15m-{aligned}":
+                seconds_left = self._current_market_end_ts - time.time()
+                if seconds_left < 0:
+                    offsets = (900,)
+                elif seconds_left < 120:
+                    print(f"       [MARKET] 市场即将结算({seconds_left:.0f}秒)，跳过")
+                    return None
+
             # 尝试当前窗口，如果过期则尝试下一个窗口
-            for offset in [0, 900]:
+            for offset in offsets:
                 slug = f"btc-updown-15m-{aligned + offset}"
 
                 # 🚀 使用Session复用TCP连接（提速3-5倍）
                 response = self.http_session.get(
                     f"{CONFIG['gamma_host']}/markets",
                     params={'slug': slug},
-                    proxies=CONFIG['proxy'],
+                    proxies=self._proxy,
                     timeout=10
                 )
 
                 if response.status_code == 200:
-                    markets = response.json()
+                    markets = _loads(response.content)
                     if markets:
-                        market = markets[0]
+                        market = _normalize_market(markets[0])
 
                         # 过滤：市场结算前2分钟停止交易
-                        end_date = market.get('endDate')
-                        if end_date:
+                        if market.get('endDate'):
                             try:
-                                from datetime import timezone
-                                end_dt = datetime.strptime(end_date, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-                                now_dt = datetime.now(timezone.utc)
-                                seconds_left = (end_dt - now_dt).total_seconds()
+                                end_ts = _end_epoch(market)
+                                seconds_left = end_ts - time.time()
+                                self._current_market_slug = slug
+                                self._current_market_end_ts = end_ts
                                 if seconds_left < 0:
                                     # 市场已过期，尝试下一个
                                     continue
@@ -1631,31 +2603,46 @@ class AutoTraderV5:
             return None
 
     def parse_price(self, market: Dict) -> Optional[float]:
-        try:
-            outcome_prices = market.get('outcomePrices', '[]')
-            if isinstance(outcome_prices, str):
-                outcome_prices = json.loads(outcome_prices)
-            if outcome_prices and len(outcome_prices) >= 1:
-                return float(outcome_prices[0])
-            return None
-        except:
-            return None
+        return _outcome_prices(market)[0]
 
     def update_indicators(self, price: float, high: float = 0.0, low: float = 0.0):
         self.rsi.update(price)
         self.vwap.update(price)
-        self.price_history.append(price)
+        self._push_price(price)
+
+    def _push_price(self, p: float):
+        """写入环形缓冲区（覆盖最旧的价格，同时写镜像位置）"""
+        idx = self._prices_idx
+        cap = self._prices_cap
+        self._prices[idx] = p
+        self._prices[idx + cap] = p
+        self._prices_idx = (idx + 1) % cap
+        if self._prices_count < cap:
+            self._prices_count += 1
+
+    def _recent(self, n: int) -> np.ndarray:
+        """按时间顺序返回最近n个价格（旧→新），返回零拷贝视图"""
+        n = min(n, self._prices_count)
+        end = self._prices_idx + self._prices_cap
+        return self._prices[end - n:end]
+
+    def price_history_view(self) -> np.ndarray:
+        """完整价格历史视图（零拷贝，供评分器直接使用，调用方不应修改）"""
+        return self._recent(self._prices_cap)
 
     def _read_oracle_signal(self) -> Optional[Dict]:
         """读取 binance_oracle.py 输出的信号文件，超过10秒视为过期"""
         try:
-            oracle_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oracle_signal.json')
-            if not os.path.exists(oracle_path):
-                return None
-            with open(oracle_path, 'r') as f:
-                data = json.load(f)
+            oracle_path = _ORACLE_PATH
+            # 🚀 按文件mtime缓存：oracle未重写文件时不再重复open+json解析（stat失败即文件不存在）
+            mtime_ns = os.stat(oracle_path).st_mtime_ns
+            cached_mtime, data = self._oracle_cache
+            if mtime_ns != cached_mtime:
+                with open(oracle_path, 'r') as f:
+                    data = json.load(f)
+                self._oracle_cache = (mtime_ns, data)
             # 超过10秒的数据视为过期
-            if time.time() - data.get('ts_unix', 0) > 10:
+            if data is None or time.time() - data.get('ts_unix', 0) > 10:
                 return None
             return data
         except Exception:
@@ -1670,36 +2657,30 @@ class AutoTraderV5:
 
         rsi = self.rsi.get_rsi()
         vwap = self.vwap.get_vwap()
-        price_hist = list(self.price_history)
+        price_hist = self.price_history_view()
 
         # === 统一价格过滤（整合三处分散的过滤逻辑）===
         # 有效入场区间：0.35~0.48 和 0.52~0.65
         # 低于0.20或高于0.80：风险收益比太差
         # 0.48~0.52：平衡区，信号不明确
-        max_entry = CONFIG['signal'].get('max_entry_price', 0.80)
-        min_entry = CONFIG['signal'].get('min_entry_price', 0.20)
-        bal_min = CONFIG['signal']['balance_zone_min']
-        bal_max = CONFIG['signal']['balance_zone_max']
+        max_entry = self._max_entry
+        min_entry = self._min_entry
+        bal_min = self._bal_min
+        bal_max = self._bal_max
 
-        if price > max_entry:
-            return None
-        if price < min_entry:
-            return None
-        if bal_min <= price <= bal_max:
+        # 🚀 区间外/平衡区合并为一次比较链
+        if not (min_entry <= price <= max_entry) or bal_min <= price <= bal_max:
             return None
 
         # 获取NO价格，过滤市场一边倒情况
         # 优先用传入的实时no_price（V6 WebSocket），fallback到1-price推算
-        try:
-            _no_price = no_price if no_price and 0.01 <= no_price <= 0.99 else round(1.0 - price, 4)
+        _no_price = no_price if no_price and 0.01 <= no_price <= 0.99 else round(1.0 - price, 4)
+        if max(price, _no_price) > 0.80:
             if price > 0.80:
                 print(f"       [FILTER] YES价格 {price:.4f} > 0.80（市场过于看涨），跳过")
-                return None
-            if _no_price > 0.80:
+            else:
                 print(f"       [FILTER] NO价格 {_no_price:.4f} > 0.80（市场过于看跌），跳过")
-                return None
-        except:
-            pass
+            return None
 
         # 评分（ob_bias固定为0，orderbook_bias权重已禁用）
         score, components = self.scorer.calculate_score(price, rsi, vwap, price_hist)
@@ -1742,8 +2723,8 @@ class AutoTraderV5:
         confidence = min(abs(score) / 5.0, 0.99)
 
         direction = None
-        min_long_conf = CONFIG['signal'].get('min_long_confidence', CONFIG['signal']['min_confidence'])
-        min_short_conf = CONFIG['signal'].get('min_short_confidence', CONFIG['signal']['min_confidence'])
+        min_long_conf = self._min_long_conf
+        min_short_conf = self._min_short_conf
 
         # 极端Oracle信号（>8或<-8）需本地评分同向才触发
         # 🔥 修复：极端信号提高价格限制，0.95以下允许交易
@@ -1758,9 +2739,9 @@ class AutoTraderV5:
             else:
                 print(f"       [ORACLE] ⚠️ 极端Oracle信号({oracle_score:+.2f})但本地评分反向({score:.2f})，忽略")
         else:
-            if score >= CONFIG['signal']['min_long_score'] and confidence >= min_long_conf:
+            if score >= self._min_long_score and confidence >= min_long_conf:
                 direction = 'LONG'
-            elif score <= CONFIG['signal']['min_short_score'] and confidence >= min_short_conf:
+            elif score <= self._min_short_score and confidence >= min_short_conf:
                 direction = 'SHORT'
 
         if direction:
@@ -1777,13 +2758,17 @@ class AutoTraderV5:
         return None
 
     def can_trade(self, signal: Dict, market: Dict = None) -> Tuple[bool, str]:
+        # 🚀 每次风控检查只取一次当前时间，下游所有判断复用
+        now_ts = time.time()
+        now = datetime.fromtimestamp(now_ts)
         # 检查是否新的一天，重置每日统计
-        current_date = datetime.now().date()
+        current_date = now.date()
         if self.last_reset_date != current_date:
             self.stats['daily_trades'] = 0
             self.stats['daily_loss'] = 0.0
             self.last_reset_date = current_date
             self.last_traded_market = None  # 重置最后交易的市场
+            self._last_entry_monotonic.clear()
             print(f"       [RESET] 新的一天，每日统计已重置")
 
         # 检查是否进入新的15分钟窗口（自动重置last_traded_market）
@@ -1797,154 +2782,116 @@ class AutoTraderV5:
         # 【已解除】每个市场只交易一次的限制
         # 改为：通过弹匣限制、射击冷却、时间防火墙等精细风控来控制频率
         # if market and self.last_traded_market:
-        #     current_slug = market.get('slug', '')
-        #     if current_slug == self.last_traded_market:
-        #         return False, f"已交易过该市场: {current_slug}"
-
-        # --- 检查持仓冲突 ---
-        positions = self.get_positions()
-        if signal['direction'] == 'LONG' and 'SHORT' in positions and positions['SHORT'] > 0:
-            return False, f"Conflict: 已有 {positions['SHORT']:.0f} 空头仓位，无法做多"
-        if signal['direction'] == 'SHORT' and 'LONG' in positions and positions['LONG'] > 0:
-            return False, f"Conflict: 已有 {positions['LONG']:.0f} 多头仓位，无法做空"
-
-        # 🛡️ === 总持仓额度限制（防止多笔交易累计超仓）===
-        # ⚠️ 重要：只统计未过期市场的持仓（过期市场已结算，不应占用额度）
-        try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
+        #     current_slug = market.get('slug', '')
+        #     if current_slug == self.last_traded_market:
+        #         return False, f"已交易过该市场: {current_slug}"
 
-            # 🔥 查询未过期市场的持仓总价值（entry_time在最近25分钟内）
-            # 15分钟市场通常在结束前2-3分钟有交易机会，所以25分钟是一个安全窗口
-            cutoff_time = (datetime.now() - timedelta(minutes=25)).strftime('%Y-%m-%d %H:%M:%S')
+        # 🚀 一条条件聚合SQL取齐所有持仓风控数据（持仓冲突/总敞口/窗口弹匣/反向持仓），
+        # 替代原来get_positions + 4次独立查询
+        token_ids = _market_view(market).token_ids if market else ()
+        direction = signal['direction']
+        opposite_direction = 'SHORT' if direction == 'LONG' else 'LONG'
+        token_id = yes_token_id = no_token_id = None
+        if token_ids:
+            # 使用 token_id 判断同一市场（每个15分钟市场有唯一的 token_id）
+            # LONG 用 YES token (index 0), SHORT 用 NO token (index 1)
+            yes_token_id = token_ids[0]
+            no_token_id = token_ids[1]
+            token_id = yes_token_id if direction == 'LONG' else no_token_id
+
+        # 🔥 未过期市场 = entry_time在最近25分钟内
+        # 15分钟市场通常在结束前2-3分钟有交易机会，所以25分钟是一个安全窗口
+        cutoff_time = (now - timedelta(minutes=25)).strftime('%Y-%m-%d %H:%M:%S')
+        # 当前15分钟窗口开始时间 = 当前UTC时间对齐到15分钟
+        window_start_ts = (int(now_ts) // 900) * 900
+        # 🚀 窗口起点字符串每15分钟才格式化一次（entry_time按本地时间写入，这里同样用本地时间）
+        if self._cached_window[0] != window_start_ts:
+            self._cached_window = (window_start_ts,
+                                   "%04d-%02d-%02d %02d:%02d:%02d" % time.localtime(window_start_ts)[:6])
+        window_start_str = self._cached_window[1]
 
-            cursor.execute("""
-                SELECT SUM(value_usdc)
+        try:
+            row = self._query("""
+                SELECT
+                    SUM(CASE WHEN status IN ('open', 'closing') AND side = 'LONG' THEN size ELSE 0 END),
+                    SUM(CASE WHEN status IN ('open', 'closing') AND side = 'SHORT' THEN size ELSE 0 END),
+                    SUM(CASE WHEN status IN ('open', 'closing') AND entry_time >= ? THEN value_usdc ELSE 0 END),
+                    SUM(CASE WHEN token_id = ? AND side = ? AND entry_time >= ? THEN 1 ELSE 0 END),
+                    MAX(CASE WHEN token_id = ? AND side = ? AND entry_time >= ? THEN entry_time END),
+                    SUM(CASE WHEN token_id IN (?, ?) AND entry_time >= ? THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN status = 'open' AND side = ? THEN 1 ELSE 0 END)
                 FROM positions
-                WHERE status IN ('open', 'closing')
-                  AND entry_time >= ?
-            """, (cutoff_time,))
-
-            total_exposure_row = cursor.fetchone()
-            total_exposure = float(total_exposure_row[0]) if total_exposure_row and total_exposure_row[0] else 0.0
-
-            # 获取当前余额（用于计算百分比）
-            # 🔥 使用position_mgr中的余额（已通过Ankr API实时更新）
-            current_balance = self.position_mgr.balance
+                WHERE status IN ('open', 'closing') OR entry_time >= ?
+            """, (
+                cutoff_time,
+                token_id, direction, window_start_str,
+                token_id, direction, window_start_str,
+                yes_token_id, no_token_id, window_start_str,
+                opposite_direction,
+                min(cutoff_time, window_start_str),
+            ), one=True)
+        except Exception as e:
+            print(f"       [RISK CHECK ERROR] {e}")
+            # 查询失败时为了安全，拒绝开仓
+            return False, f"风控查询异常，拒绝交易: {e}"
 
-            max_total_exposure = current_balance * CONFIG['risk']['max_total_exposure_pct']
+        (long_size, short_size, total_exposure, open_count,
+         last_entry_time_str, total_window_trades, opposite_count) = row or (None,) * 7
+        long_size = long_size or 0
+        short_size = short_size or 0
+        total_exposure = float(total_exposure or 0.0)
+        open_count = open_count or 0
+        total_window_trades = total_window_trades or 0
+        opposite_count = opposite_count or 0
 
-            # 🔥 关键风控：未过期市场的总持仓不能超过max_total_exposure_pct（60%）
-            if total_exposure >= max_total_exposure:
-                conn.close()
-                exposure_pct = (total_exposure / current_balance) * 100
-                return False, f"🛡️ 当前窗口持仓限制: 未过期市场持仓${total_exposure:.2f} ({exposure_pct:.1f}%)已达上限{CONFIG['risk']['max_total_exposure_pct']*100:.0f}%，拒绝开新仓"
+        # --- 检查持仓冲突 ---
+        if direction == 'LONG' and short_size > 0:
+            return False, f"Conflict: 已有 {short_size:.0f} 空头仓位，无法做多"
+        if direction == 'SHORT' and long_size > 0:
+            return False, f"Conflict: 已有 {long_size:.0f} 多头仓位，无法做空"
 
-            conn.close()
-        except Exception as e:
-            print(f"       [EXPOSURE CHECK ERROR] {e}")
-            # 查询失败时为了安全，拒绝开仓
-            return False, f"当前窗口持仓查询异常，拒绝交易: {e}"
+        # 🛡️ === 总持仓额度限制（防止多笔交易累计超仓）===
+        # ⚠️ 重要：只统计未过期市场的持仓（过期市场已结算，不应占用额度）
+        # 🔥 使用position_mgr中的余额（已通过Ankr API实时更新）
+        current_balance = self.position_mgr.balance
+        max_total_exposure = current_balance * self._max_exposure_pct
 
+        # 🔥 关键风控：未过期市场的总持仓不能超过max_total_exposure_pct（60%）
+        if total_exposure >= max_total_exposure:
+            exposure_pct = (total_exposure / current_balance) * 100 if current_balance > 0 else 0.0
+            return False, f"🛡️ 当前窗口持仓限制: 未过期市场持仓${total_exposure:.2f} ({exposure_pct:.1f}%)已达上限{self._max_exposure_pct*100:.0f}%，拒绝开新仓"
 
         # 🛡️ === 核心风控：同市场同向"弹匣限制"与"射击冷却" ===
-        if market:
-            token_ids = market.get('clobTokenIds', [])
-            if isinstance(token_ids, str):
-                import json
-                token_ids = json.loads(token_ids)
-
-            if token_ids:
-                try:
-                    conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-                    cursor = conn.cursor()
-
-                    # 使用 token_id 判断同一市场（每个15分钟市场有唯一的 token_id）
-                    # LONG 用 YES token (index 0), SHORT 用 NO token (index 1)
-                    token_id = str(token_ids[0] if signal['direction'] == 'LONG' else token_ids[1])
-
-                    # 1. 弹匣限制：只统计当前15分钟窗口内的交易（加时间过滤）
-                    # 当前窗口开始时间 = 当前UTC时间对齐到15分钟
-                    from datetime import timezone as tz
-                    now_utc = datetime.now(tz.utc)
-                    window_start_ts = (int(now_utc.timestamp()) // 900) * 900
-                    window_start_str = datetime.fromtimestamp(window_start_ts).strftime('%Y-%m-%d %H:%M:%S')
-
-                    # 检查当前窗口同方向开单数
-                    cursor.execute("""
-                        SELECT count(*), max(entry_time)
-                        FROM positions
-                        WHERE token_id = ? AND side = ?
-                          AND entry_time >= ?
-                    """, (token_id, signal['direction'], window_start_str))
-
-                    row = cursor.fetchone()
-                    open_count = row[0] if row else 0
-                    last_entry_time_str = row[1] if row and row[1] else None
-
-                    # 检查当前窗口所有方向总开单数（防止多空横跳）
-                    max_per_window = CONFIG['risk'].get('max_trades_per_window', 1)
-                    yes_token_id = str(token_ids[0])
-                    no_token_id = str(token_ids[1])
-                    cursor.execute("""
-                        SELECT count(*) FROM positions
-                        WHERE (token_id = ? OR token_id = ?)
-                          AND entry_time >= ?
-                    """, (yes_token_id, no_token_id, window_start_str))
-                    total_row = cursor.fetchone()
-                    total_window_trades = total_row[0] if total_row else 0
-
-                    if total_window_trades >= max_per_window:
-                        conn.close()
-                        return False, f"窗口限制: 本15分钟窗口已开{total_window_trades}单，最多{max_per_window}单"
-
-                    # 🛡️ 禁止同时反向交易（不能同时持有多空）
-                    # 🔥 修复：不限制token_id，检查所有市场的反向持仓
-                    # 原因：市场切换后token_id会变，但反向持仓仍然是冲突
-                    opposite_direction = 'SHORT' if signal['direction'] == 'LONG' else 'LONG'
-
-                    cursor.execute("""
-                        SELECT count(*) FROM positions
-                        WHERE side = ? AND status = 'open'
-                    """, (opposite_direction,))
-
-                    opposite_row = cursor.fetchone()
-                    opposite_count = opposite_row[0] if opposite_row else 0
-
-                    if opposite_count > 0:
-                        conn.close()
-                        return False, f"🛡️ 反向持仓冲突: 已有{opposite_direction}持仓({opposite_count}单)，禁止同时开{signal['direction']}"
-
-                    # 弹匣限制：同一市场同一方向最多N发子弹
-                    max_bullets = CONFIG['risk']['max_same_direction_bullets']
-                    if open_count >= max_bullets:
-                        conn.close()
-                        return False, f"弹匣耗尽: {token_id[-8:]} {signal['direction']}已达最大持仓({max_bullets}单)"
-
-                    # 射击冷却：距离上一单必须超过N秒
-                    cooldown_sec = CONFIG['risk']['same_direction_cooldown_sec']
-                    if last_entry_time_str:
-                        last_entry_time = datetime.strptime(last_entry_time_str, '%Y-%m-%d %H:%M:%S')
-                        seconds_since_last = (datetime.now() - last_entry_time).total_seconds()
-
-                        if seconds_since_last < cooldown_sec:
-                            remaining_sec = cooldown_sec - seconds_since_last
-                            conn.close()
-                            return False, f"⏳ 射击冷却中: 距离上一单仅{seconds_since_last:.0f}秒 (需>{cooldown_sec}s)"
-
-                    # 所有风控检查通过，关闭连接
-                    conn.close()
+        if token_ids:
+            # 检查当前窗口所有方向总开单数（防止多空横跳）
+            max_per_window = self._max_per_window
+            if total_window_trades >= max_per_window:
+                return False, f"窗口限制: 本15分钟窗口已开{total_window_trades}单，最多{max_per_window}单"
+
+            # 🛡️ 禁止同时反向交易（不能同时持有多空）
+            # 🔥 修复：不限制token_id，检查所有市场的反向持仓
+            # 原因：市场切换后token_id会变，但反向持仓仍然是冲突
+            if opposite_count > 0:
+                return False, f"🛡️ 反向持仓冲突: 已有{opposite_direction}持仓({opposite_count}单)，禁止同时开{direction}"
+
+            # 弹匣限制：同一市场同一方向最多N发子弹
+            max_bullets = self._max_bullets
+            if open_count >= max_bullets:
+                return False, f"弹匣耗尽: {token_id[-8:]} {direction}已达最大持仓({max_bullets}单)"
+
+            # 射击冷却：距离上一单必须超过N秒
+            cooldown_sec = self._cooldown_sec
+            if last_entry_time_str:
+                # 🚀 本进程开的仓直接用单调时钟计算间隔；重启后才解析数据库时间
+                last_mono = self._last_entry_monotonic.get((token_id, direction))
+                if last_mono is not None:
+                    seconds_since_last = time.monotonic() - last_mono
+                else:
+                    last_entry_time = datetime.strptime(last_entry_time_str, '%Y-%m-%d %H:%M:%S')
+                    seconds_since_last = (now - last_entry_time).total_seconds()
 
-                except Exception as e:
-                    print(f"       [RISK CHECK ERROR] {e}")
-                    # 确保异常时也关闭连接
-                    try:
-                        conn.close()
-                    except:
-                        pass
-                    return False, f"风控查询异常，拒绝交易: {e}"
+                if seconds_since_last < cooldown_sec:
+                    return False, f"⏳ 射击冷却中: 距离上一单仅{seconds_since_last:.0f}秒 (需>{cooldown_sec}s)"
 
         # 🛡️ === 第一斧：时间防火墙（拒绝垃圾时间） ===
         # 注意：get_market_data 已过滤过期市场，这里只做二次确认
@@ -1952,10 +2899,9 @@ class AutoTraderV5:
             time_left = None
             try:
                 # 统一用 endDate（与 get_market_data 保持一致，避免 endTimestamp 解析歧义）
-                end_date = market.get('endDate')
-                if end_date:
-                    end_dt = datetime.strptime(end_date, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-                    time_left = (end_dt - datetime.now(timezone.utc)).total_seconds()
+                end_ts = _end_epoch(market)
+                if end_ts is not None:
+                    time_left = end_ts - now_ts
             except Exception as e:
                 return False, f"🛡️ 时间防火墙: 无法解析市场时间({e})，拒绝开仓"
 
@@ -1970,8 +2916,8 @@ class AutoTraderV5:
 
         # 🛡️ === 第二斧：拒绝极端价格（只做合理区间） ===
         price = signal.get('price', 0.5)
-        max_entry_price = CONFIG['signal'].get('max_entry_price', 0.80)
-        min_entry_price = CONFIG['signal'].get('min_entry_price', 0.20)
+        max_entry_price = self._max_entry
+        min_entry_price = self._min_entry
 
         if price > max_entry_price:
             return False, f"🛡️ 拒绝极端高位: {price:.4f} > {max_entry_price:.2f} (利润空间太小)"
@@ -1979,14 +2925,14 @@ class AutoTraderV5:
             return False, f"🛡️ 拒绝极端低位: {price:.4f} < {min_entry_price:.2f} (风险太大)"
 
         # --- 检查是否允许做多/做空（动态调整）---
-        if signal['direction'] == 'LONG' and not CONFIG['signal']['allow_long']:
+        if signal['direction'] == 'LONG' and not self._allow_long:
             return False, "LONG disabled (low accuracy)"
-        if signal['direction'] == 'SHORT' and not CONFIG['signal']['allow_short']:
+        if signal['direction'] == 'SHORT' and not self._allow_short:
             return False, "SHORT disabled (low accuracy)"
 
         if self.is_paused:
-            if self.pause_until and datetime.now() < self.pause_until:
-                remaining = int((self.pause_until - datetime.now()).total_seconds() / 60)
+            if self.pause_until and now < self.pause_until:
+                remaining = int((self.pause_until - now).total_seconds() / 60)
                 return False, f"Paused {remaining}m"
             else:
                 self.is_paused = False
@@ -1997,46 +2943,42 @@ class AutoTraderV5:
         max_loss = self.position_mgr.get_max_daily_loss()
         if self.stats['daily_loss'] >= max_loss:
             # 检查是否是新的一天，如果是则重置
-            if datetime.now().date() > self.last_reset_date:
+            if current_date > self.last_reset_date:
                 self.stats['daily_loss'] = 0.0
                 self.stats['daily_trades'] = 0
-                self.last_reset_date = datetime.now().date()
+                self.last_reset_date = current_date
                 print(f"       [RESET] 新的一天，每日亏损已重置")
             else:
                 return False, f"Daily loss limit reached (${self.stats['daily_loss']:.2f}/${max_loss:.2f})"
 
         if self.stats['consecutive_losses'] >= CONFIG['risk']['stop_loss_consecutive']:
             self.is_paused = True
-            self.pause_until = datetime.now() + timedelta(hours=CONFIG['risk']['pause_hours'])
+            self.pause_until = now + timedelta(hours=CONFIG['risk']['pause_hours'])
             return False, f"3 losses - pause {CONFIG['risk']['pause_hours']}h"
 
         return True, "OK"
 
+    def _db_version(self) -> Tuple[int, int]:
+        """数据库版本戳：其他连接提交时data_version变化，本连接写入时total_changes变化（调用方需持有锁）"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes
+
     def get_positions(self) -> Dict[str, float]:
         """查询当前持仓（从 positions 表）"""
         positions = {}  # {side: size}
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
-
             # 从 positions 表获取当前持仓
             # 🔥 修复：也包括'closing'状态的持仓（它们实际上还在持仓中）
-            cursor.execute("""
+            rows = self._query("""
                 SELECT side, size
                 FROM positions
                 WHERE status IN ('open', 'closing')
             """)
 
-            for row in cursor.fetchall():
-                side, size = row
+            for side, size in rows:
                 if side in positions:
                     positions[side] += size
                 else:
                     positions[side] = size
-
-            conn.close()
         except Exception as e:
             print(f"       [POS CHECK ERROR] {e}")
 
@@ -2045,16 +2987,14 @@ class AutoTraderV5:
     def get_real_positions(self) -> Dict[str, float]:
         """获取实时持仓（从 Polymarket API）"""
         try:
-            from py_clob_client.headers.headers import create_level_2_headers
-            from py_clob_client.clob_types import RequestArgs
 
             url = f"{CONFIG['clob_host']}/positions"
             request_args = RequestArgs(method="GET", request_path="/positions")
             headers = create_level_2_headers(self.client.signer, self.client.creds, request_args)
             # 🚀 使用Session复用TCP连接（提速持仓查询）
-            resp = self.http_session.get(url, headers=headers, proxies=CONFIG['proxy'], timeout=10)
+            resp = self.http_session.get(url, headers=headers, proxies=self._proxy, timeout=10)
             if resp.status_code == 200:
-                data = resp.json()
+                data = _loads(resp.content)
                 positions = {}
                 for pos in data:
                     asset_id = pos.get('asset_id', '')
@@ -2069,15 +3009,35 @@ class AutoTraderV5:
             print(f"       [POS CHECK ERROR] {e}")
         return {}
 
+    def _mark_order_done(self, order_id: str):
+        with self._done_orders_lock:
+            self._done_orders[order_id] = None
+            if len(self._done_orders) > 1000:
+                self._done_orders.popitem(last=False)
+
+    def _order_done(self, order_id: str) -> bool:
+        """订单是否已确认撤销/成交（本地撤单记录或user频道推送的终态，不发请求）"""
+        with self._done_orders_lock:
+            if order_id in self._done_orders:
+                return True
+        if self.fill_listener:
+            state = self.fill_listener.order_status(order_id)
+            if state and state['status'] in ('MATCHED', 'CANCELED'):
+                return True
+        return False
+
     def cancel_order(self, order_id: str) -> bool:
-        """取消订单"""
+        """取消订单（成功或确认订单已是终态时记入_done_orders）"""
+        if self._order_done(order_id):
+            return True
         try:
             response = self.client.cancel(order_id)
             # 修复判断逻辑：检查 canceled 数组是否包含订单ID
             if response:
                 canceled_list = response.get('canceled', [])
                 if canceled_list and order_id in canceled_list:
-                    print(f"       [CANCEL] ✅ 订单已取消: {order_id[-8:]}")
+                    logger.info("       [CANCEL] ✅ 订单已取消: %s", order_id[-8:])
+                    self._mark_order_done(order_id)
                     return True
                 else:
                     # 🔥 canceled=[] 时，查询订单状态确认（可能是已成交/已取消）
@@ -2086,20 +3046,41 @@ class AutoTraderV5:
                         if order_info:
                             status = order_info.get('status', '').upper()
                             if status in ('FILLED', 'MATCHED', 'CANCELED', 'TRIGGERED'):
-                                print(f"       [CANCEL] ℹ️ 订单已{status}，无需撤销: {order_id[-8:]}")
+                                logger.info("       [CANCEL] ℹ️ 订单已%s，无需撤销: %s", status, order_id[-8:])
+                                self._mark_order_done(order_id)
                                 return True
                     except:
                         pass  # 查询失败，继续报错
                     # success 字段可能不准确，主要看 canceled 数组
-                    print(f"       [CANCEL FAIL] {order_id[-8:]}: canceled={canceled_list}")
+                    logger.info("       [CANCEL FAIL] %s: canceled=%s", order_id[-8:], canceled_list)
                     return False
             else:
-                print(f"       [CANCEL FAIL] {order_id[-8:]}: 无响应")
+                logger.info("       [CANCEL FAIL] %s: 无响应", order_id[-8:])
                 return False
         except Exception as e:
-            print(f"       [CANCEL ERROR] {order_id[-8:]}: {e}")
+            logger.info("       [CANCEL ERROR] %s: %s", order_id[-8:], e)
             return False
 
+    def cancel_orders(self, order_ids) -> None:
+        """批量撤单：一次 DELETE /orders 请求撤销全部订单；批量接口失败时回退逐个cancel_order"""
+        order_ids = [oid for oid in dict.fromkeys(order_ids) if oid and not self._order_done(oid)]
+        if not order_ids:
+            return
+        try:
+            response = self.client.cancel_orders(order_ids)
+            canceled = set(response.get('canceled', [])) if response else set()
+            logger.info("       [CANCEL] ✅ 批量撤单 %s/%s", len(canceled), len(order_ids))
+            # 未出现在canceled里的订单（可能已成交/已撤销）逐个确认
+            for oid in order_ids:
+                if oid in canceled:
+                    self._mark_order_done(oid)
+                else:
+                    self.cancel_order(oid)
+        except Exception as e:
+            logger.info("       [CANCEL ERROR] 批量撤单失败，逐个撤销: %s", e)
+            for oid in order_ids:
+                self.cancel_order(oid)
+
     def cancel_pair_orders(self, take_profit_order_id: str, stop_loss_order_id: str, triggered_order: str):
         """止盈成交时取消止损（现在止损是本地轮询，无需取消）"""
         if triggered_order == 'TAKE_PROFIT':
@@ -2111,9 +3092,6 @@ class AutoTraderV5:
 
     def update_allowance_fixed(self, asset_type, token_id=None):
         """修复版授权：正确传入 funder 地址（绕过 SDK bug）"""
-        from py_clob_client.headers.headers import create_level_2_headers
-        from py_clob_client.http_helpers.helpers import get
-        from py_clob_client.clob_types import RequestArgs
         UPDATE_BALANCE_ALLOWANCE = "/balance-allowance/update"
         request_args = RequestArgs(method="GET", request_path=UPDATE_BALANCE_ALLOWANCE)
         headers = create_level_2_headers(self.client.signer, self.client.creds, request_args)
@@ -2122,97 +3100,101 @@ class AutoTraderV5:
         )
         if token_id:
             url += "&token_id={}".format(token_id)
-        return get(url, headers=headers)
+        return clob_get(url, headers=headers)
 
     def ensure_allowance(self, token_id: str, expected_size: float) -> bool:
         """确保已授权指定token（用于SELL操作），并等待token到账
 
-        返回: True=已授权且有余额, False=授权失败或余额不足
+        返回: True=已确认授权且余额到账, False=授权/余额未确认（调用方仍可继续尝试挂单）
         """
-        import time
         max_wait = 15  # 最多等待15秒
 
-        try:
-            params = BalanceAllowanceParams(
-                asset_type=AssetType.CONDITIONAL,  # 条件token（YES/NO）
-                token_id=token_id,
-                signature_type=2
-            )
+        # 🚀 磁盘缓存命中：该token已确认授权过（授权永久有效），跳过授权请求，但仍要等余额到账
+        # 缓存只在链上观察到 allowance > 0 后才写入
+        allowance_known = self._allowance_known(token_id)
+        if allowance_known:
+            logger.info("       [ALLOWANCE] ✅ token=%s 已授权（缓存），等待余额到账", token_id[-8:])
 
-            # 等待token到账并检查授权
-            for wait_i in range(max_wait):
+        try:
+            # 等待token到账并检查授权（每次都查最新值，不走缓存；指数退避轮询）
+            delays = list(_poll_intervals(max_wait))
+            waited = 0.0
+            for wait_i, delay in enumerate(delays):
                 try:
-                    result = self.client.get_balance_allowance(params)
+                    result = self._token_balance(token_id, max_age=0)
                     if result:
                         balance = float(result.get('balance', 0))
                         allowance = float(result.get('allowance', 0))
 
-                        print(f"       [ALLOWANCE] token={token_id[-8:]}, balance={balance:.2f}, allowance={allowance:.2f}")
+                        logger.info("       [ALLOWANCE] token=%s, balance=%.2f, allowance=%.2f", token_id[-8:], balance, allowance)
 
                         if balance >= expected_size:
                             # 余额足够，检查授权
-                            if allowance > 0:
-                                print(f"       [ALLOWANCE] ✅ 余额和授权都足够")
+                            if allowance > 0 or allowance_known:
+                                logger.info("       [ALLOWANCE] ✅ 余额和授权都足够")
+                                if not allowance_known:
+                                    self._set_allowance_known(token_id)
                                 return True
                             else:
                                 # 尝试授权
-                                print(f"       [ALLOWANCE] 授权中...")
+                                logger.info("       [ALLOWANCE] 授权中...")
                                 self.update_allowance_fixed(AssetType.CONDITIONAL, token_id)
-                                print(f"       [ALLOWANCE] ✅ 授权请求已发送，等待链上确认...")
-                                # 等待授权在链上生效（增加等待时间）
-                                import time
-                                for auth_wait in range(10):
-                                    time.sleep(1)
+                                logger.info("       [ALLOWANCE] ✅ 授权请求已发送，等待链上确认...")
+                                # 等待授权在链上生效（最多10秒，指数退避轮询）；确认生效后才写缓存
+                                auth_waited = 0.0
+                                for auth_delay in _poll_intervals(10):
+                                    time.sleep(auth_delay)
+                                    auth_waited += auth_delay
                                     try:
-                                        result2 = self.client.get_balance_allowance(params)
+                                        result2 = self._token_balance(token_id, max_age=0)
                                         if result2:
                                             allowance2 = float(result2.get('allowance', 0))
                                             if allowance2 > 0:
-                                                print(f"       [ALLOWANCE] ✅ 授权已生效: allowance={allowance2:.2f} (等待{auth_wait+1}秒)")
-                                                break
-                                        elif auth_wait < 9:
-                                            print(f"       [ALLOWANCE] 等待授权生效... ({auth_wait+1}/10)")
-                                    except:
-                                        if auth_wait < 9:
-                                            print(f"       [ALLOWANCE] 查询授权状态... ({auth_wait+1}/10)")
-                                        time.sleep(1)
-                                else:
-                                    print(f"       [ALLOWANCE] ⚠️  授权可能仍未生效，继续尝试挂单")
-                                return True
+                                                logger.info("       [ALLOWANCE] ✅ 授权已生效: allowance=%.2f (等待%.1f秒)", allowance2, auth_waited)
+                                                self._set_allowance_known(token_id)
+                                                return True
+                                        else:
+                                            logger.info("       [ALLOWANCE] 等待授权生效... (%.1f/10秒)", auth_waited)
+                                    except (PolyApiException, ValueError):
+                                        logger.info("       [ALLOWANCE] 查询授权状态... (%.1f/10秒)", auth_waited)
+                                logger.info("       [ALLOWANCE] ⚠️  授权可能仍未生效，继续尝试挂单")
+                                return False
                         else:
-                            if wait_i < max_wait - 1:
-                                print(f"       [ALLOWANCE] 等待token到账... ({wait_i+1}/{max_wait})")
-                                time.sleep(1)
+                            if wait_i < len(delays) - 1:
+                                logger.info("       [ALLOWANCE] 等待token到账... (%.1f/%s秒)", waited, max_wait)
+                                time.sleep(delay)
+                                waited += delay
 
                 except Exception as e:
                     err_str = str(e)
-                    # 401 说明 API key 权限不足，无法查询授权，直接跳过等待挂单
+                    # 401 说明 API key 权限不足，无法查询授权/余额：授权未确认，不写缓存
                     if '401' in err_str or 'Unauthorized' in err_str:
-                        print(f"       [ALLOWANCE] API key 权限不足，尝试直接授权token={token_id[-8:]}...")
+                        if allowance_known:
+                            logger.info("       [ALLOWANCE] API key 权限不足，无法查询余额，固定等待10秒让token到账")
+                            time.sleep(10)
+                            return False
+                        logger.info("       [ALLOWANCE] API key 权限不足，尝试直接授权token=%s...", token_id[-8:])
                         try:
                             self.update_allowance_fixed(AssetType.CONDITIONAL, token_id)
-                            print(f"       [ALLOWANCE] ✅ 授权请求已发送，等待链上确认...")
-                            # 等待授权在链上生效（增加等待时间）
-                            import time
-                            for auth_wait in range(10):
-                                time.sleep(1)
-                            return True
+                            logger.info("       [ALLOWANCE] ✅ 授权请求已发送，等待链上确认...")
+                            # 401时无法查询授权状态，只能固定等待10秒让授权生效
+                            time.sleep(10)
                         except Exception as e2:
-                            print(f"       [ALLOWANCE] 直接授权失败: {e2}，等待12秒后继续尝试挂单")
+                            logger.info("       [ALLOWANCE] 直接授权失败: %s，等待12秒后继续尝试挂单", e2)
                             time.sleep(12)
-                            return True
-                    if wait_i < max_wait - 1:
-                        print(f"       [ALLOWANCE] 查询失败，重试中... ({wait_i+1}/{max_wait}): {e}")
-                        time.sleep(1)
+                        return False
+                    if wait_i < len(delays) - 1:
+                        logger.info("       [ALLOWANCE] 查询失败，重试中... (%.1f/%s秒): %s", waited, max_wait, e)
+                        time.sleep(delay)
+                        waited += delay
 
-            print(f"       [ALLOWANCE] ❌ 等待超时，但仍尝试挂单")
-            return True  # 返回True让程序继续尝试
+            logger.info("       [ALLOWANCE] ❌ 等待超时，但仍尝试挂单")
+            return False
 
         except Exception as e:
-            print(f"       [ALLOWANCE ERROR] {e}")
-            import traceback
+            logger.info("       [ALLOWANCE ERROR] %s", e)
             traceback.print_exc()
-            return True  # 即使失败也继续尝试
+            return False  # 调用方仍会继续尝试挂单
 
     def place_stop_orders(self, market: Dict, side: str, size: float, entry_price: float, value_usdc: float, entry_order_id: str = None) -> tuple:
         """开仓后同时挂止盈止损单（带重试机制）
@@ -2223,29 +3205,23 @@ class AutoTraderV5:
         返回: (take_profit_order_id, stop_loss_order_id, actual_entry_price)
               actual_entry_price: 实际入场成交价格（如果entry_order_id提供且成交），否则返回entry_price
         """
-        import time
 
         actual_entry_price = entry_price  # 默认使用传入的价格
 
         try:
-            token_ids = market.get('clobTokenIds', [])
-            if isinstance(token_ids, str):
-                token_ids = json.loads(token_ids)
+            view = _market_view(market)
+            token_ids = view.token_ids
 
-            if not token_ids or len(token_ids) < 2:
+            if len(token_ids) < 2:
                 return None, None, entry_price
 
-            outcome_prices = market.get('outcomePrices', [])
-            if isinstance(outcome_prices, str):
-                outcome_prices = json.loads(outcome_prices)
-
             # 确定token_id（平仓时用的token）
             # LONG平仓卖YES，SHORT平仓卖NO
-            token_id = str(token_ids[0] if side == 'LONG' else token_ids[1])
+            token_id = view.token_for(side)
 
             # --- 止盈计算 ---
             # ✅ 彻底解除 1U 封印，独立计算 30% 止盈
-            tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)  
+            tp_pct_max = self._tp_pct_max  
             tp_target_price = entry_price * (1 + tp_pct_max)          
             
             # 🛡️ 极限价格保护 + 精度控制（保留2位小数，最高不超过0.99）
@@ -2253,7 +3229,7 @@ class AutoTraderV5:
 
             # --- 止损计算 ---
             # ✅ 彻底删除 1U 限制，默认 20% 触发（实盘防滑点）
-            sl_pct_max = CONFIG['risk'].get('max_stop_loss_pct', 0.30)  
+            sl_pct_max = self._sl_pct_max  
             sl_target_price = entry_price * (1 - sl_pct_max)  
             
             # 🛡️ 极限价格保护 + 精度控制（保留2位小数，最低不低于0.01）
@@ -2264,17 +3240,12 @@ class AutoTraderV5:
             actual_sl_pct = (entry_price - sl_target_price) / entry_price
 
             # --- 打印完美日志 ---
-            print(f"       [STOP ORDERS] entry={entry_price:.4f}, size={size}, value={value_usdc:.4f}")
-            print(f"       [STOP ORDERS] tp={tp_target_price:.2f} (止盈{actual_tp_pct:.1%}), sl={sl_target_price:.2f} (止损{actual_sl_pct:.1%})")
-
-            # 确保价格在 Polymarket 有效范围内，精度对齐 tick_size
-            # 从市场数据获取 tick_size（默认 0.01）
-            tick_size = float(market.get('orderPriceMinTickSize') or 0.01)
+            logger.info("       [STOP ORDERS] entry=%.4f, size=%s, value=%.4f", entry_price, size, value_usdc)
+            logger.info("       [STOP ORDERS] tp=%.2f (止盈%.1f%%), sl=%.2f (止损%.1f%%)",
+                        tp_target_price, actual_tp_pct * 100, sl_target_price, actual_sl_pct * 100)
 
-            def align_price(p: float) -> float:
-                """对齐到 tick_size 精度，并限制在 tick_size ~ 1-tick_size"""
-                p = round(round(p / tick_size) * tick_size, 4)
-                return max(tick_size, min(1 - tick_size, p))
+            # 确保价格在 Polymarket 有效范围内，精度对齐 tick_size（默认 0.01）
+            align_price = view.align
 
             tp_target_price = align_price(tp_target_price)
             sl_target_price = align_price(sl_target_price)
@@ -2282,45 +3253,50 @@ class AutoTraderV5:
             # 注意：此处不做tp/sl方向校验，因为actual_entry_price还未确认
             # 校验在获取实际成交价并重算之后进行
 
-            # 止盈止损 size 等于实际买入量（查链上精确余额，避免取整超卖）
-            try:
-                from py_clob_client.clob_types import BalanceAllowanceParams, AssetType
-                bal_params = BalanceAllowanceParams(
-                    asset_type=AssetType.CONDITIONAL,
-                    token_id=token_id,
-                    signature_type=2
-                )
-                bal_result = self.client.get_balance_allowance(bal_params)
-                if bal_result:
-                    raw = float(bal_result.get('balance', '0') or '0')
-                    actual_size_on_chain = raw / 1e6
-                    if actual_size_on_chain >= 0.5:
-                        stop_size = actual_size_on_chain
-                        print(f"       [STOP ORDERS] 链上精确余额: {stop_size} (DB size={size})")
-                    else:
-                        stop_size = int(size)
-                else:
-                    stop_size = int(size)
-            except Exception as e:
-                print(f"       [STOP ORDERS] 余额查询失败({e})，使用DB size")
-                stop_size = int(size)
+            # 🚀 余额查询与入场订单轮询互不依赖，先在RPC线程池发出，等待成交期间并行完成
+            fut_bal = self._rpc_pool.submit(self._token_balance, token_id)
+            token_arrived = False
 
             # 如果提供了入场订单ID，等待订单成交后再挂止盈止损单
             if entry_order_id:
-                print(f"       [STOP ORDERS] 等待入场订单成交: {entry_order_id[-8:]}...")
+                logger.info("       [STOP ORDERS] 等待入场订单成交: %s...", entry_order_id[-8:])
                 max_wait = 60  # 60秒极限（避免Alpha Decay，15分钟合约信号60秒内必须成交）
-                check_interval = 1.0  # 每1秒检查一次（避免触发Rate Limit）
+                # 🚀 指数退避轮询：0.25→0.5→1→2秒封顶（快速成交时更早发现，慢成交时少打REST避免Rate Limit）
+                delays = list(_poll_intervals(max_wait))
+
+                # 🚀 user频道WebSocket已连接时，阻塞等待成交/撤单推送，不再每秒get_order
+                # 推送已是终态（成交/撤单）时直接使用推送结果，不再REST确认；超时才进入最后检查
+                # 成交推送需确认完全成交（部分成交时回退REST轮询剩余时间）
+                pushed_order = None
+                if self.fill_listener and self.fill_listener.connected:
+                    wait_start = time.monotonic()
+                    pushed = self.fill_listener.wait_fill(entry_order_id, max_wait)
+                    if pushed:
+                        logger.info("       [STOP ORDERS] 📡 收到订单推送: %s", pushed['status'])
+                        if pushed['status'] == 'CANCELED':
+                            pushed_order = {'status': pushed['status'], 'avgPrice': pushed['price']}
+                        else:
+                            confirmed = self._confirm_push_fill(entry_order_id, pushed)
+                            if confirmed:
+                                pushed_order = {'status': confirmed['status'], 'avgPrice': confirmed['price']}
+                    if pushed_order:
+                        delays = [0.0]
+                    elif pushed:
+                        delays = list(_poll_intervals(max(0.0, max_wait - (time.monotonic() - wait_start))))
+                    else:
+                        delays = []
 
-                for wait_i in range(int(max_wait / check_interval)):
+                waited = 0.0
+                for wait_i, delay in enumerate(delays):
                     try:
-                        entry_order = self.client.get_order(entry_order_id)
+                        entry_order = pushed_order or self.client.get_order(entry_order_id)
                         if entry_order:
                             status = entry_order.get('status', '')
                             # MATCHED 或 FILLED 都表示订单已成交
                             if status in ['FILLED', 'MATCHED']:
-                                print(f"       [STOP ORDERS] ✅ 入场订单已成交 ({status})")
-                                print(f"       [STOP ORDERS] ⏳ 等待 10 秒，确保 Token 到达钱包...")
-                                time.sleep(10)
+                                logger.info("       [STOP ORDERS] ✅ 入场订单已成交 (%s)", status)
+                                logger.info("       [STOP ORDERS] ⏳ 等待 Token 到达钱包...")
+                                token_arrived = self._wait_token_arrival(token_id, size)
                                 # 获取实际成交价：优先avgPrice，fallback到entry_price
                                 # 不用matchAmount/matchedSize，单位不确定容易算错
                                 avg_price = entry_order.get('avgPrice')
@@ -2330,146 +3306,133 @@ class AutoTraderV5:
                                         # 合理性校验：必须在0.01~0.99之间，且与entry_price偏差不超过30%
                                         if 0.01 <= parsed <= 0.99 and abs(parsed - entry_price) / entry_price < 0.20:
                                             actual_entry_price = parsed
-                                            print(f"       [STOP ORDERS] 实际成交价(avgPrice): {actual_entry_price:.4f} (调整价格: {entry_price:.4f})")
+                                            logger.info("       [STOP ORDERS] 实际成交价(avgPrice): %.4f (调整价格: %.4f)", actual_entry_price, entry_price)
                                         else:
-                                            print(f"       [STOP ORDERS] avgPrice={parsed:.4f} 不合理，使用调整价格: {entry_price:.4f}")
-                                    except:
+                                            logger.info("       [STOP ORDERS] avgPrice=%.4f 不合理，使用调整价格: %.4f", parsed, entry_price)
+                                    except (TypeError, ValueError, ZeroDivisionError):
                                         pass
                                 # 基于最终确认的actual_entry_price统一重算止盈止损（对称30%逻辑）
-                                value_usdc = size * actual_entry_price
-                                tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)  # 修复：止盈应使用take_profit_pct
-                                tp_by_pct = actual_entry_price * (1 + tp_pct_max)
-                                tp_by_fixed = (value_usdc + 1.0) / max(size, 1)
-                                tp_target_price = min(tp_by_fixed, tp_by_pct)
-                                sl_pct_max = CONFIG['risk'].get('max_stop_loss_pct', 0.30)
-                                sl_by_pct = actual_entry_price * (1 - sl_pct_max)
-                                sl_original = (value_usdc - 1.0) / max(size, 1)
-                                sl_target_price = max(sl_original, sl_by_pct)
-                                tp_target_price = align_price(tp_target_price)
-                                sl_target_price = align_price(sl_target_price)
-                                print(f"       [STOP ORDERS] 止盈止损确认: entry={actual_entry_price:.4f}, tp={tp_target_price:.4f}, sl={sl_target_price:.4f}")
+                                tp_target_price, sl_target_price, value_usdc = _compute_stop_prices(
+                                    actual_entry_price, size, view.tick_size, tp_pct_max, sl_pct_max)
+                                logger.info("       [STOP ORDERS] 止盈止损确认: entry=%.4f, tp=%.4f, sl=%.4f", actual_entry_price, tp_target_price, sl_target_price)
                                 # 校验tp/sl方向（基于实际成交价）
                                 if tp_target_price <= actual_entry_price or sl_target_price >= actual_entry_price:
-                                    print(f"       [STOP ORDERS] ⚠️ tp/sl方向异常，强制修正: tp={tp_target_price:.4f} sl={sl_target_price:.4f} entry={actual_entry_price:.4f}")
+                                    logger.info("       [STOP ORDERS] ⚠️ tp/sl方向异常，强制修正: tp=%.4f sl=%.4f entry=%.4f", tp_target_price, sl_target_price, actual_entry_price)
                                     tp_target_price = align_price(min(actual_entry_price * 1.20, actual_entry_price + 1.0 / max(size, 1)))
                                     sl_target_price = align_price(max(actual_entry_price * 0.80, actual_entry_price - 1.0 / max(size, 1)))
-                                    print(f"       [STOP ORDERS] 修正后: tp={tp_target_price:.4f}, sl={sl_target_price:.4f}")
+                                    logger.info("       [STOP ORDERS] 修正后: tp=%.4f, sl=%.4f", tp_target_price, sl_target_price)
                                 break
-                            elif status in ['CANCELLED', 'EXPIRED']:
-                                print(f"       [STOP ORDERS] ❌ 入场订单已{status}，取消挂止盈止损单")
+                            elif status in ['CANCELED', 'CANCELLED', 'EXPIRED']:
+                                logger.info("       [STOP ORDERS] ❌ 入场订单已%s，取消挂止盈止损单", status)
                                 return None, None, entry_price
                             elif status == 'LIVE':
                                 # 订单还在挂单中，继续等待
-                                if wait_i < max_wait - 1:
-                                    # 每10秒打印一次
-                                    if wait_i % 10 == 0:
-                                        print(f"       [STOP ORDERS] 订单状态: {status}，挂单中... ({int(wait_i*check_interval)+1}/{max_wait})")
-                                    time.sleep(check_interval)
+                                if wait_i < len(delays) - 1:
+                                    # 每5次轮询打印一次
+                                    if wait_i % 5 == 0:
+                                        logger.info("       [STOP ORDERS] 订单状态: %s，挂单中... (%.0f/%s秒)", status, waited, max_wait)
+                                    time.sleep(delay)
+                                    waited += delay
                             else:
-                                if wait_i < max_wait - 1:
-                                    if wait_i % 10 == 0:
-                                        print(f"       [STOP ORDERS] 订单状态: {status}，等待中... ({int(wait_i*check_interval)+1}/{max_wait})")
-                                    time.sleep(check_interval)
+                                if wait_i < len(delays) - 1:
+                                    if wait_i % 5 == 0:
+                                        logger.info("       [STOP ORDERS] 订单状态: %s，等待中... (%.0f/%s秒)", status, waited, max_wait)
+                                    time.sleep(delay)
+                                    waited += delay
                     except Exception as e:
-                        if wait_i < max_wait - 1:
-                            time.sleep(check_interval)
+                        if wait_i < len(delays) - 1:
+                            time.sleep(delay)
+                            waited += delay
                 else:
                     # 超时后，再尝试最后检查一次（API可能有延迟）
-                    print(f"       [STOP ORDERS] ⚠️  等待超时，进行最后检查...")
+                    logger.info("       [STOP ORDERS] ⚠️  等待超时，进行最后检查...")
                     try:
                         entry_order = self.client.get_order(entry_order_id)
                         if entry_order and entry_order.get('status') in ['FILLED', 'MATCHED']:
-                            print(f"       [STOP ORDERS] ✅ 最后检查发现订单已成交！")
+                            logger.info("       [STOP ORDERS] ✅ 最后检查发现订单已成交！")
                             status = entry_order.get('status')
                             filled_price = entry_order.get('price')
                             if filled_price:
                                 actual_entry_price = float(filled_price)
-                                print(f"       [STOP ORDERS] 实际成交价: {actual_entry_price:.4f} (调整价格: {entry_price:.4f})")
+                                logger.info("       [STOP ORDERS] 实际成交价: %.4f (调整价格: %.4f)", actual_entry_price, entry_price)
                                 if abs(actual_entry_price - entry_price) > 0.001:
-                                    value_usdc = size * actual_entry_price
                                     # 对称30%止盈止损
-                                    tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)  # 修复：止盈应使用take_profit_pct
-                                    tp_by_pct = actual_entry_price * (1 + tp_pct_max)
-                                    tp_by_fixed = (value_usdc + 1.0) / max(size, 1)
-                                    tp_target_price = min(tp_by_fixed, tp_by_pct)
-                                    sl_pct_max = CONFIG['risk'].get('max_stop_loss_pct', 0.30)
-                                    sl_by_pct = actual_entry_price * (1 - sl_pct_max)
-                                    sl_original = (value_usdc - 1.0) / max(size, 1)
-                                    sl_target_price = max(sl_original, sl_by_pct)
-                                    tp_target_price = align_price(tp_target_price)
-                                    sl_target_price = align_price(sl_target_price)
-                                    print(f"       [STOP ORDERS] 重新计算止盈止损: tp={tp_target_price:.4f}, sl={sl_target_price:.4f}")
-                                    print(f"       [STOP ORDERS] 更新value: {value_usdc:.2f} USDC")
+                                    tp_target_price, sl_target_price, value_usdc = _compute_stop_prices(
+                                        actual_entry_price, size, view.tick_size, tp_pct_max, sl_pct_max)
+                                    logger.info("       [STOP ORDERS] 重新计算止盈止损: tp=%.4f, sl=%.4f", tp_target_price, sl_target_price)
+                                    logger.info("       [STOP ORDERS] 更新value: %.2f USDC", value_usdc)
                         elif entry_order and entry_order.get('status') == 'LIVE':
                             # 订单还是LIVE状态，可能真的没成交，尝试撤单
-                            print(f"       [STOP ORDERS] 订单状态仍为LIVE，尝试撤单")
+                            logger.info("       [STOP ORDERS] 订单状态仍为LIVE，尝试撤单")
                             cancel_success = False
                             try:
                                 cancel_result = self.cancel_order(entry_order_id)
                                 if cancel_result:
-                                    print(f"       [STOP ORDERS] ✅ 撤单成功，安全放弃该笔交易")
+                                    logger.info("       [STOP ORDERS] ✅ 撤单成功，安全放弃该笔交易")
                                     cancel_success = True
                                 else:
-                                    print(f"       [STOP ORDERS] ⚠️  撤单请求返回失败，订单可能仍在")
+                                    logger.info("       [STOP ORDERS] ⚠️  撤单请求返回失败，订单可能仍在")
                             except Exception as cancel_err:
-                                print(f"       [STOP ORDERS] ❌ 撤单异常: {cancel_err}")
+                                logger.info("       [STOP ORDERS] ❌ 撤单异常: %s", cancel_err)
 
                             # 【核心防御】撤单失败 = 订单可能还在 = 强制监控！
                             if not cancel_success:
-                                print(f"       [STOP ORDERS] 🚨 无法确认订单状态，强制移交本地双向监控！")
+                                logger.info("       [STOP ORDERS] 🚨 无法确认订单状态，强制移交本地双向监控！")
                                 # 使用原定入场价格计算止盈止损
                                 if entry_price and size:
-                                    value_usdc = size * entry_price
-                                    # 需要重新定义align_price函数（因为它在函数外部定义）
-                                    tick_size = 0.01  # 默认tick size
-                                    try:
-                                        tick_size = float(market.get('orderPriceMinTickSize') or 0.01)
-                                    except:
-                                        pass
-                                    def align_price_local(p: float) -> float:
-                                        p = round(round(p / tick_size) * tick_size, 4)
-                                        return max(tick_size, min(1 - tick_size, p))
-
                                     # 对称30%止盈止损
-                                    tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)  # 修复：止盈应使用take_profit_pct
-                                    tp_by_pct = entry_price * (1 + tp_pct_max)
-                                    tp_by_fixed = (value_usdc + 1.0) / max(size, 1)
-                                    tp_target_price = align_price_local(min(tp_by_fixed, tp_by_pct))
-                                    sl_pct_max = CONFIG['risk'].get('max_stop_loss_pct', 0.30)
-                                    sl_by_pct = entry_price * (1 - sl_pct_max)
-                                    sl_original = (value_usdc - 1.0) / max(size, 1)
-                                    sl_target_price = align_price_local(max(sl_original, sl_by_pct))
+                                    tp_target_price, sl_target_price, value_usdc = _compute_stop_prices(
+                                        entry_price, size, view.tick_size, tp_pct_max, sl_pct_max)
                                     actual_entry_price = entry_price
-                                    print(f"       [STOP ORDERS] 🛡️  强制监控: entry={entry_price:.4f}, tp={tp_target_price:.4f}, sl={sl_target_price:.4f}")
+                                    logger.info("       [STOP ORDERS] 🛡️  强制监控: entry=%.4f, tp=%.4f, sl=%.4f", entry_price, tp_target_price, sl_target_price)
                                     # 返回None作为tp_order_id（止盈单需后续挂），但返回其他参数强制监控
                                     return None, sl_target_price, actual_entry_price
                                 else:
-                                    print(f"       [STOP ORDERS] ❌ 无法获取价格信息，但为安全起见仍强制监控")
+                                    logger.info("       [STOP ORDERS] ❌ 无法获取价格信息，但为安全起见仍强制监控")
                                     # 即使没有价格信息，也返回原值强制监控
                                     return None, None, entry_price
                             else:
                                 # 撤单成功，真的没成交，安全放弃
                                 return None, None, None
                         else:
-                            print(f"       [STOP ORDERS] ❌ 订单状态: {entry_order.get('status', 'UNKNOWN')}，放弃")
+                            logger.info("       [STOP ORDERS] ❌ 订单状态: %s，放弃", entry_order.get('status', 'UNKNOWN'))
                             return None, None, None
                     except Exception as e:
-                        print(f"       [STOP ORDERS] ❌ 最后检查失败: {e}")
+                        logger.info("       [STOP ORDERS] ❌ 最后检查失败: %s", e)
                         return None, None, None
 
+            # 止盈止损 size 等于实际买入量（查链上精确余额，避免取整超卖）
+            try:
+                # 已确认到账时余额缓存是最新的，否则取并行查询的结果
+                bal_result = self._token_balance(token_id) if token_arrived else fut_bal.result(timeout=5)
+                if bal_result:
+                    raw = float(bal_result.get('balance', '0') or '0')
+                    actual_size_on_chain = raw / 1e6
+                    if actual_size_on_chain >= 0.5:
+                        stop_size = actual_size_on_chain
+                        logger.info("       [STOP ORDERS] 链上精确余额: %s (DB size=%s)", stop_size, size)
+                    else:
+                        stop_size = int(size)
+                else:
+                    stop_size = int(size)
+            except Exception as e:
+                logger.info("       [STOP ORDERS] 余额查询失败(%s)，使用DB size", e)
+                stop_size = int(size)
+
             # 确认token授权
             # 检查token授权
-            print(f"       [STOP ORDERS] 检查token授权...")
-            self.ensure_allowance(token_id, expected_size=stop_size)
+            logger.info("       [STOP ORDERS] 检查token授权...")
+            balance_ready = self.ensure_allowance(token_id, expected_size=stop_size)
 
             # ==========================================
             # 🚀 强制止盈挂单（带动态退避与重试机制）
             # ==========================================
-            print(f"       [STOP ORDERS] ⏳ 开始挂止盈单前的强制冷却 (等待 5 秒让Polygon同步余额)...")
-            time.sleep(5)  # 【核心防御】：首次挂单前必须硬等待！防止 Polymarket 后端缓存你的0余额状态
+            # 已确认到账（余额+授权均已在链上观察到）时无需冷却
+            if not balance_ready:
+                logger.info("       [STOP ORDERS] ⏳ 开始挂止盈单前的强制冷却 (等待 5 秒让Polygon同步余额)...")
+                time.sleep(5)  # 【核心防御】：首次挂单前必须硬等待！防止 Polymarket 后端缓存你的0余额状态
 
             # 组装止盈单参数 (注意：无论是做多还是做空，平仓永远是 SELL 你手里的 Token)
-            from py_clob_client.clob_types import OrderArgs
 
             tp_order_args = OrderArgs(
                 token_id=token_id,
@@ -2482,65 +3445,60 @@ class AutoTraderV5:
             tp_order_id = None
 
             for attempt in range(1, max_retries + 1):
-                print(f"       [STOP ORDERS] 🎯 尝试挂载限价止盈单 ({attempt}/{max_retries})... 目标价: {tp_target_price:.4f}")
+                logger.info("       [STOP ORDERS] 🎯 尝试挂载限价止盈单 (%s/%s)... 目标价: %.4f", attempt, max_retries, tp_target_price)
                 try:
                     # 向盘口发送限价挂单
                     tp_response = self.client.create_and_post_order(tp_order_args)
 
                     if tp_response and 'orderID' in tp_response:
                         tp_order_id = tp_response['orderID']
-                        print(f"       [STOP ORDERS] ✅ 止盈挂单成功！订单已经躺在盘口等待暴涨。ID: {tp_order_id[-8:]}")
+                        logger.info("       [STOP ORDERS] ✅ 止盈挂单成功！订单已经躺在盘口等待暴涨。ID: %s", tp_order_id[-8:])
                         break  # 挂单成功，立刻跳出循环
                     else:
-                        print(f"       [STOP ORDERS] ⚠️  挂单未报错但未返回订单ID: {tp_response}")
+                        logger.info("       [STOP ORDERS] ⚠️  挂单未报错但未返回订单ID: %s", tp_response)
                         time.sleep(2)
 
                 except Exception as e:
                     error_msg = str(e).lower()
                     if 'balance' in error_msg or 'allowance' in error_msg:
+                        if 'allowance' in error_msg:
+                            # 授权报错说明缓存已不可信，下次重新查询
+                            self._set_allowance_known(token_id, False)
                         wait_time = attempt * 3
-                        print(f"       [STOP ORDERS] 🔄 链上余额未同步，等待 {wait_time} 秒后重试...")
+                        logger.info("       [STOP ORDERS] 🔄 链上余额未同步，等待 %s 秒后重试...", wait_time)
                         time.sleep(wait_time)
                         # 重新查链上余额，更新 stop_size 和 tp_order_args
                         try:
-                            bal_result2 = self.client.get_balance_allowance(bal_params)
+                            bal_result2 = self._token_balance(token_id, max_age=0)
                             if bal_result2:
                                 raw2 = float(bal_result2.get('balance', '0') or '0')
                                 new_size = raw2 / 1e6
                                 if new_size >= 0.5:
                                     stop_size = new_size
-                                    tp_order_args = OrderArgs(
-                                        token_id=token_id,
-                                        price=tp_target_price,
-                                        size=stop_size,
-                                        side='SELL'
-                                    )
-                                    print(f"       [STOP ORDERS] 🔄 更新余额: {stop_size}")
+                                    tp_order_args.size = stop_size
+                                    logger.info("       [STOP ORDERS] 🔄 更新余额: %s", stop_size)
                         except Exception:
                             pass
                     else:
-                        print(f"       [STOP ORDERS] ❌ 挂单发生未知异常: {e}")
+                        logger.info("       [STOP ORDERS] ❌ 挂单发生未知异常: %s", e)
                         time.sleep(3)
 
             # 兜底机制：如果 6 次（总计等了约 1 分钟）还是没挂上去
             if not tp_order_id:
-                print(f"       [STOP ORDERS] 🚨 止盈单挂载彻底失败！已无缝移交【本地双向监控】系统兜底。")
+                logger.info("       [STOP ORDERS] 🚨 止盈单挂载彻底失败！已无缝移交【本地双向监控】系统兜底。")
 
             # 止损不挂单，由本地轮询监控（策略一：只挂止盈Maker，止损用Taker）
             # sl_target_price 保存到数据库供轮询使用
-            sl_order_id = None
-
             if tp_order_id:
-                print(f"       [STOP ORDERS] ✅ 止盈单已挂 @ {tp_target_price:.4f}，止损线 @ {sl_target_price:.4f} 由本地监控")
+                logger.info("       [STOP ORDERS] ✅ 止盈单已挂 @ %.4f，止损线 @ %.4f 由本地监控", tp_target_price, sl_target_price)
             else:
-                print(f"       [STOP ORDERS] ❌ 止盈单挂单失败，将使用本地监控双向平仓")
+                logger.info("       [STOP ORDERS] ❌ 止盈单挂单失败，将使用本地监控双向平仓")
 
             return tp_order_id, sl_target_price, actual_entry_price
 
         except Exception as e:
-            print(f"       [STOP ORDERS ERROR] {e}")
-            import traceback
-            print(f"       [TRACEBACK] {traceback.format_exc()}")
+            logger.info("       [STOP ORDERS ERROR] %s", e)
+            logger.info("       [TRACEBACK] %s", traceback.format_exc())
             return None, None, entry_price
 
     def close_position(self, market: Dict, side: str, size: float, is_stop_loss: bool = False, entry_price: float = None, sl_price: float = None):
@@ -2555,24 +3513,16 @@ class AutoTraderV5:
             sl_price: 真实止损价（优先用于极端暴跌判断，替代 entry_price * 0.70）
         """
         try:
-            token_ids = market.get('clobTokenIds', [])
-            if isinstance(token_ids, str):
-                token_ids = json.loads(token_ids)
-
-            if not token_ids:
+            view = _market_view(market)
+            if not view.token_ids:
                 return False
 
             # 获取 token_id 和平仓方向
             # Polymarket机制：平仓永远是SELL（平多卖YES，平空卖NO）
             # clobTokenIds[0]=YES, clobTokenIds[1]=NO（固定顺序）
-            token_id = str(token_ids[0] if side == 'LONG' else token_ids[1])
+            token_id = view.token_for(side)
             opposite_side = 'SELL'  # 平仓永远是SELL
 
-            # 获取outcomePrices用于计算平仓价格
-            outcome_prices = market.get('outcomePrices', [])
-            if isinstance(outcome_prices, str):
-                outcome_prices = json.loads(outcome_prices)
-
             # ========== 🛡️ 智能防插针止损保护 ==========
             # 获取公允价格（token_price）和实际买一价（best_bid），优先用WebSocket实时价
             best_bid = self.get_order_book(token_id, side='BUY')
@@ -2580,10 +3530,9 @@ class AutoTraderV5:
                 token_price = best_bid  # WebSocket实时价作为公允价
             else:
                 # fallback到outcomePrices
-                if side == 'LONG':
-                    token_price = float(outcome_prices[0]) if outcome_prices and len(outcome_prices) > 0 else 0.5
-                else:
-                    token_price = float(outcome_prices[1]) if outcome_prices and len(outcome_prices) > 1 else 0.5
+                token_price = _outcome_prices(market)[0 if side == 'LONG' else 1]
+                if token_price is None:
+                    token_price = 0.5
                 best_bid = token_price
 
             # 🛡️ 防插针核心逻辑：最多允许折价5%，拒绝恶意接针
@@ -2599,7 +3548,7 @@ class AutoTraderV5:
                     else:
                         close_price = token_price
                     use_limit_order = False
-                    print(f"       [止损模式] ⚠️ 无entry_price，市价砸单 @ {close_price:.4f}")
+                    logger.info("       [止损模式] ⚠️ 无entry_price，市价砸单 @ %.4f", close_price)
                 else:
                     # 🩸 断臂求生：极端暴跌时放弃博反弹幻想，直接市价砸盘
                     # Polymarket 15分钟期权市场：价格=概率，暴跌=基本面变化，不会反弹
@@ -2611,49 +3560,44 @@ class AutoTraderV5:
                     if best_bid and best_bid > 0.01:
                         # 🚨 极端暴跌检测：best_bid已经远低于止损线
                         if best_bid < sl_line * 0.50:  # 低于止损线50%
-                            print(f"       [断臂求生] 🚨 极端暴跌！best_bid({best_bid:.4f}) << 止损线({sl_line:.4f})")
-                            print(f"       [断臂求生] 🩸 放弃博反弹幻想！执行断臂求生，市价砸盘！")
+                            logger.info("       [断臂求生] 🚨 极端暴跌！best_bid(%.4f) << 止损线(%.4f)", best_bid, sl_line)
+                            logger.info("       [断臂求生] 🩸 放弃博反弹幻想！执行断臂求生，市价砸盘！")
                             # 即使只能拿回10%本金，也比归零强
                             close_price = max(0.01, best_bid - 0.05)
                             use_limit_order = False
-                            print(f"       [断臂求生] ⚡ 砸盘价 @ {close_price:.4f} (能抢回多少是多少)")
+                            logger.info("       [断臂求生] ⚡ 砸盘价 @ %.4f (能抢回多少是多少)", close_price)
                         elif best_bid < sl_line:
                             # best_bid低于止损线，但不是极端情况
                             close_price = max(0.01, best_bid - 0.05)
                             use_limit_order = False
-                            print(f"       [止损模式] ⚡ best_bid低于止损线({best_bid:.4f}<{sl_line:.4f})，砸盘价 @ {close_price:.4f}")
+                            logger.info("       [止损模式] ⚡ best_bid低于止损线(%.4f<%.4f)，砸盘价 @ %.4f", best_bid, sl_line, close_price)
                         else:
                             # best_bid正常，直接市价成交
                             close_price = best_bid
                             use_limit_order = False
-                            print(f"       [止损模式] ⚡ 市价砸单 @ {close_price:.4f} (止损线{sl_line:.4f})")
+                            logger.info("       [止损模式] ⚡ 市价砸单 @ %.4f (止损线%.4f)", close_price, sl_line)
                     else:
                         # 无法获取best_bid，用入场价70%保守砸盘
                         close_price = max(0.01, entry_price * 0.70)
                         use_limit_order = False
-                        print(f"       [止损模式] ⚡ 无best_bid，保守砸盘价 @ {close_price:.4f}")
+                        logger.info("       [止损模式] ⚡ 无best_bid，保守砸盘价 @ %.4f", close_price)
 
                 # ========== 核心修复：止损前撤销所有挂单释放冻结余额 ==========
-                print(f"       [LOCAL SL] 🧹 正在紧急撤销该Token的所有挂单，释放被冻结的余额...")
+                logger.info("       [LOCAL SL] 🧹 正在紧急撤销该Token的所有挂单，释放被冻结的余额...")
                 try:
-                    self.client.cancel_all()
-                    time.sleep(0.5)  # 等待服务器把余额退回账户
-                    # 重新查询真实可用余额
-                    from py_clob_client.clob_types import BalanceAllowanceParams, AssetType
-                    _params = BalanceAllowanceParams(
-                        asset_type=AssetType.CONDITIONAL,
-                        token_id=token_id,
-                        signature_type=2
-                    )
-                    _result = self.client.get_balance_allowance(_params)
+                    # 🚀 撤单与余额查询并行发出（链上ERC1155余额不受挂单影响，无需等撤单完成再查）
+                    fut_cancel = self._rpc_pool.submit(self.client.cancel_all)
+                    fut_bal = self._rpc_pool.submit(self._token_balance, token_id, 0)
+                    fut_cancel.result(timeout=10)
+                    _result = fut_bal.result(timeout=10)
                     actual_balance = float(_result.get('balance', '0') or '0') / 1e6 if _result else 0
-                    print(f"       [LOCAL SL] 🔓 余额释放成功，当前真实可用余额: {actual_balance:.2f} 份")
+                    logger.info("       [LOCAL SL] 🔓 余额释放成功，当前真实可用余额: %.2f 份", actual_balance)
                     if actual_balance <= 0:
-                        print(f"       [LOCAL SL] ⚠️ 撤单后余额依然为0，确认已无持仓。")
+                        logger.info("       [LOCAL SL] ⚠️ 撤单后余额依然为0，确认已无持仓。")
                         return None
                     close_size = actual_balance  # 用真实余额，不四舍五入
                 except Exception as _e:
-                    print(f"       [LOCAL SL 撤单失败] {_e}，退回原逻辑")
+                    logger.info("       [LOCAL SL 撤单失败] %s，退回原逻辑", _e)
                     close_size = size
                 # ================================================================
             elif best_bid and best_bid >= min_acceptable_price:
@@ -2664,37 +3608,31 @@ class AutoTraderV5:
                 # ⚠️ 买一价太黑（流动性断层）！限价单等待
                 close_price = min_acceptable_price
                 use_limit_order = True
-                print(f"       [防插针] ⚠️ 买一价({best_bid if best_bid else 0:.4f})远低于公允价({token_price:.4f})，改挂限价单 @ {close_price:.4f}")
+                logger.info("       [防插针] ⚠️ 买一价(%.4f)远低于公允价(%.4f)，改挂限价单 @ %.4f", best_bid if best_bid else 0, token_price, close_price)
 
-            close_price = max(0.01, min(0.99, close_price))
+            close_price = min(_MAX_PRICE, max(_MIN_PRICE, close_price))
             # ===========================================
 
             # 计算平仓数量（平全部）- 使用精确余额，不取整避免超卖
-            # 先查链上实际可用余额，以实际余额为准
+            # 先查链上实际可用余额，以实际余额为准（平仓数量取决于最新余额，不用缓存）
             try:
-                from py_clob_client.clob_types import BalanceAllowanceParams, AssetType
-                params = BalanceAllowanceParams(
-                    asset_type=AssetType.CONDITIONAL,
-                    token_id=token_id,
-                    signature_type=2
-                )
-                result = self.client.get_balance_allowance(params)
+                result = self._token_balance(token_id, max_age=0)
                 if result:
                     amount = float(result.get('balance', '0') or '0')
                     actual_size = amount / 1e6
                     if actual_size >= 0.5:
                         close_size = actual_size
-                        print(f"       [CLOSE] 链上精确余额: {close_size} (DB size={size})")
+                        logger.info("       [CLOSE] 链上精确余额: %s (DB size=%s)", close_size, size)
                     else:
                         close_size = int(size)
                 else:
                     close_size = int(size)
             except Exception as e:
-                print(f"       [CLOSE] 余额查询失败({e})，使用DB size")
+                logger.info("       [CLOSE] 余额查询失败(%s)，使用DB size", e)
                 close_size = int(size)
 
             order_type = "限价单(挂单等待)" if use_limit_order else "市价单(立即成交)"
-            print(f"       [CLOSE] {order_type} 平仓 {side} {close_size}份 @ {close_price:.4f}")
+            logger.info("       [CLOSE] %s 平仓 %s %s份 @ %.4f", order_type, side, close_size, close_price)
 
             order_args = OrderArgs(
                 token_id=token_id,
@@ -2708,22 +3646,50 @@ class AutoTraderV5:
             if response and 'orderID' in response:
                 order_id = response['orderID']
                 if use_limit_order:
-                    print(f"       [CLOSE OK] 限价单已挂 {order_id[-8:]}，等待成交...")
+                    logger.info("       [CLOSE OK] 限价单已挂 %s，等待成交...", order_id[-8:])
                 else:
-                    print(f"       [CLOSE OK] 市价成交 {order_id[-8:]}")
+                    logger.info("       [CLOSE OK] 市价成交 %s", order_id[-8:])
                 return order_id
             else:
-                print(f"       [CLOSE FAIL] {response}")
+                logger.info("       [CLOSE FAIL] %s", response)
                 return None
         except Exception as e:
             error_msg = str(e).lower()
             # 💡 精准识别"余额不足"，并返回特殊标记
             if 'balance' in error_msg or 'allowance' in error_msg or 'insufficient' in error_msg:
-                print(f"       [CLOSE OK] 限价单已提前成交或已手动平仓，跳过市价平仓")
+                if 'allowance' in error_msg:
+                    self._set_allowance_known(token_id, False)
+                logger.info("       [CLOSE OK] 限价单已提前成交或已手动平仓，跳过市价平仓")
                 return "NO_BALANCE"  # 以前这里是返回 None，现在返回专属暗号
-            print(f"       [CLOSE ERROR] {e}")
+            logger.info("       [CLOSE ERROR] %s", e)
             return None
 
+    def _rest_json(self, url: str, params: Dict, ttl: float = 0.5, timeout: float = 10) -> Optional[Dict]:
+        """GET并解析JSON，按(url, 参数)缓存ttl秒；非200不缓存，失败立即可重试"""
+        key = (url, tuple(sorted(params.items())))
+        now = time.monotonic()
+        with self._rest_cache_lock:
+            cached = self._rest_cache.get(key)
+            if cached and now - cached[1] < ttl:
+                return cached[0]
+        resp = None
+        if self._h2 is not None:
+            try:
+                resp = self._h2.get(url, params=params, timeout=timeout)
+            except httpx.HTTPError as e:
+                print(f"       [HTTP2] 请求失败，回退requests: {e}")
+        if resp is None:
+            # 🚀 使用Session复用TCP连接
+            resp = self.http_session.get(url, params=params, proxies=self._proxy, timeout=timeout)
+        if resp.status_code != 200:
+            return None
+        data = _loads(resp.content)
+        with self._rest_cache_lock:
+            if len(self._rest_cache) >= 2048:
+                self._rest_cache = {k: v for k, v in self._rest_cache.items() if now - v[1] < ttl}
+            self._rest_cache[key] = (data, now)
+        return data
+
     def get_order_book(self, token_id: str, side: str = 'BUY') -> Optional[float]:
         """获取真实成交价（使用 /price API）
 
@@ -2735,11 +3701,10 @@ class AutoTraderV5:
             float: 价格（转换失败返回None）
         """
         try:
-            url = "https://clob.polymarket.com/price"
-            # 🚀 使用Session复用TCP连接（提速3-5倍）
-            resp = self.http_session.get(url, params={"token_id": token_id, "side": side}, proxies=CONFIG['proxy'], timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
+            # 🚀 0.5秒TTL缓存：止盈/止损等多个分支同一时刻查同一token时只发一次请求
+            data = self._rest_json("https://clob.polymarket.com/price",
+                                   {"token_id": token_id, "side": side}, timeout=10)
+            if data:
                 price = data.get('price')
                 if price is not None:
                     return float(price)
@@ -2755,7 +3720,7 @@ class AutoTraderV5:
         """
         try:
             # 临近结算时订单簿失真，直接跳过
-            spread = float(market.get('spread') or 0)
+            spread = _fnum(market, 'spread')
             if spread > 0.5:
                 return 0.0
 
@@ -2771,22 +3736,16 @@ class AutoTraderV5:
                 return round(max(-1.0, min(1.0, bias * 20)), 3)
 
             # 备用：调用 /book
-            token_ids = market.get('clobTokenIds', [])
-            if isinstance(token_ids, str):
-                token_ids = json.loads(token_ids)
+            token_ids = _market_view(market).token_ids
             if not token_ids:
                 return 0.0
 
-            token_id_yes = str(token_ids[0])
-            url = "https://clob.polymarket.com/book"
-            # 🚀 使用Session复用TCP连接（提速订单簿查询）
-            resp = self.http_session.get(url, params={"token_id": token_id_yes},
-                                proxies=CONFIG['proxy'], timeout=5)
-            if resp.status_code != 200:
+            token_id_yes = token_ids[0]
+            book = self._rest_json("https://clob.polymarket.com/book",
+                                   {"token_id": token_id_yes}, timeout=5)
+            if not book:
                 return 0.0
 
-            book = resp.json()
-
             # 临近结算时订单簿失真检测（bids全在0.01或asks全在0.99）
             bids = book.get('bids', [])
             asks = book.get('asks', [])
@@ -2795,15 +3754,16 @@ class AutoTraderV5:
             if float(bids[0].get('price', 0)) < 0.05 or float(asks[0].get('price', 1)) > 0.95:
                 return 0.0
 
-            bid_depth = sum(float(b['size']) for b in bids[:3])
-            ask_depth = sum(float(a['size']) for a in asks[:3])
+            bid_depth = _book_depth(bids)
+            ask_depth = _book_depth(asks)
             total = bid_depth + ask_depth
             if total == 0:
                 return 0.0
 
             bias = (bid_depth - ask_depth) / total
             return round(bias, 3)
-        except:
+        except (requests.RequestException, ValueError, KeyError, TypeError, AttributeError):
+            # 网络错误/数据格式异常时不给偏向分（不吞掉KeyboardInterrupt）
             return 0.0
 
     def place_order(self, market: Dict, signal: Dict) -> Optional[Dict]:
@@ -2812,23 +3772,21 @@ class AutoTraderV5:
             return None
 
         try:
-            token_ids = market.get('clobTokenIds', [])
-            
-            # 修复点：确保 token_ids 被正确解析为列表
-            if isinstance(token_ids, str):
-                try:
-                    token_ids = json.loads(token_ids)
-                except Exception as e:
-                    print(f"       [ERROR] 解析 token_ids 失败: {e}")
-                    return None
+            # 🚀 token_ids / tick_size 按市场id缓存，不再每次下单重新解析
+            try:
+                view = _market_view(market)
+            except Exception as e:
+                print(f"       [ERROR] 解析 token_ids 失败: {e}")
+                return None
 
-            if not token_ids or len(token_ids) < 2:
+            if len(view.token_ids) < 2:
                 print("       [ERROR] 市场数据缺少完整的 token_ids")
                 return None
 
             # Polymarket: token_ids[0]=YES, token_ids[1]=NO
-            # LONG买YES, SHORT买NO
-            token_id = str(token_ids[0] if signal['direction'] == 'LONG' else token_ids[1])
+            # LONG买YES, SHORT买NO（方向下标只算一次，token/outcomePrices共用）
+            direction_idx = 0 if signal['direction'] == 'LONG' else 1
+            token_id = view.token_ids[direction_idx]
 
             # --- 查询真实成交价（V6优先用WebSocket，V5回退REST）---
             best_price = self.get_order_book(token_id, side='BUY')
@@ -2838,33 +3796,20 @@ class AutoTraderV5:
                 base_price = best_price
             else:
                 # 回退：从market的outcomePrices获取（可能是15分钟前的旧数据）
-                outcome_prices = market.get('outcomePrices', [])
-                if isinstance(outcome_prices, str):
-                    outcome_prices = json.loads(outcome_prices)
-                if signal['direction'] == 'LONG':
-                    base_price = float(outcome_prices[0]) if outcome_prices and len(outcome_prices) > 0 else float(signal['price'])
-                else:
-                    base_price = float(outcome_prices[1]) if outcome_prices and len(outcome_prices) > 1 else round(1.0 - float(signal['price']), 4)
+                base_price = _outcome_prices(market)[direction_idx]
+                if base_price is None:
+                    base_price = round(1.0 - float(signal['price']), 4) if direction_idx else float(signal['price'])
                 print(f"       [PRICE] 回退旧数据: {base_price:.4f}")
 
-            print(f"       [PRICE] 使用={'YES' if signal['direction']=='LONG' else 'NO'}={base_price:.4f}")
-
-            # tick_size 对齐
-            tick_size_float = float(market.get('orderPriceMinTickSize') or 0.01)
-            # tick_size 必须是字符串格式给 SDK（"0.1"/"0.01"/"0.001"/"0.0001"）
-            tick_size_str = str(tick_size_float)
+            print(f"       [PRICE] 使用={('YES', 'NO')[direction_idx]}={base_price:.4f}")
 
-            def align_price(p: float) -> float:
-                p = round(round(p / tick_size_float) * tick_size_float, 4)
-                return max(tick_size_float, min(1 - tick_size_float, p))
-
-            # --- 加滑点确保瞬间吃单成交，对齐 tick_size ---
+            # --- 加滑点确保瞬间吃单成交，对齐 tick_size（tick相关量已缓存在MarketView中）---
             slippage_ticks = 2  # 加2个tick滑点
-            adjusted_price = align_price(base_price + tick_size_float * slippage_ticks)
+            adjusted_price = view.with_slippage(base_price, slippage_ticks)
 
             # 🔥 关键修复：调整后价格仍需遵守价格限制
-            max_entry_price = CONFIG['signal'].get('max_entry_price', 0.80)
-            min_entry_price = CONFIG['signal'].get('min_entry_price', 0.20)
+            max_entry_price = self._max_entry
+            min_entry_price = self._min_entry
             if adjusted_price > max_entry_price:
                 print(f"       [RISK] ⚠️ 调整后价格超限: {adjusted_price:.4f} > {max_entry_price:.2f}，拒绝开仓")
                 return None
@@ -2873,31 +3818,31 @@ class AutoTraderV5:
                 return None
 
             # Calculate based on REAL balance（每次开仓前刷新链上余额）
-            fresh_usdc, _ = self.balance_detector.fetch()
+            fresh_usdc = self.balance_detector.fetch_usdc_only()
             if fresh_usdc <= 0:
                 print(f"       [RISK] 余额查询失败或余额为0，拒绝开仓（安全保护）")
                 return None
-            self.position_mgr.balance = fresh_usdc
+            self.position_mgr.set_balance(fresh_usdc)
             # 🎯 智能动态仓位：根据信号强度自动调整（15%-30%）
             position_value = self.position_mgr.calculate_position(signal['confidence'], signal['score'])
 
-            if not self.position_mgr.can_afford(position_value):
-                print(f"       [RISK] Cannot afford {position_value:.2f}")
-                return None
-
             # 使用加上滑点后的价格计算购买份数
             size = int(position_value / adjusted_price)
-            
+
             # --- 核心修复：满足 Polymarket 最小 Size 为 5 的硬性要求 ---
             # 开仓买6份，确保到账后余额足够挂5份止损单
-            if size < 6:
+            below_min = size < 6
+            if below_min:
                 size = 6
-                position_value = size * adjusted_price  # 重新计算需要花费的金额
-                
-                # 再次检查加上金额后，钱包里的钱还够不够
-                if not self.position_mgr.can_afford(position_value):
+                position_value = size * adjusted_price  # 重新计算需要花费的金额（必然大于原金额）
+
+            # 对最终金额只做一次余额检查
+            if not self.position_mgr.can_afford(position_value):
+                if below_min:
                     print(f"       [RISK] 余额不足以购买最低 6 份 (需要 {position_value:.2f} USDC)")
-                    return None
+                else:
+                    print(f"       [RISK] Cannot afford {position_value:.2f}")
+                return None
             # --------------------------------------------------------
 
             print(f"       [ORDER] {signal['direction']}")
@@ -2919,13 +3864,13 @@ class AutoTraderV5:
 
             if response and 'orderID' in response:
                 print(f"       [OK] {response['orderID']}")
+                self._invalidate_market_cache()
                 # 返回实际下单价格（adjusted_price）和实际size，用于准确计算盈亏和挂单
                 return {'order_id': response['orderID'], 'status': 'posted', 'value': position_value, 'price': adjusted_price, 'token_price': base_price, 'size': float(size)}
 
             return None
 
         except Exception as e:
-            import traceback
             err_msg = str(e)
             print(f"       [ERROR] {e}")
             print(f"       [TRACEBACK] {traceback.format_exc()}")
@@ -2938,7 +3883,6 @@ class AutoTraderV5:
                     print(f"       [RECOVERY] 检测到订单ID {order_id[-8:]}，尝试查询状态...")
                     try:
                         # 延迟1秒让订单上链
-                        import time
                         time.sleep(1)
 
                         order_info = self.client.get_order(order_id)
@@ -2962,20 +3906,11 @@ class AutoTraderV5:
 
     def record_trade(self, market: Dict, signal: Dict, order_result: Optional[Dict], was_blocked: bool = False, merged_from: int = 0):
         try:
-            # 🔥 防止数据库锁定：设置timeout和check_same_thread
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
-
             value = order_result.get('value', 0) if order_result else 0
 
-            cursor.execute("""
-                INSERT INTO trades (
-                    timestamp, side, price, value_usd, signal_score,
-                    confidence, rsi, vwap, order_id, status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            # trades流水同步落库：重启后_restore_daily_stats按它恢复每日交易次数风控，
+            # 不能缓冲（SIGTERM/OOM时atexit不会执行，缓冲行会丢失）
+            self._db_write(_SQL_INSERT_TRADE, (
                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 signal['direction'],
                 signal['price'],
@@ -2993,11 +3928,10 @@ class AutoTraderV5:
                 market_slug = market.get('slug', '')
                 if market_slug:
                     self.last_traded_market = market_slug
-                    print(f"       [MARKET] Traded: {market_slug}")
+                    logger.info("       [MARKET] Traded: %s", market_slug)
 
                 # 记录持仓到positions表（使用实际下单价格，同时挂止盈止损单）
                 actual_price = order_result.get('price', signal['price'])
-                token_price = order_result.get('token_price', actual_price)  # 真实token价格
 
                 # 固定0.5U止盈止损
                 tp_usd = 0.5
@@ -3018,44 +3952,31 @@ class AutoTraderV5:
                 if tp_order_id is None and actual_entry_price is not None and actual_entry_price > 0:
                     # 这种情况说明：订单超时未成交，强制监控模式，但实际没有token
                     # 需要验证是否真正有持仓
-                    print(f"       [POSITION] ⚠️  订单状态不明，验证持仓...")
+                    logger.info("       [POSITION] ⚠️  订单状态不明，验证持仓...")
                     # 通过查询余额来确认（token_id需要从market获取）
-                    token_ids = market.get('clobTokenIds', [])
-                    if isinstance(token_ids, str):
-                        token_ids = json.loads(token_ids)
-                    token_id = str(token_ids[0] if signal['direction'] == 'LONG' else token_ids[1])
+                    token_id = _market_view(market).token_for(signal['direction'])
 
                     try:
-                        from py_clob_client.clob_types import BalanceAllowanceParams, AssetType
-                        params = BalanceAllowanceParams(
-                            asset_type=AssetType.CONDITIONAL,
-                            token_id=token_id,
-                            signature_type=2
-                        )
-                        result = self.client.get_balance_allowance(params)
+                        result = self._token_balance(token_id, max_age=0)
                         if result:
                             balance = float(result.get('balance', 0))
                             balance_shares = balance / 1e6  # 转换为份数
-                            print(f"       [POSITION] Token余额: {balance_shares:.2f}份 (需要: {position_size:.0f})")
+                            logger.info("       [POSITION] Token余额: %.2f份 (需要: %.0f)", balance_shares, position_size)
                             if balance_shares < position_size * 0.5:  # 余额不足一半，说明未成交
-                                print(f"       [POSITION] ❌ 确认未成交，放弃记录持仓")
-                                self.safe_commit(conn)
-                                conn.close()
+                                logger.info("       [POSITION] ❌ 确认未成交，放弃记录持仓")
                                 return
                             else:
                                 # 🚨 严重Bug修复：余额充足，说明订单已成交！
                                 # 即使止盈止损单没挂上，也要记录到positions表
-                                print(f"       [POSITION] ✅ 确认已成交！止盈止损单失败，但必须记录持仓")
+                                logger.info("       [POSITION] ✅ 确认已成交！止盈止损单失败，但必须记录持仓")
                                 # 继续执行后续的positions记录逻辑
                                 pass
                     except Exception as verify_err:
-                        print(f"       [POSITION] ⚠️  无法验证余额: {verify_err}")
-                        print(f"       [POSITION] 🛡️  保守处理：假设已成交，记录持仓")
+                        logger.info("       [POSITION] ⚠️  无法验证余额: %s", verify_err)
+                        logger.info("       [POSITION] 🛡️  保守处理：假设已成交，记录持仓")
                         # 继续执行，确保不会漏记录持仓
                 elif tp_order_id is None and sl_target_price is None and actual_entry_price is None:
-                    print(f"       [POSITION] ❌ 入场单未成交，放弃记录持仓")
-                    self.safe_commit(conn)
-                    conn.close()
+                    logger.info("       [POSITION] ❌ 入场单未成交，放弃记录持仓")
                     return
 
                 # 初始化position_value
@@ -3063,27 +3984,32 @@ class AutoTraderV5:
 
                 # 使用实际成交价格（如果获取到了的话）
                 if actual_entry_price and abs(actual_entry_price - actual_price) > 0.0001:
-                    print(f"       [POSITION] 使用实际成交价格: {actual_entry_price:.4f} (调整价格: {actual_price:.4f})")
+                    logger.info("       [POSITION] 使用实际成交价格: %.4f (调整价格: %.4f)", actual_entry_price, actual_price)
                     actual_price = actual_entry_price
                     # 重新计算value
                     position_value = position_size * actual_price
 
                 # 计算止盈止损百分比（用于数据库记录）
                 # 直接使用 place_stop_orders 已返回的 sl_target_price，避免二次计算不一致
-                tick_size = float(market.get('orderPriceMinTickSize') or 0.01)
-                def align_price(p: float) -> float:
-                    p = round(round(p / tick_size) * tick_size, 4)
-                    return max(tick_size, min(1 - tick_size, p))
+                view = _market_view(market)
+                align_price = view.align
+                # 🔧 token_id 只解析一次（通知与入库共用，确保所有路径都已定义）
+                if len(view.token_ids) >= 2:
+                    token_id = view.token_for(signal['direction'])
+                else:
+                    # 如果获取失败，使用默认值（这种情况不应该发生）
+                    logger.info("       [WARN] 无法从market获取token_id，使用默认值")
+                    token_id = 'BTC_15M_YES' if signal['direction'] == 'LONG' else 'BTC_15M_NO'
 
                 real_value = position_size * actual_price
                 # 止盈：与 place_stop_orders 保持相同公式
-                tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)
+                tp_pct_max = self._tp_pct_max
                 tp_by_pct = actual_price * (1 + tp_pct_max)
                 tp_by_fixed = (real_value + 1.0) / max(position_size, 1)
                 tp_target_price = align_price(min(tp_by_fixed, tp_by_pct))
                 # 止损：直接使用 place_stop_orders 返回的价格，sl_target_price 为 None 时才兜底计算
                 if sl_target_price is None:
-                    sl_pct_max = CONFIG['risk'].get('max_stop_loss_pct', 0.30)
+                    sl_pct_max = self._sl_pct_max
                     sl_by_pct = actual_price * (1 - sl_pct_max)
                     sl_by_fixed = (real_value - 1.0) / max(position_size, 1)
                     sl_target_price = align_price(max(sl_by_fixed, sl_by_pct))
@@ -3092,57 +4018,20 @@ class AutoTraderV5:
                 sl_pct = round((actual_price - float(sl_target_price)) / actual_price, 4) if actual_price > 0 and sl_target_price else None
 
                 # 发送开仓Telegram通知
-                if self.telegram.enabled:
+                if self.telegram.would_send():
                     try:
-                        # 使用place_stop_orders内部计算的实际止盈止损价格（基于实际成交价）
-                        tick_size = float(market.get('orderPriceMinTickSize') or 0.01)
-                        def align_price(p: float) -> float:
-                            p = round(round(p / tick_size) * tick_size, 4)
-                            return max(tick_size, min(1 - tick_size, p))
-
-                        # 基于实际成交价格计算止盈止损（对称30%逻辑）
-                        tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)  # 修复：止盈应使用take_profit_pct
-                        tp_by_pct = actual_price * (1 + tp_pct_max)
-                        tp_by_fixed = (position_value + 1.0) / max(position_size, 1)
-                        tp_price = align_price(min(tp_by_fixed, tp_by_pct))
-                        sl_price = sl_target_price if sl_target_price else align_price((position_value - 1.0) / max(position_size, 1))
-
-                        # 获取token_id
-                        token_ids = market.get('clobTokenIds', [])
-                        if isinstance(token_ids, str):
-                            token_ids = json.loads(token_ids)
-                        token_id = str(token_ids[0] if signal['direction'] == 'LONG' else token_ids[1])
-
+                        # 直接使用上面已算好的止盈止损价（与入库记录一致，不再重复计算）
                         market_id = market.get('slug', market.get('questionId', 'unknown'))
                         self.telegram.send_position_open(
                             signal['direction'], position_size, actual_price, position_value,
-                            tp_price, sl_price, token_id, market_id
+                            tp_target_price, sl_target_price, token_id, market_id
                         )
-                        print(f"       [TELEGRAM] ✅ 开仓通知已发送")
+                        logger.info("       [TELEGRAM] ✅ 开仓通知已发送")
                     except Exception as tg_error:
-                        print(f"       [TELEGRAM ERROR] 发送开仓通知失败: {tg_error}")
-
-                # 🔧 从 market 中获取 token_id（修复：确保 token_id 在所有路径中都定义）
-                token_ids = market.get('clobTokenIds', [])
-                if isinstance(token_ids, str):
-                    import json
-                    token_ids = json.loads(token_ids)
-                if token_ids and len(token_ids) >= 2:
-                    token_id = str(token_ids[0] if signal['direction'] == 'LONG' else token_ids[1])
-                else:
-                    # 如果获取失败，使用默认值（这种情况不应该发生）
-                    print(f"       [WARN] 无法从market获取token_id，使用默认值")
-                    token_id = 'BTC_15M_YES' if signal['direction'] == 'LONG' else 'BTC_15M_NO'
+                        logger.info("       [TELEGRAM ERROR] 发送开仓通知失败: %s", tg_error)
 
-                cursor.execute("""
-                    INSERT INTO positions (
-                        entry_time, side, entry_token_price,
-                        size, value_usdc, take_profit_usd, stop_loss_usd,
-                        take_profit_pct, stop_loss_pct,
-                        take_profit_order_id, stop_loss_order_id, token_id, status, score, merged_from
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                # 🚀 持久连接写入（下单/等待成交期间不再占着一条临时连接）
+                self._db_write(_SQL_INSERT_POSITION, (
                     signal['direction'],
                     actual_price,  # 使用实际成交价格（已从订单中获取）
                     position_size,
@@ -3154,27 +4043,26 @@ class AutoTraderV5:
                     tp_order_id,
                     # ⚠️ 此字段存的是止损价格字符串，不是订单ID！用于本地轮询止损
                     # 🔍 修复：sl_target_price为None时用入场价兜底计算，确保止损线永远存在
-                    str(sl_target_price) if sl_target_price else str(round(max(0.01, actual_price * (1 - CONFIG['risk'].get('max_stop_loss_pct', 0.30))), 4)),
+                    str(sl_target_price) if sl_target_price else str(round(max(0.01, actual_price * (1 - self._sl_pct_max)), 4)),
                     token_id,
                     'open',
                     signal['score'],  # 🔥 保存信号评分，用于后续分析
-                    merged_from  # 🔥 标记是否是合并交易（0=独立，>0=被合并的持仓ID）
+                    merged_from,  # 🔥 标记是否是合并交易（0=独立，>0=被合并的持仓ID）
+                    market.get('slug')  # 🚀 冗余存储市场slug，供平仓时学习系统回填
                 ))
-                print(f"       [POSITION] 记录持仓: {signal['direction']} {position_value:.2f} USDC @ {actual_price:.4f}")
+                self._last_entry_monotonic[(token_id, signal['direction'])] = time.monotonic()
+                logger.info("       [POSITION] 记录持仓: %s %.2f USDC @ %.4f", signal['direction'], position_value, actual_price)
 
                 # 根据止盈止损单状态显示不同信息
                 if tp_order_id:
-                    print(f"       [POSITION] ✅ 止盈单已挂 @ {tp_target_price:.4f}，止损线 @ {sl_target_price:.4f} 本地监控")
+                    logger.info("       [POSITION] ✅ 止盈单已挂 @ %.4f，止损线 @ %.4f 本地监控", tp_target_price, sl_target_price)
                 else:
-                    print(f"       [POSITION] ⚠️  止盈单挂单失败，将使用本地监控双向平仓")
-
-            self.safe_commit(conn)
-            conn.close()
+                    logger.info("       [POSITION] ⚠️  止盈单挂单失败，将使用本地监控双向平仓")
 
             self.record_prediction_learning(market, signal, order_result, was_blocked=was_blocked)
 
         except Exception as e:
-            print(f"       [DB ERROR] {e}")
+            logger.info("       [DB ERROR] %s", e)
 
     def merge_position_existing(self, market: Dict, signal: Dict, new_order_result: Dict):
         """合并新订单到已有持仓（解决连续开仓导致止盈止损混乱）
@@ -3192,15 +4080,13 @@ class AutoTraderV5:
         6. 更新数据库记录
         """
         try:
-            import time
             token_ids = market.get('clobTokens', [])
             if isinstance(token_ids, str):
-                token_ids = json.loads(token_ids)
+                token_ids = _loads(token_ids)
             token_id = str(token_ids[0] if signal['direction'] == 'LONG' else token_ids[1])
 
             # 获取当前15分钟窗口
-            from datetime import timezone as tz
-            now_utc = datetime.now(tz.utc)
+            now_utc = datetime.now(timezone.utc)
             window_start_ts = (int(now_utc.timestamp()) // 900) * 900
             window_start_str = datetime.fromtimestamp(window_start_ts).strftime('%Y-%m-%d %H:%M:%S')
 
@@ -3219,7 +4105,7 @@ class AutoTraderV5:
             open_count = cursor.fetchone()
             shots_fired = open_count[0] if open_count else 0
 
-            max_bullets = CONFIG['risk']['max_same_direction_bullets']
+            max_bullets = self._max_bullets
             if shots_fired >= max_bullets:
                 conn.close()
                 print(f"       [MERGE] 🛑 弹匣耗尽: {signal['direction']}已开{shots_fired}次（最多{max_bullets}次），禁止合并")
@@ -3310,14 +4196,11 @@ class AutoTraderV5:
             # 计算新的止盈止损价格（合并持仓只用百分比，不用固定金额）
             # 🔥 修复：移除固定金额逻辑，统一使用30%百分比
             # 原因：大仓位时+1U/-1U占比太小，会偏离设计意图
-            tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)
-            sl_pct_max = CONFIG['risk'].get('max_stop_loss_pct', 0.30)
+            tp_pct_max = self._tp_pct_max
+            sl_pct_max = self._sl_pct_max
 
             # 对齐价格精度
-            tick_size = float(market.get('orderPriceMinTickSize') or 0.01)
-            def align_price(p):
-                p = round(round(p / tick_size) * tick_size, 4)
-                return max(tick_size, min(1 - tick_size, p))
+            align_price = _market_view(market).align
 
             # 止盈：统一用30%百分比
             tp_target_price = align_price(merged_entry_price * (1 + tp_pct_max))
@@ -3330,7 +4213,6 @@ class AutoTraderV5:
             # 挂新的止盈单
             new_tp_order_id = None
             try:
-                from py_clob_client.clob_types import OrderArgs
                 tp_args = OrderArgs(
                     token_id=token_id,
                     price=tp_target_price,
@@ -3345,9 +4227,9 @@ class AutoTraderV5:
                 print(f"       [MERGE] ⚠️ 挂新止盈单失败: {e}，将使用本地监控")
 
             # 更新数据库
-            cursor.execute("""
+            cursor.execute(f"""
                 UPDATE positions
-                SET entry_time = ?,
+                SET entry_time = {_SQL_NOW_LOCAL},
                     entry_token_price = ?,
                     size = ?,
                     value_usdc = ?,
@@ -3357,7 +4239,6 @@ class AutoTraderV5:
                     stop_loss_usd = ?
                 WHERE id = ?
             """, (
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 merged_entry_price,
                 merged_size,
                 merged_value,
@@ -3370,13 +4251,13 @@ class AutoTraderV5:
 
             self.safe_commit(conn)
             conn.close()
+            self._last_entry_monotonic[(str(old_token_id), signal['direction'])] = time.monotonic()
 
             print(f"       [MERGE] ✅ 持仓合并完成！")
             return True, pos_id
 
         except Exception as e:
             print(f"       [MERGE ERROR] {e}")
-            import traceback
             print(f"       [TRACEBACK] {traceback.format_exc()}")
             return False
 
@@ -3388,26 +4269,30 @@ class AutoTraderV5:
         market: 可选，传入已获取的市场数据避免重复请求。
         """
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
-
+            # 🚀 复用持久连接（不再每次轮询都新开连接+设置PRAGMA）
             # 获取所有open和closing状态的持仓（包括订单ID）
             # 🔥 修复：也查询'closing'状态，处理止损/止盈失败后卡住的持仓
-            cursor.execute("""
-                SELECT id, entry_time, side, entry_token_price,
-                       size, value_usdc, take_profit_order_id, stop_loss_order_id, token_id
-                FROM positions
-                WHERE status IN ('open', 'closing')
-            """)
-            positions = cursor.fetchall()
+            positions = self._open_position_rows()
 
             if not positions:
-                conn.close()
                 return
 
-            for pos in positions:
+            # 🚀 本轮轮询内市场数据只取一次（各持仓、各分支共用），结束时间epoch缓存在market字典里
+            _memo = {}
+
+            def _current_market():
+                if 'm' not in _memo:
+                    _memo['m'] = market if market else self.get_market_data()
+                return _memo['m']
+
+            def _market_end_ts():
+                m = _current_market()
+                return _end_epoch(m) if m else None
+
+            # 🚀 本地止盈目标/止损线在循环前对全部持仓算好，循环内按下标取值
+            tp_targets, sl_lines = _local_stop_levels(positions, self._tp_pct_max)
+
+            for idx, pos in enumerate(positions):
                 pos_id, entry_time, side, entry_token_price, size, value_usdc, tp_order_id, sl_order_id, token_id = pos
                 entry_token_price = float(entry_token_price)
                 size = float(size)
@@ -3438,14 +4323,13 @@ class AutoTraderV5:
                 if pos_current_price is None:
                     # exit_reason 在此处尚未初始化，直接执行紧急平仓
                     if not getattr(self, f'_emergency_closed_{pos_id}', False):
-                        print(f"       [EMERGENCY] ⚠️ 价格获取失败（API超时/网络问题），立即市价平仓保护")
+                        logger.info("       [EMERGENCY] ⚠️ 价格获取失败（API超时/网络问题），立即市价平仓保护")
                         # 尝试紧急市价平仓
                         try:
-                            close_market = market if market else self.get_market_data()
+                            close_market = _current_market()
                             if close_market:
                                 # 用入场价90%确保成交（快速止损）
-                                close_price = max(0.01, min(0.99, entry_token_price * 0.90))
-                                from py_clob_client.clob_types import OrderArgs
+                                close_price = min(_MAX_PRICE, max(_MIN_PRICE, entry_token_price * 0.90))
                                 close_order_args = OrderArgs(
                                     token_id=token_id,
                                     price=close_price,
@@ -3458,50 +4342,45 @@ class AutoTraderV5:
                                     exit_reason = 'EMERGENCY_PRICE_FAIL'
                                     triggered_order_id = close_response['orderID']
                                     actual_exit_price = close_price
-                                    print(f"       [EMERGENCY] ✅ 紧急平仓成功 @ {close_price:.4f}")
+                                    logger.info("       [EMERGENCY] ✅ 紧急平仓成功 @ %.4f", close_price)
                                 else:
-                                    print(f"       [EMERGENCY] ⚠️ 紧急平仓失败（API返回空）")
+                                    logger.info("       [EMERGENCY] ⚠️ 紧急平仓失败（API返回空）")
                             else:
-                                print(f"       [EMERGENCY] ⚠️ 无法获取市场数据，紧急平仓跳过")
+                                logger.info("       [EMERGENCY] ⚠️ 无法获取市场数据，紧急平仓跳过")
                         except Exception as e:
-                            print(f"       [EMERGENCY] ❌ 紧急平仓异常: {e}")
+                            logger.info("       [EMERGENCY] ❌ 紧急平仓异常: %s", e)
 
-                    print(f"       [POSITION] 价格获取失败，本轮跳过（等待0.1秒后重试）")
+                    logger.info("       [POSITION] 价格获取失败，本轮跳过（等待0.1秒后重试）")
                     continue
 
-                print(f"       [POSITION] {side} token价格: {pos_current_price:.4f}")
+                monitor_log.info("       [POSITION] %s token价格: %.4f", side, pos_current_price)
 
-                # 调试：打印止损检查的详细信息
-                if sl_order_id:
-                    try:
-                        sl_price = float(sl_order_id)
-                        print(f"       [DEBUG] 止损检查: 当前价={pos_current_price:.4f}, 止损线={sl_price:.4f}, 触发={pos_current_price <= sl_price}")
-                    except:
-                        pass
+                # 调试：打印止损检查的详细信息（止损线已在循环前解析）
+                if logger.isEnabledFor(logging.DEBUG) and sl_lines[idx] is not None:
+                    logger.debug("       [DEBUG] 止损检查: 当前价=%.4f, 止损线=%.4f, 触发=%s", pos_current_price, sl_lines[idx], pos_current_price <= sl_lines[idx])
 
                 # 检查止盈单（带重试）
                 if tp_order_id:
                     for _attempt in range(3):
                         try:
-                            tp_order = self.client.get_order(tp_order_id)
+                            tp_order = self._get_order_cached(tp_order_id)
                             if tp_order:
                                 # Polymarket 成交状态可能是 FILLED 或 MATCHED
                                 if tp_order.get('status') in ('FILLED', 'MATCHED'):
                                     # 🔧 F2修复：检查部分成交 matchedSize vs size
-                                    tp_matched = float(tp_order.get('matchedSize', 0) or 0)
+                                    tp_matched = _fnum(tp_order, 'matchedSize')
                                     tp_order_size = float(tp_order.get('size', size) or size)
                                     if tp_matched < tp_order_size * 0.95:
                                         # 部分成交：更新剩余 size，保持 open 继续监控
                                         remaining_size = size - tp_matched
-                                        print(f"       [TP PARTIAL] 部分成交: matched={tp_matched:.2f} / size={tp_order_size:.2f}，剩余={remaining_size:.2f}，继续监控")
+                                        logger.info("       [TP PARTIAL] 部分成交: matched=%.2f / size=%.2f，剩余=%.2f，继续监控", tp_matched, tp_order_size, remaining_size)
                                         try:
-                                            cursor.execute(
+                                            self._db_write(
                                                 "UPDATE positions SET size = ? WHERE id = ?",
                                                 (remaining_size, pos_id)
                                             )
-                                            conn.commit()
                                         except Exception as db_e:
-                                            print(f"       [TP PARTIAL] 更新剩余size失败: {db_e}")
+                                            logger.info("       [TP PARTIAL] 更新剩余size失败: %s", db_e)
                                         # 不设置 exit_reason，让监控继续处理剩余仓位
                                     else:
                                         # 完全成交（>=95%）
@@ -3516,19 +4395,14 @@ class AutoTraderV5:
                                             actual_exit_price = entry_token_price  # fallback入场价
                             break
                         except Exception as e:
-                            print(f"       [ORDER CHECK ERROR] TP order {tp_order_id}: {e}")
+                            logger.info("       [ORDER CHECK ERROR] TP order %s: %s", tp_order_id, e)
                             if _attempt < 2:
                                 time.sleep(2 ** _attempt)
 
                 # 余额检查：防止手动平仓后机器人继续尝试操作
+                # 刚成交后缓存余额可能过期，误判为已平仓，这里必须查最新值
                 try:
-                    from py_clob_client.clob_types import BalanceAllowanceParams, AssetType
-                    params = BalanceAllowanceParams(
-                        asset_type=AssetType.CONDITIONAL,
-                        token_id=token_id,
-                        signature_type=2
-                    )
-                    result = self.client.get_balance_allowance(params)
+                    result = self._token_balance(token_id, max_age=0)
                     if result:
                         amount = result.get('balance', '0')
                         if amount is not None:
@@ -3548,10 +4422,10 @@ class AutoTraderV5:
                                 # 先检查止盈单是否真的成交了
                                 if tp_order_id and not exit_reason:
                                     try:
-                                        tp_order_info = self.client.get_order(tp_order_id)
+                                        tp_order_info = self._get_order_cached(tp_order_id)
                                         if tp_order_info:
                                             tp_status = tp_order_info.get('status', '').upper()
-                                            matched_size = float(tp_order_info.get('matchedSize', 0) or 0)
+                                            matched_size = _fnum(tp_order_info, 'matchedSize')
                                             if tp_status in ('MATCHED', 'FILLED') or matched_size > 0:
                                                 # 止盈单真实成交
                                                 exit_reason = 'TAKE_PROFIT'
@@ -3561,81 +4435,65 @@ class AutoTraderV5:
                                                     actual_exit_price = parsed if 0.01 <= parsed <= 0.99 else pos_current_price
                                                 else:
                                                     actual_exit_price = pos_current_price
-                                                print(f"       [POSITION] ✅ 确认止盈单已成交 status={tp_status} @ {actual_exit_price:.4f}")
+                                                logger.info("       [POSITION] ✅ 确认止盈单已成交 status=%s @ %.4f", tp_status, actual_exit_price)
                                             else:
                                                 # 止盈单未成交，余额为0 = 市场到期归零
                                                 exit_reason = 'MARKET_SETTLED'
                                                 actual_exit_price = 0.0
-                                                print(f"       [POSITION] 💀 止盈单未成交(status={tp_status})，市场到期归零，记录真实亏损")
+                                                logger.info("       [POSITION] 💀 止盈单未成交(status=%s)，市场到期归零，记录真实亏损", tp_status)
                                     except Exception as e:
-                                        print(f"       [POSITION] 查询止盈单失败: {e}，保守处理为归零")
+                                        logger.info("       [POSITION] 查询止盈单失败: %s，保守处理为归零", e)
                                         exit_reason = 'MARKET_SETTLED'
                                         actual_exit_price = 0.0
                                 elif not exit_reason:
                                     # 没有止盈单，余额为0 = 手动平仓
-                                    print(f"       [POSITION] ⚠️  Token余额为{actual_size:.2f}份，检测到已手动平仓，停止监控")
+                                    logger.info("       [POSITION] ⚠️  Token余额为%.2f份，检测到已手动平仓，停止监控", actual_size)
                                     exit_reason = 'MANUAL_CLOSED'
                                     actual_exit_price = pos_current_price
                             else:
-                                print(f"       [POSITION] [DEBUG] 余额查询成功，balance={actual_size:.2f}份")
+                                logger.debug("       [POSITION] [DEBUG] 余额查询成功，balance=%.2f份", actual_size)
                 except Exception as e:
-                    print(f"       [POSITION] [DEBUG] 余额查询失败: {e}")
+                    logger.debug("       [POSITION] [DEBUG] 余额查询失败: %s", e)
                     pass
 
                 # 如果止盈单没成交，检查本地止盈止损价格（双向轮询模式）
                 if not exit_reason:
-                    # ✅ 关键修复：使用与开仓时相同的公式，确保一致性（对称30%逻辑）
-                    tp_pct_max = CONFIG['risk'].get('take_profit_pct', 0.30)  # 修复：止盈应使用take_profit_pct
-                    tp_by_pct = entry_token_price * (1 + tp_pct_max)
-                    tp_by_fixed = (value_usdc + 1.0) / max(size, 1)
-                    tp_target_price = min(tp_by_fixed, tp_by_pct)
-
-                    # 确保止盈价格在合理范围内 (Polymarket 最高价格为 1.0)
-                    tp_target_price = max(0.01, min(0.99, tp_target_price))
-
-                    # 获取止损价格（从字段读取）
-                    sl_price = None
-                    try:
-                        if sl_order_id:
-                            sl_price = float(sl_order_id)
-                    except (ValueError, TypeError):
-                        pass
+                    # ✅ 与开仓时相同的公式（对称30%逻辑），已在循环前算好
+                    tp_target_price = tp_targets[idx]
+                    # 止损价格（从sl_order_id字段读取，无效为None）
+                    sl_price = sl_lines[idx]
 
                     # 获取市场剩余时间（优先用传入的market，避免重复REST请求）
                     seconds_left = None
                     try:
-                        from datetime import timezone
-                        _market = market if market else self.get_market_data()
-                        if _market:
-                            end_date = _market.get('endDate')
-                            if end_date:
-                                end_dt = datetime.strptime(end_date, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-                                now_dt = datetime.now(timezone.utc)
-                                seconds_left = (end_dt - now_dt).total_seconds()
-                    except:
+                        end_ts = _market_end_ts()
+                        if end_ts:
+                            seconds_left = end_ts - time.time()
+                    except ValueError:
                         pass
 
-                    # 📊 显示双向监控状态
+                    # 📊 显示双向监控状态（日志级别关闭时不构造字符串）
                     tp_gap = tp_target_price - pos_current_price
-                    if sl_price:
+                    if not monitor_log.isEnabledFor(logging.INFO):
+                        pass
+                    elif sl_price:
                         sl_gap = pos_current_price - sl_price
                         time_info = f" | 剩余: {int(seconds_left)}s" if seconds_left else ""
-                        print(f"       [MONITOR] 当前价: {pos_current_price:.4f} | TP目标: {tp_target_price:.4f} (差{tp_gap:.4f}) | SL止损: {sl_price:.4f} (距{sl_gap:.4f}){time_info}")
+                        monitor_log.info("       [MONITOR] 当前价: %.4f | TP目标: %.4f (差%.4f) | SL止损: %.4f (距%.4f)%s", pos_current_price, tp_target_price, tp_gap, sl_price, sl_gap, time_info)
                     else:
-                        print(f"       [MONITOR] 当前价: {pos_current_price:.4f} | TP目标: {tp_target_price:.4f} (差{tp_gap:.4f})")
+                        monitor_log.info("       [MONITOR] 当前价: %.4f | TP目标: %.4f (差%.4f)", pos_current_price, tp_target_price, tp_gap)
 
                     # 双向监控：止盈和止损
                     # 1. 检查止盈（价格上涨触发）
                     if pos_current_price >= tp_target_price:
-                        print(f"       [LOCAL TP] 触发本地止盈！当前价 {pos_current_price:.4f} >= 目标 {tp_target_price:.4f}")
+                        logger.info("       [LOCAL TP] 触发本地止盈！当前价 %.4f >= 目标 %.4f", pos_current_price, tp_target_price)
 
                         # 🔥 状态锁：立即更新数据库状态为 'closing'，防止重复触发
                         try:
-                            cursor.execute("UPDATE positions SET status = 'closing' WHERE id = ?", (pos_id,))
-                            conn.commit()
-                            print(f"       [LOCAL TP] 🔒 状态已锁为 'closing'，防止重复触发")
+                            self._db_write("UPDATE positions SET status = 'closing' WHERE id = ?", (pos_id,))
+                            logger.info("       [LOCAL TP] 🔒 状态已锁为 'closing'，防止重复触发")
                         except Exception as lock_e:
-                            print(f"       [LOCAL TP] ⚠️ 状态锁失败: {lock_e}")
+                            logger.info("       [LOCAL TP] ⚠️ 状态锁失败: %s", lock_e)
 
                         # 🔥 关键修复：先查询止盈单状态，再决定是否撤销
                         # 避免撤销已成交的订单导致状态变成CANCELED，误判为"市场归零"
@@ -3644,10 +4502,10 @@ class AutoTraderV5:
 
                         if tp_order_id:
                             try:
-                                tp_order_info = self.client.get_order(tp_order_id)
+                                tp_order_info = self._get_order_cached(tp_order_id)
                                 if tp_order_info:
                                     tp_status = tp_order_info.get('status', '').upper()
-                                    matched_size = float(tp_order_info.get('matchedSize', 0) or 0)
+                                    matched_size = _fnum(tp_order_info, 'matchedSize')
                                     if tp_status in ('MATCHED', 'FILLED') or matched_size > 0:
                                         tp_already_filled = True
                                         avg_p = tp_order_info.get('avgPrice') or tp_order_info.get('price')
@@ -3655,28 +4513,28 @@ class AutoTraderV5:
                                             parsed = float(avg_p)
                                             if 0.01 <= parsed <= 0.99:
                                                 tp_filled_price = parsed
-                                        print(f"       [LOCAL TP] ✅ 检测到止盈单已成交 status={tp_status} @ {tp_filled_price or 'unknown'}")
+                                        logger.info("       [LOCAL TP] ✅ 检测到止盈单已成交 status=%s @ %s", tp_status, tp_filled_price or 'unknown')
                                     else:
-                                        print(f"       [LOCAL TP] 📋 止盈单未成交(status={tp_status})，准备撤销并市价平仓")
+                                        logger.info("       [LOCAL TP] 📋 止盈单未成交(status=%s)，准备撤销并市价平仓", tp_status)
                             except Exception as e:
-                                print(f"       [LOCAL TP] ⚠️ 查询止盈单状态失败: {e}，继续尝试撤销")
+                                logger.info("       [LOCAL TP] ⚠️ 查询止盈单状态失败: %s，继续尝试撤销", e)
 
                         # 如果止盈单已成交，直接记录盈利
                         if tp_already_filled:
                             exit_reason = 'AUTO_CLOSED_OR_MANUAL'
                             actual_exit_price = tp_filled_price if tp_filled_price else pos_current_price
-                            print(f"       [LOCAL TP] 🎉 止盈单已成交，无需市价平仓")
+                            logger.info("       [LOCAL TP] 🎉 止盈单已成交，无需市价平仓")
                         else:
                             # 止盈单未成交，撤销后市价平仓
                             if tp_order_id:
                                 try:
                                     self.cancel_order(tp_order_id)
-                                    print(f"       [LOCAL TP] 已撤销原止盈单 {tp_order_id[-8:]}")
+                                    logger.info("       [LOCAL TP] 已撤销原止盈单 %s", tp_order_id[-8:])
                                 except:
                                     pass
 
                             # 市价平仓
-                            close_market = self.get_market_data()
+                            close_market = _current_market()
                             if close_market:
                                 close_order_id = self.close_position(close_market, side, size)
 
@@ -3688,11 +4546,11 @@ class AutoTraderV5:
                                     tp_check_price = None
                                     if tp_order_id:
                                         try:
-                                            time.sleep(1)  # 等待1秒让链上状态同步
-                                            tp_order_info = self.client.get_order(tp_order_id)
+                                            # 最多等1秒让状态同步（推送到达即返回）
+                                            tp_order_info = self._await_order(tp_order_id, 1.0)
                                             if tp_order_info:
                                                 tp_status = tp_order_info.get('status', '').upper()
-                                                matched_size = float(tp_order_info.get('matchedSize', 0) or 0)
+                                                matched_size = _fnum(tp_order_info, 'matchedSize')
                                                 if tp_status in ('MATCHED', 'FILLED') or matched_size > 0:
                                                     tp_actually_filled = True
                                                     p = tp_order_info.get('avgPrice') or tp_order_info.get('price')
@@ -3700,21 +4558,21 @@ class AutoTraderV5:
                                                         parsed = float(p)
                                                         if 0.01 <= parsed <= 0.99:
                                                             tp_check_price = parsed
-                                                    print(f"       [LOCAL TP] ✅ 复查确认止盈单已成交 status={tp_status}")
+                                                    logger.info("       [LOCAL TP] ✅ 复查确认止盈单已成交 status=%s", tp_status)
                                                 else:
-                                                    print(f"       [LOCAL TP] ❌ 止盈单未成交(status={tp_status})，可能是市场到期归零")
+                                                    logger.info("       [LOCAL TP] ❌ 止盈单未成交(status=%s)，可能是市场到期归零", tp_status)
                                         except Exception as e:
-                                            print(f"       [LOCAL TP] ⚠️ 复查止盈单状态失败: {e}")
+                                            logger.info("       [LOCAL TP] ⚠️ 复查止盈单状态失败: %s", e)
 
                                     if tp_actually_filled:
                                         exit_reason = 'AUTO_CLOSED_OR_MANUAL'
                                         actual_exit_price = tp_check_price if tp_check_price else pos_current_price
-                                        print(f"       [LOCAL TP] 🎉 止盈单在撤销期间成交，使用成交价: {actual_exit_price:.4f}")
+                                        logger.info("       [LOCAL TP] 🎉 止盈单在撤销期间成交，使用成交价: %.4f", actual_exit_price)
                                     else:
                                         # 真正的市场归零
                                         exit_reason = 'MARKET_SETTLED'
                                         actual_exit_price = 0.0
-                                        print(f"       [LOCAL TP] 💀 确认市场归零，记录真实亏损")
+                                        logger.info("       [LOCAL TP] 💀 确认市场归零，记录真实亏损")
                             elif close_order_id:
                                 exit_reason = 'TAKE_PROFIT_LOCAL'
                                 triggered_order_id = close_order_id
@@ -3723,69 +4581,44 @@ class AutoTraderV5:
                                 # 🔥 关键修复：平仓单已上链，立即更新数据库防止"幽灵归零"
                                 # 即使后续查询成交价失败，至少status已不是'open'
                                 try:
-                                    cursor.execute("""
+                                    self._db_write(f"""
                                         UPDATE positions
-                                        SET exit_time = ?, exit_token_price = ?,
+                                        SET exit_time = {_SQL_NOW_LOCAL}, exit_token_price = ?,
                                             exit_reason = ?, status = 'closing'
                                         WHERE id = ?
                                     """, (
-                                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                                         actual_exit_price,
                                         exit_reason,
                                         pos_id
                                     ))
-                                    conn.commit()
-                                    print(f"       [LOCAL TP] 🔐 平仓订单已上链，数据库状态已更新为'closing'")
+                                    logger.info("       [LOCAL TP] 🔐 平仓订单已上链，数据库状态已更新为'closing'")
                                 except Exception as update_err:
-                                    print(f"       [LOCAL TP] ⚠️ 初步数据库更新失败: {update_err}")
+                                    logger.info("       [LOCAL TP] ⚠️ 初步数据库更新失败: %s", update_err)
 
-                                # 🔍 修复：重试查询实际成交价（保守优化：3次×0.5秒=1.5秒）
-                                # 确保订单有时间成交，同时减少监控阻塞
-                                for _tp_attempt in range(3):
-                                    try:
-                                        time.sleep(0.5)  # 🔥 优化：从1秒缩短到0.5秒
-                                        close_order = self.client.get_order(close_order_id)
-                                        if close_order:
-                                            tp_status = close_order.get('status', '').upper()
-                                            matched_size = float(close_order.get('matchedSize', 0) or 0)
-                                            if tp_status in ('FILLED', 'MATCHED') or matched_size > 0:
-                                                avg_p = close_order.get('avgPrice') or close_order.get('price')
-                                                if avg_p:
-                                                    parsed = float(avg_p)
-                                                    if 0.01 <= parsed <= 0.99:
-                                                        actual_exit_price = parsed
-                                                print(f"       [LOCAL TP] ✅ 止盈实际成交价: {actual_exit_price:.4f} (尝试{_tp_attempt+1}次)")
-                                                break
-                                            else:
-                                                print(f"       [LOCAL TP] ⏳ 止盈单未成交(status={tp_status})，继续等待({_tp_attempt+1}/3)...")
-                                    except Exception as e:
-                                        print(f"       [LOCAL TP] 查询成交价失败({_tp_attempt+1}/3): {e}")
-                                else:
-                                    print(f"       [LOCAL TP] ⚠️ 止盈单1.5秒内未确认成交，使用发单时价格: {actual_exit_price:.4f}")
-                                print(f"       [LOCAL TP] 本地止盈执行完毕，成交价: {actual_exit_price:.4f}")
+                                # 🔍 查询实际成交价，避免滑点被掩盖（最多等1.5秒，推送到达即返回）
+                                actual_exit_price = self._close_fill_price(close_order_id, actual_exit_price, 'LOCAL TP')
+                                logger.info("       [LOCAL TP] 本地止盈执行完毕，成交价: %.4f", actual_exit_price)
                             else:
                                 # 🔥 修复：止盈平仓失败后，将status改回'open'，让下次继续处理
-                                print(f"       [LOCAL TP] ⚠️ 市价平仓失败，将在下次迭代时重试")
+                                logger.info("       [LOCAL TP] ⚠️ 市价平仓失败，将在下次迭代时重试")
                                 try:
-                                    cursor.execute("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,))
-                                    conn.commit()
-                                    print(f"       [LOCAL TP] 🔓 状态已重置为 'open'，下次迭代将重试止盈")
+                                    self._db_write("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,))
+                                    logger.info("       [LOCAL TP] 🔓 状态已重置为 'open'，下次迭代将重试止盈")
                                 except Exception as reset_err:
-                                    print(f"       [LOCAL TP] ❌ 状态重置失败: {reset_err}")
+                                    logger.info("       [LOCAL TP] ❌ 状态重置失败: %s", reset_err)
 
                     # 2. 检查止损（价格下跌触发）- 🔥 立即执行，不再等待最后5分钟
                     elif sl_price and pos_current_price < sl_price:
-                        print(f"       [LOCAL SL] 触发本地止损！当前价 {pos_current_price:.4f} < 止损线 {sl_price:.4f}")
+                        logger.info("       [LOCAL SL] 触发本地止损！当前价 %.4f < 止损线 %.4f", pos_current_price, sl_price)
                         time_remaining = f"{int(seconds_left)}s" if seconds_left else "未知"
-                        print(f"       [LOCAL SL] ⏰ 市场剩余 {time_remaining}，立即执行止损保护")
+                        logger.info("       [LOCAL SL] ⏰ 市场剩余 %s，立即执行止损保护", time_remaining)
 
                         # 🔥 状态锁：立即更新数据库状态为 'closing'，防止重复触发
                         try:
-                            cursor.execute("UPDATE positions SET status = 'closing' WHERE id = ?", (pos_id,))
-                            conn.commit()
-                            print(f"       [LOCAL SL] 🔒 状态已锁为 'closing'，防止重复触发")
+                            self._db_write("UPDATE positions SET status = 'closing' WHERE id = ?", (pos_id,))
+                            logger.info("       [LOCAL SL] 🔒 状态已锁为 'closing'，防止重复触发")
                         except Exception as lock_e:
-                            print(f"       [LOCAL SL] ⚠️ 状态锁失败: {lock_e}")
+                            logger.info("       [LOCAL SL] ⚠️ 状态锁失败: %s", lock_e)
 
                         # 🔥 关键修复：先查询止盈单状态，避免撤销已成交订单导致误判
                         tp_already_filled = False
@@ -3793,10 +4626,10 @@ class AutoTraderV5:
 
                         if tp_order_id:
                             try:
-                                tp_order_info = self.client.get_order(tp_order_id)
+                                tp_order_info = self._get_order_cached(tp_order_id)
                                 if tp_order_info:
                                     tp_status = tp_order_info.get('status', '').upper()
-                                    matched_size = float(tp_order_info.get('matchedSize', 0) or 0)
+                                    matched_size = _fnum(tp_order_info, 'matchedSize')
                                     if tp_status in ('MATCHED', 'FILLED') or matched_size > 0:
                                         tp_already_filled = True
                                         avg_p = tp_order_info.get('avgPrice') or tp_order_info.get('price')
@@ -3804,26 +4637,26 @@ class AutoTraderV5:
                                             parsed = float(avg_p)
                                             if 0.01 <= parsed <= 0.99:
                                                 tp_filled_price = parsed
-                                        print(f"       [LOCAL SL] ✅ 检测到止盈单已成交 status={tp_status} @ {tp_filled_price or 'unknown'}")
+                                        logger.info("       [LOCAL SL] ✅ 检测到止盈单已成交 status=%s @ %s", tp_status, tp_filled_price or 'unknown')
                                     else:
-                                        print(f"       [LOCAL SL] 📋 止盈单未成交，准备撤销")
+                                        logger.info("       [LOCAL SL] 📋 止盈单未成交，准备撤销")
                             except Exception as e:
-                                print(f"       [LOCAL SL] ⚠️ 查询止盈单状态失败: {e}")
+                                logger.info("       [LOCAL SL] ⚠️ 查询止盈单状态失败: %s", e)
 
                         # 如果止盈单已成交，直接记录盈利（止损前已止盈）
                         if tp_already_filled:
                             exit_reason = 'AUTO_CLOSED_OR_MANUAL'
                             actual_exit_price = tp_filled_price if tp_filled_price else pos_current_price
-                            print(f"       [LOCAL SL] 🎉 止盈单已成交，无需止损平仓")
+                            logger.info("       [LOCAL SL] 🎉 止盈单已成交，无需止损平仓")
                         else:
                             # 止盈单未成交，撤销并执行止损
                             if tp_order_id:
-                                print(f"       [LOCAL SL] 撤销止盈单 {tp_order_id[-8:]}...")
+                                logger.info("       [LOCAL SL] 撤销止盈单 %s...", tp_order_id[-8:])
                                 self.cancel_order(tp_order_id)
                                 time.sleep(1)  # 🔥 优化：从3秒缩短到1秒，减少监控阻塞
 
                             # 市价平仓（止损模式，直接砸单不防插针）
-                            close_market = market if market else self.get_market_data()
+                            close_market = _current_market()
                             if close_market:
                                 close_order_id = self.close_position(close_market, side, size, is_stop_loss=True, entry_price=entry_token_price, sl_price=sl_price)
 
@@ -3835,11 +4668,11 @@ class AutoTraderV5:
                                     tp_check_price = None
                                     if tp_order_id:
                                         try:
-                                            time.sleep(1)  # 等待1秒让链上状态同步
-                                            tp_order_info = self.client.get_order(tp_order_id)
+                                            # 最多等1秒让状态同步（推送到达即返回）
+                                            tp_order_info = self._await_order(tp_order_id, 1.0)
                                             if tp_order_info:
                                                 tp_status = tp_order_info.get('status', '').upper()
-                                                matched_size = float(tp_order_info.get('matchedSize', 0) or 0)
+                                                matched_size = _fnum(tp_order_info, 'matchedSize')
                                                 if tp_status in ('MATCHED', 'FILLED') or matched_size > 0:
                                                     tp_actually_filled = True
                                                     avg_p = tp_order_info.get('avgPrice') or tp_order_info.get('price')
@@ -3847,21 +4680,21 @@ class AutoTraderV5:
                                                         parsed = float(avg_p)
                                                         if 0.01 <= parsed <= 0.99:
                                                             tp_check_price = parsed
-                                                    print(f"       [LOCAL SL] ✅ 复查确认止盈单已成交 status={tp_status}")
+                                                    logger.info("       [LOCAL SL] ✅ 复查确认止盈单已成交 status=%s", tp_status)
                                                 else:
-                                                    print(f"       [LOCAL SL] ❌ 止盈单未成交(status={tp_status})，可能是市场到期归零")
+                                                    logger.info("       [LOCAL SL] ❌ 止盈单未成交(status=%s)，可能是市场到期归零", tp_status)
                                         except Exception as e:
-                                            print(f"       [LOCAL SL] ⚠️ 复查止盈单状态失败: {e}")
+                                            logger.info("       [LOCAL SL] ⚠️ 复查止盈单状态失败: %s", e)
 
                                     if tp_actually_filled:
                                         exit_reason = 'AUTO_CLOSED_OR_MANUAL'
                                         actual_exit_price = tp_check_price if tp_check_price else pos_current_price
-                                        print(f"       [LOCAL SL] 🎉 止盈单在撤销期间成交，止损前已盈利")
+                                        logger.info("       [LOCAL SL] 🎉 止盈单在撤销期间成交，止损前已盈利")
                                     else:
                                         # 真正的市场归零
                                         exit_reason = 'MARKET_SETTLED'
                                         actual_exit_price = 0.0
-                                        print(f"       [LOCAL SL] 💀 确认市场归零，记录真实亏损")
+                                        logger.info("       [LOCAL SL] 💀 确认市场归零，记录真实亏损")
                             elif close_order_id:
                                 exit_reason = 'STOP_LOSS_LOCAL'
                                 triggered_order_id = close_order_id
@@ -3870,163 +4703,126 @@ class AutoTraderV5:
                                 # 🔥 关键修复：平仓单已上链，立即更新数据库防止"幽灵归零"
                                 # 即使后续查询成交价失败，至少status已不是'open'
                                 try:
-                                    cursor.execute("""
+                                    self._db_write(f"""
                                         UPDATE positions
-                                        SET exit_time = ?, exit_token_price = ?,
+                                        SET exit_time = {_SQL_NOW_LOCAL}, exit_token_price = ?,
                                             exit_reason = ?, status = 'closing'
                                         WHERE id = ?
                                     """, (
-                                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                                         actual_exit_price,
                                         exit_reason,
                                         pos_id
                                     ))
-                                    conn.commit()
-                                    print(f"       [LOCAL SL] 🔐 平仓订单已上链，数据库状态已更新为'closing'")
+                                    logger.info("       [LOCAL SL] 🔐 平仓订单已上链，数据库状态已更新为'closing'")
                                 except Exception as update_err:
-                                    print(f"       [LOCAL SL] ⚠️ 初步数据库更新失败: {update_err}")
+                                    logger.info("       [LOCAL SL] ⚠️ 初步数据库更新失败: %s", update_err)
 
-                                # 🔍 修复：重试查询实际成交价，避免滑点被掩盖
-                                # 极端行情下快速重试，保守优化：3次×0.5秒=1.5秒
-                                for _sl_attempt in range(3):
-                                    try:
-                                        time.sleep(0.5)  # 🔥 优化：从1秒缩短到0.5秒
-                                        close_order = self.client.get_order(close_order_id)
-                                        if close_order:
-                                            sl_status = close_order.get('status', '').upper()
-                                            matched_size = float(close_order.get('matchedSize', 0) or 0)
-                                            if sl_status in ('FILLED', 'MATCHED') or matched_size > 0:
-                                                avg_p = close_order.get('avgPrice') or close_order.get('price')
-                                                if avg_p:
-                                                    parsed = float(avg_p)
-                                                    if 0.01 <= parsed <= 0.99:
-                                                        actual_exit_price = parsed
-                                                print(f"       [LOCAL SL] ✅ 止损实际成交价: {actual_exit_price:.4f} (尝试{_sl_attempt+1}次)")
-                                                break
-                                            else:
-                                                print(f"       [LOCAL SL] ⏳ 止损单未成交(status={sl_status})，继续等待({_sl_attempt+1}/3)...")
-                                    except Exception as e:
-                                        print(f"       [LOCAL SL] 查询成交价失败({_sl_attempt+1}/3): {e}")
-                                else:
-                                    print(f"       [LOCAL SL] ⚠️ 止损单1.5秒内未确认成交，使用发单时价格: {actual_exit_price:.4f}")
-                                print(f"       [LOCAL SL] 止损执行完毕，成交价: {actual_exit_price:.4f}")
+                                # 🔍 查询实际成交价，避免滑点被掩盖（最多等1.5秒，推送到达即返回）
+                                actual_exit_price = self._close_fill_price(close_order_id, actual_exit_price, 'LOCAL SL')
+                                logger.info("       [LOCAL SL] 止损执行完毕，成交价: %.4f", actual_exit_price)
                             else:
                                 # 🔥 修复：止损平仓失败后，将status改回'open'，让下次继续处理
-                                print(f"       [LOCAL SL] ⚠️ 市价平仓失败，将在下次迭代时重试")
+                                logger.info("       [LOCAL SL] ⚠️ 市价平仓失败，将在下次迭代时重试")
                                 try:
-                                    cursor.execute("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,))
-                                    conn.commit()
-                                    print(f"       [LOCAL SL] 🔓 状态已重置为 'open'，下次迭代将重试止损")
+                                    self._db_write("UPDATE positions SET status = 'open' WHERE id = ?", (pos_id,))
+                                    logger.info("       [LOCAL SL] 🔓 状态已重置为 'open'，下次迭代将重试止损")
                                 except Exception as reset_err:
-                                    print(f"       [LOCAL SL] ❌ 状态重置失败: {reset_err}")
+                                    logger.info("       [LOCAL SL] ❌ 状态重置失败: %s", reset_err)
 
                 # 如果订单成交但没有获取到价格，使用当前价格作为fallback
                 if exit_reason and actual_exit_price is None:
                     actual_exit_price = pos_current_price
-                    print(f"       [POSITION WARNING] 订单成交但无法获取价格，使用当前价格: {actual_exit_price:.4f}")
+                    logger.info("       [POSITION WARNING] 订单成交但无法获取价格，使用当前价格: %.4f", actual_exit_price)
 
                 # 止盈止损完全依赖挂单成交，不做主动价格监控平仓
 
                 # 检查市场是否即将到期（最后2分钟的智能平仓策略）
                 if not exit_reason:
                     try:
-                        from datetime import timezone
-                        expiry_market = market if market else self.get_market_data()
-                        if expiry_market:
-                            end_date = expiry_market.get('endDate')
-                            if end_date:
-                                end_dt = datetime.strptime(end_date, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-                                now_dt = datetime.now(timezone.utc)
-                                seconds_left = (end_dt - now_dt).total_seconds()
-
-                                # 🛡️ 市场已过期：直接标记为已结算，停止监控
-                                if seconds_left < 0:
-                                    print(f"       [EXPIRY] ⏰ 市场已过期({abs(seconds_left):.0f}秒)，标记为已结算")
-                                    current_value = size * pos_current_price
-                                    current_pnl = current_value - value_usdc
-                                    print(f"       [EXPIRY] 最终盈亏: ${current_pnl:.2f}")
-                                    exit_reason = 'MARKET_SETTLED'
-                                    actual_exit_price = pos_current_price
+                        end_ts = _market_end_ts()
+                        if end_ts:
+                            seconds_left = end_ts - time.time()
 
-                                # 计算当前盈亏（用于判断触发策略）
-                                # 用价格差计算，避免value_usdc浮点误差导致亏损被判为盈利
+                            # 🛡️ 市场已过期：直接标记为已结算，停止监控
+                            if seconds_left < 0:
+                                logger.info("       [EXPIRY] ⏰ 市场已过期(%.0f秒)，标记为已结算", abs(seconds_left))
                                 current_value = size * pos_current_price
-                                current_pnl = size * (pos_current_price - entry_token_price)
+                                current_pnl = current_value - value_usdc
+                                logger.info("       [EXPIRY] 最终盈亏: $%.2f", current_pnl)
+                                exit_reason = 'MARKET_SETTLED'
+                                actual_exit_price = pos_current_price
+
+                            # 计算当前盈亏（用于判断触发策略）
+                            # 用价格差计算，避免value_usdc浮点误差导致亏损被判为盈利
+                            current_value = size * pos_current_price
+                            current_pnl = size * (pos_current_price - entry_token_price)
+
+                            # 💎 盈利情况：最后60秒强制平仓锁定利润
+                            if current_pnl >= 0 and seconds_left <= _TP_LOCK_WINDOW:
+                                logger.info("       [EXPIRY] 💎 市场即将到期(%.0f秒)，当前盈利 $%.2f", seconds_left, current_pnl)
+                                logger.info("       [EXPIRY] 🔄 撤销止盈单，市价平仓锁定利润！")
+
+                                # 撤销止盈单
+                                if tp_order_id and not self._order_done(tp_order_id):
+                                    if self.cancel_order(tp_order_id):
+                                        logger.info("       [EXPIRY] ✅ 已撤销止盈单")
+
+                                # 市价平仓锁定利润
+                                try:
+                                    close_price = min(_MAX_PRICE, max(_MIN_PRICE, pos_current_price * 0.97))
 
-                                # 💎 盈利情况：最后60秒强制平仓锁定利润
-                                if current_pnl >= 0 and seconds_left <= 60:
-                                    print(f"       [EXPIRY] 💎 市场即将到期({seconds_left:.0f}秒)，当前盈利 ${current_pnl:.2f}")
-                                    print(f"       [EXPIRY] 🔄 撤销止盈单，市价平仓锁定利润！")
+                                    close_order_args = OrderArgs(
+                                        token_id=token_id,
+                                        price=close_price,
+                                        size=float(size),
+                                        side=SELL
+                                    )
 
-                                    # 撤销止盈单
-                                    if tp_order_id:
-                                        try:
-                                            self.cancel_order(tp_order_id)
-                                            print(f"       [EXPIRY] ✅ 已撤销止盈单")
-                                        except:
-                                            pass
+                                    close_response = self.client.create_and_post_order(close_order_args)
 
-                                    # 市价平仓锁定利润
-                                    try:
-                                        from py_clob_client.clob_types import OrderArgs
-                                        close_price = max(0.01, min(0.99, pos_current_price * 0.97))
-
-                                        close_order_args = OrderArgs(
-                                            token_id=token_id,
-                                            price=close_price,
-                                            size=float(size),
-                                            side=SELL
-                                        )
-
-                                        close_response = self.client.create_and_post_order(close_order_args)
-
-                                        if close_response and 'orderID' in close_response:
-                                            close_order_id = close_response['orderID']
-                                            exit_reason = 'EXPIRY_FORCE_CLOSE'
-                                            triggered_order_id = close_order_id
-                                            actual_exit_price = pos_current_price
-                                            print(f"       [EXPIRY] ✅ 强制平仓单已挂: {close_order_id[-8:]} @ {close_price:.4f}")
-                                    except Exception as e:
-                                        print(f"       [EXPIRY] ❌ 强制平仓失败: {e}")
-                                        # 平仓失败则持有到结算
-                                        exit_reason = 'HOLD_TO_SETTLEMENT'
+                                    if close_response and 'orderID' in close_response:
+                                        close_order_id = close_response['orderID']
+                                        exit_reason = 'EXPIRY_FORCE_CLOSE'
+                                        triggered_order_id = close_order_id
                                         actual_exit_price = pos_current_price
+                                        logger.info("       [EXPIRY] ✅ 强制平仓单已挂: %s @ %.4f", close_order_id[-8:], close_price)
+                                except Exception as e:
+                                    logger.info("       [EXPIRY] ❌ 强制平仓失败: %s", e)
+                                    # 平仓失败则持有到结算
+                                    exit_reason = 'HOLD_TO_SETTLEMENT'
+                                    actual_exit_price = pos_current_price
 
-                                # 🩸 亏损情况：最后120秒强制止损
-                                elif current_pnl < 0 and seconds_left <= 120:
-                                    print(f"       [EXPIRY] ⏳ 市场即将到期({seconds_left:.0f}秒)，当前亏损 ${current_pnl:.2f}")
-                                    print(f"       [EXPIRY] 🩸 执行强制市价平仓止损！")
+                            # 🩸 亏损情况：最后120秒强制止损
+                            elif current_pnl < 0 and seconds_left <= _FORCE_CLOSE_WINDOW:
+                                logger.info("       [EXPIRY] ⏳ 市场即将到期(%.0f秒)，当前亏损 $%.2f", seconds_left, current_pnl)
+                                logger.info("       [EXPIRY] 🩸 执行强制市价平仓止损！")
 
-                                    # 撤销止盈单
-                                    if tp_order_id:
-                                        try:
-                                            self.cancel_order(tp_order_id)
-                                            print(f"       [EXPIRY] 已撤销止盈单")
-                                        except:
-                                            pass
+                                # 撤销止盈单
+                                if tp_order_id and not self._order_done(tp_order_id):
+                                    if self.cancel_order(tp_order_id):
+                                        logger.info("       [EXPIRY] 已撤销止盈单")
 
-                                    # 市价平仓
-                                    try:
-                                        from py_clob_client.clob_types import OrderArgs
-                                        close_price = max(0.01, min(0.99, pos_current_price * 0.97))
-
-                                        close_order_args = OrderArgs(
-                                            token_id=token_id,
-                                            price=close_price,
-                                            size=float(size),
-                                            side=SELL
-                                        )
-
-                                        close_response = self.client.create_and_post_order(close_order_args)
-
-                                        if close_response and 'orderID' in close_response:
-                                            close_order_id = close_response['orderID']
-                                            exit_reason = 'EXPIRY_FORCE_CLOSE'
-                                            triggered_order_id = close_order_id
-                                            actual_exit_price = pos_current_price
-                                            print(f"       [EXPIRY] ✅ 强制平仓单已挂: {close_order_id[-8:]} @ {close_price:.4f}")
-                                    except Exception as e:
-                                        print(f"       [EXPIRY] ❌ 强制平仓失败: {e}")
+                                # 市价平仓
+                                try:
+                                    close_price = min(_MAX_PRICE, max(_MIN_PRICE, pos_current_price * 0.97))
+
+                                    close_order_args = OrderArgs(
+                                        token_id=token_id,
+                                        price=close_price,
+                                        size=float(size),
+                                        side=SELL
+                                    )
+
+                                    close_response = self.client.create_and_post_order(close_order_args)
+
+                                    if close_response and 'orderID' in close_response:
+                                        close_order_id = close_response['orderID']
+                                        exit_reason = 'EXPIRY_FORCE_CLOSE'
+                                        triggered_order_id = close_order_id
+                                        actual_exit_price = pos_current_price
+                                        logger.info("       [EXPIRY] ✅ 强制平仓单已挂: %s @ %.4f", close_order_id[-8:], close_price)
+                                except Exception as e:
+                                    logger.info("       [EXPIRY] ❌ 强制平仓失败: %s", e)
                     except Exception as e:
                         pass  # 静默失败，不影响其他逻辑
 
@@ -4044,13 +4840,12 @@ class AutoTraderV5:
 
                     # 更新持仓状态为最终closed状态（覆盖之前的'closing'保险状态）
                     # 🔥 包含pnl_usd和pnl_pct的完整记录，确保不出现"幽灵归零"
-                    cursor.execute("""
+                    rowcount = self._db_write(f"""
                         UPDATE positions
-                        SET exit_time = ?, exit_token_price = ?, pnl_usd = ?,
+                        SET exit_time = {_SQL_NOW_LOCAL}, exit_token_price = ?, pnl_usd = ?,
                             pnl_pct = ?, exit_reason = ?, status = 'closed'
                         WHERE id = ? AND status IN ('open', 'closing')
                     """, (
-                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                         actual_exit_price,  # 使用实际成交价格
                         pnl_usd,
                         pnl_pct,
@@ -4059,92 +4854,69 @@ class AutoTraderV5:
                     ))
 
                     # 验证UPDATE是否成功
-                    if cursor.rowcount == 0:
-                        print(f"       [POSITION WARNING] 数据库UPDATE影响0行，可能已被其他进程处理")
+                    if rowcount == 0:
+                        logger.info("       [POSITION WARNING] 数据库UPDATE影响0行，可能已被其他进程处理")
                     else:
-                        print(f"       [POSITION DB] ✅ 已更新数据库: status='closed', pnl=${pnl_usd:+.2f}")
+                        logger.info("       [POSITION DB] ✅ 已更新数据库: status='closed', pnl=$%+.2f", pnl_usd)
 
                     result_text = "盈利" if pnl_usd > 0 else "亏损"
-                    print(f"       [POSITION] {exit_reason}: {side} {result_text} ${pnl_usd:+.2f} ({pnl_pct:+.1f}%) - 订单 {triggered_order_id}")
-                    print(f"       [POSITION] 实际成交价: {actual_exit_price:.4f}")
+                    logger.info("       [POSITION] %s: %s %s $%+.2f (%+.1f%%) - 订单 %s", exit_reason, side, result_text, pnl_usd, pnl_pct, triggered_order_id)
+                    logger.info("       [POSITION] 实际成交价: %.4f", actual_exit_price)
 
                     # 更新 daily_loss 统计
                     if pnl_usd < 0:
                         self.stats['daily_loss'] += abs(pnl_usd)
-                        print(f"       [STATS] 累计每日亏损: ${self.stats['daily_loss']:.2f} / ${self.position_mgr.get_max_daily_loss():.2f}")
+                        logger.info("       [STATS] 累计每日亏损: $%.2f / $%.2f", self.stats['daily_loss'], self.position_mgr.get_max_daily_loss())
 
                     # 回填学习系统退出结果
                     if self.learning_system:
-                        try:
-                            self.learning_system.update_exit_result(
-                                market_slug=self._get_last_market_slug(pos_id),
-                                exit_token_price=actual_exit_price,  # 使用实际成交价格
-                                actual_pnl_pct=pnl_pct / 100,
-                                exit_reason=exit_reason,
-                            )
-                        except Exception as le:
-                            print(f"       [LEARNING EXIT ERROR] {le}")
-
-            self.safe_commit(conn)
-            conn.close()
+                        # 使用实际成交价格
+                        self._queue_exit_result(pos_id, actual_exit_price, pnl_pct / 100, exit_reason)
 
         except Exception as e:
-            print(f"       [POSITION CHECK ERROR] {e}")
-            try:
-                conn.close()
-            except:
-                pass
+            logger.info("       [POSITION CHECK ERROR] %s", e)
 
     def get_open_positions_count(self) -> int:
-        """获取当前open持仓数量"""
+        """获取当前open持仓数量（数据库版本戳未变时直接返回上次计数，不再COUNT(*)）"""
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM positions WHERE status = 'open'")
-            count = cursor.fetchone()[0]
-            conn.close()
-            return count
-        except:
+            with self._db_lock:
+                version = self._db_version()
+                cached_version, count = self._open_count_cache
+                if version != cached_version:
+                    count = self._conn().execute("SELECT COUNT(*) FROM positions WHERE status = 'open'").fetchone()[0]
+                    self._open_count_cache = (version, count)
+                return count
+        except sqlite3.Error:
             return 0
 
     def close_positions_by_signal_change(self, current_token_price: float, new_signal_direction: str):
         """信号改变时平掉所有相反方向的持仓，先取消止盈止损单，再市价平仓"""
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
-            # 🔥 激活WAL模式：多线程并发读写（防止database is locked）
-            conn.execute('PRAGMA journal_mode=WAL;')
-            cursor = conn.cursor()
-
             # 确定需要平仓的方向（与当前信号相反）
             opposite_direction = 'SHORT' if new_signal_direction == 'LONG' else 'LONG'
 
             # 获取所有open和closing状态的相反方向持仓（包括订单ID）
             # 🔥 修复：也包括'closing'状态的持仓（卡住的持仓也需要处理）
-            cursor.execute("""
-                SELECT id, entry_time, side, entry_token_price, value_usdc, size,
-                       take_profit_order_id, stop_loss_order_id
-                FROM positions
-                WHERE status IN ('open', 'closing') AND side = ?
-            """, (opposite_direction,))
-
-            positions = cursor.fetchall()
+            # 🚀 复用open/closing持仓缓存（平仓结果最后用executemany一次性写回）
+            positions = [
+                (pos_id, entry_time, side, entry_price, value_usdc, size, tp_id, sl_id)
+                for pos_id, entry_time, side, entry_price, size, value_usdc, tp_id, sl_id, _token_id
+                in self._open_position_rows() if side == opposite_direction
+            ]
 
             if not positions:
-                conn.close()
                 return
 
             closed_count = 0
+            pending = []  # (pos, 成交确认future)
+            closed_rows = []  # 待批量写回的UPDATE参数
+            now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # 本轮平仓共用一个退出时间（秒级精度）
+            # 🚀 先一次性批量取消所有持仓的止盈单（止损字段存的是价格，不是订单ID，无需撤销）
+            self.cancel_orders(pos[6] for pos in positions)
+
             for pos in positions:
                 pos_id, entry_time, side, entry_token_price, value_usdc, size, tp_order_id, sl_order_id = pos
 
-                # 先取消止盈止损单
-                if tp_order_id:
-                    self.cancel_order(tp_order_id)
-                if sl_order_id:
-                    self.cancel_order(sl_order_id)
-
                 # 实际调用API卖出平仓（带重试，最多3次）
                 close_order_id = None
                 for retry in range(3):
@@ -4153,35 +4925,40 @@ class AutoTraderV5:
                         close_order_id = self.close_position(close_market, side, size)
                         if close_order_id:
                             break
-                        print(f"       [SIGNAL CHANGE] 平仓重试 {retry+1}/3 失败")
+                        logger.info("       [SIGNAL CHANGE] 平仓重试 %s/3 失败", retry+1)
                         time.sleep(2)
                     else:
-                        print(f"       [SIGNAL CHANGE] 无法获取市场数据，重试 {retry+1}/3")
+                        logger.info("       [SIGNAL CHANGE] 无法获取市场数据，重试 %s/3", retry+1)
                         time.sleep(2)
 
                 if not close_order_id:
-                    print(f"       [SIGNAL CHANGE] 平仓3次均失败，跳过此持仓，请手动处理！")
+                    logger.info("       [SIGNAL CHANGE] 平仓3次均失败，跳过此持仓，请手动处理！")
                     continue
 
+                # 🚀 成交确认交给线程池并行等待（推送到达即返回，不再每个持仓串行sleep 2秒）
+                pending.append((pos, self._rpc_pool.submit(self._await_order, close_order_id, 2.0)))
+
+            for pos, fut in pending:
+                pos_id, entry_time, side, entry_token_price, value_usdc, size, tp_order_id, sl_order_id = pos
+
                 # 查询实际成交价格
                 actual_exit_price = current_token_price  # fallback
                 try:
-                    time.sleep(2)  # 等待订单成交
-                    close_order = self.client.get_order(close_order_id)
+                    close_order = fut.result()
                     if close_order:
                         fetched_price = close_order.get('price')
                         if fetched_price is None and close_order.get('matchedSize'):
-                            match_amount = float(close_order.get('matchAmount', 0) or 0)
-                            matched_size = float(close_order.get('matchedSize', 0) or 0)
+                            match_amount = _fnum(close_order, 'matchAmount')
+                            matched_size = _fnum(close_order, 'matchedSize')
                             if matched_size > 0:
                                 fetched_price = match_amount / matched_size
                         if fetched_price is not None:
                             actual_exit_price = float(fetched_price)
-                            print(f"       [SIGNAL CHANGE] 实际成交价: {actual_exit_price:.4f}")
+                            logger.info("       [SIGNAL CHANGE] 实际成交价: %.4f", actual_exit_price)
                         else:
-                            print(f"       [SIGNAL CHANGE] 无法获取成交价，使用市场价: {actual_exit_price:.4f}")
+                            logger.info("       [SIGNAL CHANGE] 无法获取成交价，使用市场价: %.4f", actual_exit_price)
                 except Exception as e:
-                    print(f"       [SIGNAL CHANGE] 查询成交价失败: {e}，使用市场价: {actual_exit_price:.4f}")
+                    logger.info("       [SIGNAL CHANGE] 查询成交价失败: %s，使用市场价: %.4f", e, actual_exit_price)
 
                 # 用实际成交价计算盈亏
                 # 统一算法：PnL = size * (exit_price - entry_price)
@@ -4189,13 +4966,8 @@ class AutoTraderV5:
                 pnl_pct = (pnl_usd / value_usdc) * 100 if value_usdc > 0 else 0
 
                 # 更新持仓状态（信号改变平仓）
-                cursor.execute("""
-                    UPDATE positions
-                    SET exit_time = ?, exit_token_price = ?, pnl_usd = ?,
-                        pnl_pct = ?, exit_reason = ?, status = 'closed'
-                    WHERE id = ?
-                """, (
-                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                closed_rows.append((
+                    now_str,
                     actual_exit_price,
                     pnl_usd,
                     pnl_pct,
@@ -4204,35 +4976,34 @@ class AutoTraderV5:
                 ))
 
                 result_text = "盈利" if pnl_usd > 0 else "亏损"
-                print(f"       [SIGNAL CHANGE] 平仓 {side}: {result_text} ${pnl_usd:+.2f} ({pnl_pct:+.1f}%)")
+                logger.info("       [SIGNAL CHANGE] 平仓 %s: %s $%+.2f (%+.1f%%)", side, result_text, pnl_usd, pnl_pct)
 
                 # 更新 daily_loss 统计
                 if pnl_usd < 0:
                     self.stats['daily_loss'] += abs(pnl_usd)
-                    print(f"       [STATS] 累计每日亏损: ${self.stats['daily_loss']:.2f} / ${self.position_mgr.get_max_daily_loss():.2f}")
+                    logger.info("       [STATS] 累计每日亏损: $%.2f / $%.2f", self.stats['daily_loss'], self.position_mgr.get_max_daily_loss())
 
                 # 回填学习系统退出结果
                 if self.learning_system:
-                    try:
-                        self.learning_system.update_exit_result(
-                            market_slug=self._get_last_market_slug(pos_id),
-                            exit_token_price=current_token_price,
-                            actual_pnl_pct=pnl_pct / 100,
-                            exit_reason='SIGNAL_CHANGE',
-                        )
-                    except Exception as le:
-                        print(f"       [LEARNING EXIT ERROR] {le}")
+                    self._queue_exit_result(pos_id, current_token_price, pnl_pct / 100, 'SIGNAL_CHANGE')
 
                 closed_count += 1
 
             if closed_count > 0:
-                print(f"       [SIGNAL CHANGE] 共平仓 {closed_count} 个{opposite_direction}持仓")
+                logger.info("       [SIGNAL CHANGE] 共平仓 %s 个%s持仓", closed_count, opposite_direction)
 
-            self.safe_commit(conn)
-            conn.close()
+            if closed_rows:
+                with self._db_lock:
+                    self._conn().executemany("""
+                        UPDATE positions
+                        SET exit_time = ?, exit_token_price = ?, pnl_usd = ?,
+                            pnl_pct = ?, exit_reason = ?, status = 'closed'
+                        WHERE id = ?
+                    """, closed_rows)
+                    self.safe_commit(self.conn)
 
         except Exception as e:
-            print(f"       [SIGNAL CHANGE ERROR] {e}")
+            logger.info("       [SIGNAL CHANGE ERROR] %s", e)
 
     def run(self):
         print("=" * 70)
@@ -4265,9 +5036,6 @@ class AutoTraderV5:
 
                 # 更新指标（RSI/VWAP/价格历史）- 在generate_signal之前调用
                 try:
-                    outcome_prices = market.get('outcomePrices', '[]')
-                    if isinstance(outcome_prices, str):
-                        outcome_prices = json.loads(outcome_prices)
                     best_bid = float(market.get('bestBid', price))
                     best_ask = float(market.get('bestAsk', price))
                     high = max(price, best_ask)
@@ -4277,9 +5045,10 @@ class AutoTraderV5:
                 self.update_indicators(price, high, low)
 
                 # 检查持仓止盈止损（check_positions内部优先用WebSocket实时价，outcomePrices仅作fallback）
-                yes_price = float(outcome_prices[0]) if outcome_prices and len(outcome_prices) > 0 else None
-                no_price = float(outcome_prices[1]) if outcome_prices and len(outcome_prices) > 1 else None
-                self.check_positions(yes_price=yes_price, no_price=no_price, market=market)
+                # 🚀 空仓时直接跳过（持仓缓存在数据库无变化时不查表）
+                if self._open_position_rows():
+                    yes_price, no_price = _outcome_prices(market)
+                    self.check_positions(yes_price=yes_price, no_price=no_price, market=market)
 
                 # 验证待验证的预测（每15秒检查一次）
                 if i % 5 == 0:
@@ -4364,6 +5133,30 @@ class AutoTraderV5:
     def _params_file(self) -> str:
         return os.path.join(os.path.dirname(self.db_path), 'dynamic_params.json')
 
+    def _reload_config(self):
+        """把信号/风控阈值快照为实例属性（每tick免去嵌套dict查找）
+
+        CONFIG['signal'] 会被动态参数恢复和自动调参修改，修改后必须重新调用。
+        """
+        sig = CONFIG['signal']
+        risk = CONFIG['risk']
+        self._max_entry = sig.get('max_entry_price', 0.80)
+        self._min_entry = sig.get('min_entry_price', 0.20)
+        self._bal_min = sig['balance_zone_min']
+        self._bal_max = sig['balance_zone_max']
+        self._min_long_conf = sig.get('min_long_confidence', sig['min_confidence'])
+        self._min_short_conf = sig.get('min_short_confidence', sig['min_confidence'])
+        self._min_long_score = sig['min_long_score']
+        self._min_short_score = sig['min_short_score']
+        self._allow_long = sig['allow_long']
+        self._allow_short = sig['allow_short']
+        self._max_exposure_pct = risk['max_total_exposure_pct']
+        self._max_per_window = risk.get('max_trades_per_window', 1)
+        self._max_bullets = risk['max_same_direction_bullets']
+        self._cooldown_sec = risk['same_direction_cooldown_sec']
+        self._tp_pct_max = risk.get('take_profit_pct', 0.30)
+        self._sl_pct_max = risk.get('max_stop_loss_pct', 0.30)
+
     def load_dynamic_params(self):
         """启动时从文件恢复上次调整的参数"""
         try:
@@ -4378,18 +5171,20 @@ class AutoTraderV5:
                 print(f"[OK] 动态参数已从文件恢复: {saved}")
         except Exception as e:
             print(f"[WARN] 动态参数加载失败: {e}")
+        self._reload_config()
 
     def save_dynamic_params(self):
         """将当前动态参数持久化到文件"""
         try:
+            sig = CONFIG['signal']
             data = {
-                'min_confidence': CONFIG['signal']['min_confidence'],
-                'min_long_confidence': CONFIG['signal']['min_long_confidence'],
-                'min_short_confidence': CONFIG['signal']['min_short_confidence'],
-                'min_long_score': CONFIG['signal']['min_long_score'],
-                'min_short_score': CONFIG['signal']['min_short_score'],
-                'allow_long': CONFIG['signal']['allow_long'],
-                'allow_short': CONFIG['signal']['allow_short'],
+                'min_confidence': sig['min_confidence'],
+                'min_long_confidence': sig['min_long_confidence'],
+                'min_short_confidence': sig['min_short_confidence'],
+                'min_long_score': sig['min_long_score'],
+                'min_short_score': sig['min_short_score'],
+                'allow_long': sig['allow_long'],
+                'allow_short': sig['allow_short'],
                 'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             }
             with open(self._params_file(), 'w') as f:
@@ -4404,6 +5199,7 @@ class AutoTraderV5:
 
         try:
             recommended = self.learning_system.get_recommended_parameters()
+            sig = CONFIG['signal']
 
             adjustments = []
 
@@ -4415,38 +5211,38 @@ class AutoTraderV5:
             #     CONFIG['signal']['min_confidence'] = new_val
             #     adjustments.append(f"min_confidence: {old_val:.2f} → {new_val:.2f}")
 
-            if recommended['min_long_score'] != CONFIG['signal']['min_long_score']:
-                old_val = CONFIG['signal']['min_long_score']
+            if recommended['min_long_score'] != sig['min_long_score']:
+                old_val = sig['min_long_score']
                 new_val = recommended['min_long_score']
-                CONFIG['signal']['min_long_score'] = new_val
+                sig['min_long_score'] = new_val
                 adjustments.append(f"min_long_score: {old_val:.1f} → {new_val:.1f}")
 
-            if recommended['min_short_score'] != CONFIG['signal']['min_short_score']:
-                old_val = CONFIG['signal']['min_short_score']
+            if recommended['min_short_score'] != sig['min_short_score']:
+                old_val = sig['min_short_score']
                 new_val = recommended['min_short_score']
-                CONFIG['signal']['min_short_score'] = new_val
+                sig['min_short_score'] = new_val
                 adjustments.append(f"min_short_score: {old_val:.1f} → {new_val:.1f}")
 
             if 'allow_long' in recommended:
-                if recommended['allow_long'] != CONFIG['signal']['allow_long']:
-                    old_val = CONFIG['signal']['allow_long']
+                if recommended['allow_long'] != sig['allow_long']:
+                    old_val = sig['allow_long']
                     new_val = recommended['allow_long']
-                    CONFIG['signal']['allow_long'] = new_val
+                    sig['allow_long'] = new_val
                     adjustments.append(f"allow_long: {'启用' if new_val else '禁用'}")
 
             if 'allow_short' in recommended:
-                if recommended['allow_short'] != CONFIG['signal']['allow_short']:
-                    old_val = CONFIG['signal']['allow_short']
+                if recommended['allow_short'] != sig['allow_short']:
+                    old_val = sig['allow_short']
                     new_val = recommended['allow_short']
-                    CONFIG['signal']['allow_short'] = new_val
+                    sig['allow_short'] = new_val
                     adjustments.append(f"allow_short: {'启用' if new_val else '禁用'}")
 
             if adjustments:
-                from colorama import Fore
                 print(f"\n{Fore.CYAN}[AUTO-ADJUST] 参数已自动调整：{Fore.RESET}")
                 for adj in adjustments:
                     print(f"  {Fore.GREEN}✓{Fore.RESET} {adj}")
                 print()
+                self._reload_config()
                 # 持久化到文件，重启后生效
                 self.save_dynamic_params()
 
@@ -4540,13 +5336,12 @@ class AutoTraderV5:
             # 更新调整时间戳
             setattr(self, last_adjust_attr, time.time())
 
-            from colorama import Fore
             print(f"\n{Fore.MAGENTA}[UT-BOT-ADJUST] {reason}{Fore.RESET}")
             print(f"  key_value: {current_params['ut_bot_key_value']} → {new_key_value}")
             print(f"  hull_length: {current_params['hull_length']} → {new_hull_length}\n")
 
             # 发送 Telegram 通知
-            if self.telegram and self.telegram.enabled:
+            if self.telegram and self.telegram.would_send():
                 msg = (
                     f"🔧 UT Bot 参数自动调整\n"
                     f"原因: {reason}\n"
@@ -311,10 +311,22 @@ class PolymarketPredictionLearning:
             actual_pnl_pct: 实际盈亏百分比（正=盈利，负=亏损）
             exit_reason: 'TAKE_PROFIT' / 'STOP_LOSS' / 'SIGNAL_CHANGE'
         """
+        self.update_exit_results([(market_slug, exit_token_price, actual_pnl_pct, exit_reason)])
+
+    def update_exit_results(self, entries):
+        """
+        批量回填退出结果：一个连接、一次 executemany、一次提交
+
+        参数:
+            entries: [(market_slug, exit_token_price, actual_pnl_pct, exit_reason), ...]
+                     按顺序逐条应用，同一市场多条时依次回填最近的未退出记录
+        """
+        if not entries:
+            return
         try:
             conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.executemany('''
                 UPDATE predictions
                 SET exit_token_price = ?,
                     actual_pnl_pct = ?,
@@ -327,11 +339,12 @@ class PolymarketPredictionLearning:
                     ORDER BY timestamp DESC
                     LIMIT 1
                 )
-            ''', (exit_token_price, actual_pnl_pct, exit_reason, market_slug))
+            ''', [(price, pnl, reason, slug) for slug, price, pnl, reason in entries])
             conn.commit()
             conn.close()
         except Exception as e:
             print(f"[LEARNING] update_exit_result 失败: {e}")
+
     def get_accuracy_stats(self, hours: int = 24) -> Dict:
         """
         获取准确率统计
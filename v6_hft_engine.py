@@ -45,7 +45,7 @@ class V6HFTEngine:
         self.token_no_id = None
         self.last_trade_time = 0
         self.current_slug = None
-        self.market_end_time = None
+        self.market_end_ts = None  # 市场结束时间（epoch秒），剩余时间直接用 time.time() 相减
         self.ws_message_count = 0
         self.signal_count = 0
         self._last_indicator_update = 0
@@ -204,15 +204,12 @@ class V6HFTEngine:
                 if response.status_code == 200:
                     markets = response.json()
                     if markets and len(markets) > 0:
-                        market = markets[0]
+                        market = v5._normalize_market(markets[0])
 
                         # 检查市场是否已过期
-                        end_date = market.get('endDate')
-                        if end_date:
+                        if market.get('endDate'):
                             try:
-                                end_dt = datetime.strptime(end_date, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-                                now_dt = datetime.now(timezone.utc)
-                                if (end_dt - now_dt).total_seconds() < 0:
+                                if v5._end_epoch(market) - time.time() < 0:
                                     print(f"[WARN] 市场已过期，尝试下一个窗口: {slug}")
                                     continue
                             except:
@@ -220,10 +217,9 @@ class V6HFTEngine:
 
                         self.current_market = market
                         self.current_slug = slug
-                        token_ids = market.get('clobTokenIds', [])
-                        if isinstance(token_ids, str):
-                            token_ids = json.loads(token_ids)
-                        if token_ids and len(token_ids) >= 2:
+                        # 🚀 复用V5的MarketView缓存（token_id/tick_size按市场只解析一次）
+                        token_ids = v5._market_view(market).token_ids
+                        if len(token_ids) >= 2:
                             self.token_yes_id = str(token_ids[0])
                             self.token_no_id = str(token_ids[1])
                             print(f"[INFO] YES token: ...{self.token_yes_id[-8:]}")
@@ -478,7 +474,8 @@ class V6HFTEngine:
 
     async def check_positions(self):
         """检查持仓止盈止损（复用V5逻辑）- 异步模式"""
-        if self.current_price:
+        # 🚀 空仓时不派发后台任务（V5持仓缓存在数据库无变化时只做一次PRAGMA检查）
+        if self.current_price and self.v5._open_position_rows():
             # 🔒 状态锁：防止持仓检查重复执行
             action_key = "check_positions"
 
@@ -600,10 +597,8 @@ class V6HFTEngine:
             try:
                 end_timestamp = market.get('endTimestamp')
                 if end_timestamp:
-                    self.market_end_time = datetime.fromtimestamp(
-                        int(end_timestamp) / 1000, tz=timezone.utc
-                    )
-                    time_left = (self.market_end_time - datetime.now(timezone.utc)).total_seconds()
+                    self.market_end_ts = int(end_timestamp) / 1000
+                    time_left = self.market_end_ts - time.time()
                     print(f"[INFO] 距离结算还有: {time_left/60:.1f} 分钟")
             except Exception:
                 pass
@@ -638,7 +633,7 @@ class V6HFTEngine:
                         # 接收WebSocket消息（带超时）
                         try:
                             msg = await asyncio.wait_for(ws.recv(), timeout=1.0)
-                            data = json.loads(msg)
+                            data = v5._loads(msg)  # 🚀 orjson解析（与V5共用，未安装时回退标准库）
                             self.ws_message_count += 1
 
                             # 调试：打印前5条原始消息
@@ -711,8 +706,8 @@ class V6HFTEngine:
                             last_cleanup_check = now
 
                         # 检查是否需要切换市场
-                        if self.market_end_time:
-                            time_left = (self.market_end_time - datetime.now(timezone.utc)).total_seconds()
+                        if self.market_end_ts:
+                            time_left = self.market_end_ts - time.time()
                             # 🔥 修复：只在剩余时间>0且<200秒时切换，避免已过期市场循环
                             if 0 < time_left < 200:
                                 print(f"[SWITCH] 市场即将到期({time_left:.0f}秒)，切换到下一个15分钟窗口...")
@@ -726,7 +721,7 @@ class V6HFTEngine:
                                 force_next_window = True  # 🔥 标记：强制使用下一个窗口
                                 break
                         else:
-                            # market_end_time 解析失败，用slug时间戳判断
+                            # market_end_ts 解析失败，用slug时间戳判断
                             if self.current_slug:
                                 try:
                                     ts = int(self.current_slug.split('-')[-1])
@@ -757,6 +752,9 @@ class V6HFTEngine:
 
     async def run(self):
         """启动V6引擎"""
+        # 🚀 让 asyncio.to_thread 使用上面创建的50线程池（否则走默认的 min(32, cpu+4) 线程池，
+        # 小核数容器上几个阻塞等待成交的下单任务就能把持仓检查/学习记录饿住）
+        asyncio.get_running_loop().set_default_executor(self.executor)
         try:
             await self.websocket_loop()
         except KeyboardInterrupt: